@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks dos caminhos de carga, filtro/tabela, gráficos e insights com dados sintéticos.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark                       # 10 mil, 1 milhão e 10 milhões de linhas
+    python -m benchmarks.benchmark --linhas 10000 100000
+    python -m benchmarks.benchmark --comparar benchmarks/resultados/<arquivo>.json
+
+Os CSVs gerados ficam em benchmarks/dados/ e os resultados (JSON) em benchmarks/resultados/.
+"""
+import argparse
+import gc
+import json
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+from src import dashboard
+from src.insights import gerar_insights
+from src.processamento_dados import (
+    GerenciadorDados, atualizar_estado, caminho_cache, carregar_dados, esbocar_blocos, esbocos_da_selecao,
+    fatiar_blocos, montar_estado
+)
+
+DIRETORIO = Path(__file__).resolve().parent
+DIRETORIO_DADOS = DIRETORIO / 'dados'
+DIRETORIO_RESULTADOS = DIRETORIO / 'resultados'
+
+TAMANHOS = [10_000, 1_000_000, 10_000_000]
+
+# Linhas geradas por vez ao escrever o CSV sintético
+LINHAS_POR_BLOCO = 500_000
+
+# Linhas anexadas ao medir a atualização incremental do estado
+LINHAS_ANEXO = 1_000
+
+# Orçamento (s) para importar src.dashboard e criar o app, descontado o próprio `import dash`
+ORCAMENTO_INICIALIZACAO = 0.25
+
+# Executado em um processo novo para medir a importação sem módulos já carregados
+CODIGO_INICIALIZACAO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import dash
+dash_s = time.perf_counter() - inicio
+import src.dashboard
+importacao_s = time.perf_counter() - inicio - dash_s
+inicio = time.perf_counter()
+src.dashboard.create_app()
+print(json.dumps({
+    'importar_dash_s': dash_s,
+    'importar_dashboard_s': importacao_s,
+    'create_app_s': time.perf_counter() - inicio,
+    'pandas_importado': 'pandas' in sys.modules
+}))
+'''
+
+# Combinações de filtros medidas nos callbacks: (sexo, bairro, cidade, itens, últimos N dias).
+# Lista vazia = todos; bairro None = o bairro mais frequente; dias None = sem filtro de período.
+FILTROS = [
+    ([], [], [], [], None),
+    (['F'], [], [], [], None),
+    (['M'], None, [], [], None),
+    ([], [], [], [], 90),
+    (['F'], [], [], [], 365),
+    (['F', 'M'], None, ['São Paulo', 'Osasco'], ['Tapete', 'Puff'], None),
+    ([], [], ['São Paulo', 'Osasco'], ['Tapete'], 365)
+]
+
+ITENS = [
+    'Sofá 2 lugares', 'Sofá 2 lugares (retrátil)', 'Sofá 3 lugares', 'Sofá 3 lugares (retrátil)',
+    'Sofá 5 lugares (retrátil)', 'Poltrona G', 'Poltrona P', 'Tapete', 'Cadeira assento e encosto',
+    'Cadeira - assento x 6', 'Colchão casal padrão sem box', 'Colchão solteiro padrão sem box',
+    'Colchão queen com box', 'Cabeceira', 'Puff'
+]
+CIDADES = ['São Paulo', 'Taboão da Serra', 'Osasco', 'Santo André', 'São Bernardo do Campo',
+           'Guarulhos', 'Diadema', 'Embu das Artes', 'Cotia', 'Barueri']
+NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Elaine', 'Fernando', 'Gabriela', 'Heitor', 'Isabela', 'João']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida']
+
+
+# =============================================
+# DADOS SINTÉTICOS
+# =============================================
+def gerar_bloco(inicio, linhas, gerador, quantidade_bairros=400):
+    """
+    Gera um bloco com as mesmas colunas de data/clientes.csv: bairros com
+    distribuição desigual (alguns muito frequentes), listas de 1 a 3 itens
+    separados por vírgula, "NA" nos itens ausentes e datas DD/MM/AAAA.
+    """
+    bairros = np.array([f'Bairro {i:03d}' for i in range(quantidade_bairros)], dtype=object)
+    pesos_bairros = 1 / np.arange(1, quantidade_bairros + 1)
+    pesos_bairros /= pesos_bairros.sum()
+
+    itens = np.array(ITENS, dtype=object)
+    pesos_itens = np.linspace(3, 1, len(ITENS))
+    pesos_itens /= pesos_itens.sum()
+
+    def listas_de_itens(probabilidade_na):
+        primeiros = gerador.choice(itens, linhas, p=pesos_itens)
+        segundos = gerador.choice(itens, linhas, p=pesos_itens)
+        terceiros = gerador.choice(itens, linhas, p=pesos_itens)
+        quantidade = gerador.choice([1, 2, 3], linhas, p=[0.6, 0.3, 0.1])
+        listas = np.where(quantidade == 1, primeiros, primeiros + ', ' + segundos)
+        listas = np.where(quantidade == 3, listas + ', ' + terceiros, listas)
+        return np.where(gerador.random(linhas) < probabilidade_na, 'NA', listas)
+
+    datas = pd.Timestamp('2020-01-01') + pd.to_timedelta(gerador.integers(0, 5 * 365, linhas), unit='D')
+    nomes = (gerador.choice(np.array(NOMES, dtype=object), linhas) + ' '
+             + gerador.choice(np.array(SOBRENOMES, dtype=object), linhas))
+
+    return pd.DataFrame({
+        'id_cliente': np.arange(inicio + 1, inicio + linhas + 1),
+        'nome': nomes,
+        'sexo': gerador.choice(['F', 'M'], linhas, p=[0.7, 0.3]),
+        'bairro': gerador.choice(bairros, linhas, p=pesos_bairros),
+        'cidade': gerador.choice(np.array(CIDADES, dtype=object), linhas),
+        'data_servico': datas.strftime('%d/%m/%Y'),
+        'itens_higienizados': listas_de_itens(0.05),
+        'itens_impermeabilizados': listas_de_itens(0.8),
+        'valor_servico': np.round(gerador.gamma(4, 80, linhas) + 150, 2)
+    })
+
+
+def gerar_csv(linhas, semente=42):
+    """
+    Escreve (uma vez) o CSV sintético com `linhas` linhas, em blocos, e devolve o caminho.
+    """
+    DIRETORIO_DADOS.mkdir(parents=True, exist_ok=True)
+    caminho = DIRETORIO_DADOS / f'clientes_{linhas}.csv'
+    if caminho.exists():
+        return caminho
+
+    gerador = np.random.default_rng(semente)
+    temporario = caminho.with_suffix('.tmp')
+    with open(temporario, 'w', encoding='utf-8', newline='') as arquivo:
+        for inicio in range(0, linhas, LINHAS_POR_BLOCO):
+            bloco = gerar_bloco(inicio, min(LINHAS_POR_BLOCO, linhas - inicio), gerador)
+            bloco.to_csv(arquivo, index=False, header=inicio == 0, float_format='%.2f')
+    temporario.rename(caminho)
+    return caminho
+
+
+# =============================================
+# MEDIÇÃO
+# =============================================
+def tamanho_resposta(resposta):
+    return len(json.dumps(resposta, cls=PlotlyJSONEncoder))
+
+
+def medir(funcao, antes=None, serializar=True):
+    """
+    Executa `funcao` duas vezes: uma para o tempo e outra sob tracemalloc para o
+    pico de memória. `antes` (se informado) roda antes de cada execução, para
+    limpar caches e medir sempre o caminho frio. Com `serializar` o retorno é
+    medido como a resposta JSON enviada ao navegador.
+    """
+    if antes:
+        antes()
+    gc.collect()
+    inicio = time.perf_counter()
+    resposta = funcao()
+    segundos = time.perf_counter() - inicio
+
+    if antes:
+        antes()
+    gc.collect()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'segundos': segundos,
+        'pico_memoria_mb': pico / (1024 * 1024),
+        'resposta_bytes': tamanho_resposta(resposta) if serializar else None
+    }
+
+
+def medir_tamanho(caminho):
+    """
+    Mede todos os caminhos para um CSV sintético, sempre com os caches frios.
+    """
+    resultados = {}
+    shutil.rmtree(caminho_cache(caminho), ignore_errors=True)
+    resultados['carregar_dados_csv'] = medir(
+        lambda: carregar_dados(caminho, usar_cache=False), serializar=False
+    )
+    carregar_dados(caminho)
+    resultados['carregar_dados_cache'] = medir(lambda: carregar_dados(caminho), serializar=False)
+
+    # Os callbacks passam a usar o CSV sintético; o cache de respostas (SQLite) é
+    # contornado para medir o trabalho real de cada caminho
+    dashboard.gerenciador = GerenciadorDados(caminho)
+    estado = dashboard.gerenciador.obter()
+    bairro_frequente = estado['dados']['bairro'].value_counts().index[0]
+    ultima_data = estado['dados']['data_servico'].max()
+
+    def limpar_caches():
+        dashboard.cache_filtros.limpar()
+        dashboard.cache_insights.limpar()
+        dashboard.cache_tabela.limpar()
+
+    conteudo = dashboard.atualizar_conteudo.__wrapped__
+    insights = dashboard.atualizar_insights.__wrapped__
+    receita = dashboard.atualizar_receita.__wrapped__
+    for sexo, bairro, cidade, itens, dias in FILTROS:
+        bairro = [bairro_frequente] if bairro is None else bairro
+        sufixo = '|'.join(','.join(valores) or 'all' for valores in (sexo, bairro, cidade, itens))
+        inicio = fim = None
+        if dias:
+            sufixo += f'|{dias}d'
+            inicio = (ultima_data - pd.Timedelta(days=dias - 1)).strftime('%Y-%m-%d')
+            fim = ultima_data.strftime('%Y-%m-%d')
+        resultados[f'atualizar_conteudo[{sufixo}]'] = medir(
+            lambda: conteudo(sexo, bairro, cidade, itens, inicio, fim, None), limpar_caches
+        )
+        resultados[f'atualizar_receita[{sufixo}]'] = medir(
+            lambda: receita(sexo, bairro, cidade, itens, inicio, fim, None), limpar_caches
+        )
+        resultados[f'atualizar_tabela[{sufixo}]'] = medir(
+            lambda: dashboard.atualizar_tabela(
+                sexo, bairro, cidade, itens, inicio, fim, 0, 10,
+                [{'column_id': 'valor_servico', 'direction': 'desc'}], '', None
+            ),
+            limpar_caches
+        )
+        resultados[f'atualizar_insights[{sufixo}]'] = medir(
+            lambda: insights(sexo, bairro, cidade, itens, inicio, fim, None), limpar_caches
+        )
+
+    resultados['gerar_insights[all|all|all|all]'] = medir(lambda: gerar_insights(estado['dados'], estado['cubo'], estado['cubos_itens']))
+
+    # Modo aproximado: montagem dos esboços em blocos e insights a partir deles
+    resultados['esbocar_blocos'] = medir(lambda: esbocar_blocos(fatiar_blocos(estado['dados'])), serializar=False)
+    esbocos = esbocar_blocos(fatiar_blocos(estado['dados']))
+    resultados['gerar_insights[aproximado]'] = medir(
+        lambda: gerar_insights(None, estado['cubo'], estado['cubos_itens'], esbocos_da_selecao(esbocos))
+    )
+
+    # Anexo de linhas ao CSV: agregados por delta x estado reconstruído do zero
+    anterior = montar_estado(estado['dados'].iloc[:-LINHAS_ANEXO].reset_index(drop=True))
+    resultados[f'atualizar_estado[+{LINHAS_ANEXO}]'] = medir(
+        lambda: atualizar_estado(anterior, estado['dados']), serializar=False
+    )
+    resultados['montar_estado'] = medir(lambda: montar_estado(estado['dados']), serializar=False)
+    return resultados
+
+
+def medir_inicializacao():
+    """
+    Mede, em um processo novo, quanto custa importar src.dashboard e criar o app.
+    """
+    saida = subprocess.run(
+        [sys.executable, '-c', CODIGO_INICIALIZACAO],
+        capture_output=True, text=True, check=True, cwd=DIRETORIO.parent
+    ).stdout
+    medida = json.loads(saida.strip().splitlines()[-1])
+    medida['dentro_do_orcamento'] = (
+        medida['importar_dashboard_s'] + medida['create_app_s'] <= ORCAMENTO_INICIALIZACAO
+    )
+    return medida
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecida'
+
+
+def comparar(anterior, atual):
+    """
+    Imprime a variação de tempo e memória de cada caminho em relação a um resultado salvo.
+    """
+    print(f"\nComparação com {anterior['versao']} ({anterior['data']}):")
+    for linhas, caminhos in atual['resultados'].items():
+        base = anterior['resultados'].get(linhas, {})
+        for nome, medida in caminhos.items():
+            if nome not in base:
+                continue
+            tempo = medida['segundos'] / base[nome]['segundos'] - 1 if base[nome]['segundos'] else 0
+            memoria = medida['pico_memoria_mb'] - base[nome]['pico_memoria_mb']
+            print(f"  {linhas:>10} {nome:<45} tempo {tempo:+7.1%}  memória {memoria:+9.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks do dashboard com dados sintéticos')
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS)
+    parser.add_argument('--comparar', type=Path, help='JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    execucao = {
+        'versao': versao_codigo(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'resultados': {}
+    }
+
+    inicializacao = medir_inicializacao()
+    execucao['inicializacao'] = inicializacao
+    print(f"Importar dash: {inicializacao['importar_dash_s'] * 1000:.0f} ms | "
+          f"importar src.dashboard: {inicializacao['importar_dashboard_s'] * 1000:.0f} ms | "
+          f"create_app: {inicializacao['create_app_s'] * 1000:.0f} ms | "
+          f"pandas carregado: {'sim' if inicializacao['pandas_importado'] else 'não'}")
+    if not inicializacao['dentro_do_orcamento']:
+        print(f"ATENÇÃO: inicialização acima do orçamento de {ORCAMENTO_INICIALIZACAO * 1000:.0f} ms")
+    for linhas in args.linhas:
+        caminho = gerar_csv(linhas)
+        print(f"\n=== {linhas:,} linhas ({caminho.stat().st_size / 1024 / 1024:.1f} MB) ===")
+        resultados = medir_tamanho(caminho)
+        execucao['resultados'][str(linhas)] = resultados
+        for nome, medida in resultados.items():
+            resposta = f"{medida['resposta_bytes']:>10,} B" if medida['resposta_bytes'] is not None else ' ' * 12
+            print(f"  {nome:<45} {medida['segundos'] * 1000:>10.1f} ms  "
+                  f"{medida['pico_memoria_mb']:>9.1f} MB  {resposta}")
+
+    DIRETORIO_RESULTADOS.mkdir(parents=True, exist_ok=True)
+    destino = DIRETORIO_RESULTADOS / f"{execucao['data'].replace(':', '')}-{execucao['versao']}.json"
+    destino.write_text(json.dumps(execucao, indent=2), encoding='utf-8')
+    print(f"\nResultados salvos em {destino}")
+
+    if args.comparar:
+        comparar(json.loads(args.comparar.read_text(encoding='utf-8')), execucao)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Configuração do gunicorn (lida automaticamente a partir da raiz do projeto)
+# Uso: gunicorn src.dashboard:server
+# Cada worker cria o app (create_app) sem ler os dados e começa a carregá-los em
+# segundo plano; por isso não use --preload, que faria esse carregamento antes do fork.
+
+
+def on_starting(server):
+    from src.processamento_dados import ARMAZENAMENTO, MEMORIA_COMPARTILHADA, materializar_banco, materializar_cache
+
+    if ARMAZENAMENTO == 'sqlite':
+        # Com DASHBOARD_ARMAZENAMENTO=sqlite o CSV é importado para o banco uma única vez,
+        # antes dos workers existirem (cada worker só abre o banco para leitura)
+        materializar_banco()
+    elif MEMORIA_COMPARTILHADA:
+        # Com DASHBOARD_MEMORIA_COMPARTILHADA=1 o cache colunar é gerado uma única vez
+        # aqui no processo principal, com as estruturas derivadas (índices, bitmaps, cubos);
+        # os workers apenas mapeiam os arquivos (somente leitura)
+        materializar_cache()
@@ -10,4 +10,10 @@ setup(
         'plotly',
         'gunicorn'
     ],
+    extras_require={
+        # Exportação em Excel (/exportar?formato=xlsx)
+        'excel': ['openpyxl'],
+        # Insights em segundo plano (callbacks de longa duração do Dash)
+        'segundo_plano': ['dash[diskcache]']
+    },
 )
\ No newline at end of file
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+class CacheLRU:
+    """
+    Cache em memória com capacidade limitada (descarta o item usado há mais tempo)
+    e contadores de acertos/falhas.
+    """
+
+    def __init__(self, capacidade=32):
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._em_calculo = {}
+        self._trava = Lock()
+
+    def obter(self, chave, calcular):
+        """
+        Retorna o valor guardado para a chave; se não existir, chama calcular() e guarda o resultado.
+        Chamadas simultâneas para a mesma chave esperam um único cálculo.
+        """
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            trava_chave = self._em_calculo.setdefault(chave, Lock())
+
+        with trava_chave:
+            with self._trava:
+                if chave in self._itens:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return self._itens[chave]
+                self.falhas += 1
+
+            try:
+                valor = calcular()
+                with self._trava:
+                    self._itens[chave] = valor
+                    while len(self._itens) > self.capacidade:
+                        self._itens.popitem(last=False)
+            finally:
+                with self._trava:
+                    self._em_calculo.pop(chave, None)
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                'itens': len(self._itens),
+                'capacidade': self.capacidade,
+                'acertos': self.acertos,
+                'falhas': self.falhas
+            }
+
+
+class CacheRespostas:
+    """
+    Cache de respostas de callbacks em SQLite, compartilhado por todos os workers
+    da máquina. A chave é o nome do callback + entradas; cada entrada guarda a
+    versão dos dados com que foi calculada e é descartada quando a versão muda,
+    quando passa do TTL ou quando o arquivo excede o tamanho máximo.
+    """
+
+    def __init__(self, caminho, ttl=3600, tamanho_maximo_mb=50):
+        self.caminho = Path(caminho)
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo_mb * 1024 * 1024
+        self.acertos = 0
+        self.falhas = 0
+        self._local = threading.local()
+        self._versao_limpa = None
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (workers do gunicorn são criados por fork)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS respostas ('
+                ' chave TEXT PRIMARY KEY, versao TEXT, valor TEXT,'
+                ' tamanho INTEGER, criado REAL)'
+            )
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def obter(self, chave, versao, calcular):
+        """
+        Retorna a resposta guardada (já desserializada do JSON) ou calcula e guarda.
+        """
+        versao = str(versao)
+        try:
+            conexao = self._conexao()
+            linha = conexao.execute(
+                'SELECT valor FROM respostas WHERE chave = ? AND versao = ? AND criado > ?',
+                (chave, versao, time.time() - self.ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler cache de respostas: {str(e)}")
+            return calcular()
+
+        if linha is not None:
+            self.acertos += 1
+            return json.loads(linha[0])
+
+        self.falhas += 1
+        valor = calcular()
+        try:
+            serializado = json.dumps(valor, cls=PlotlyJSONEncoder)
+            conexao.execute(
+                'INSERT OR REPLACE INTO respostas (chave, versao, valor, tamanho, criado) VALUES (?, ?, ?, ?, ?)',
+                (chave, versao, serializado, len(serializado), time.time())
+            )
+            self._limpar(conexao, versao)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Erro ao gravar cache de respostas: {str(e)}")
+        return valor
+
+    def _limpar(self, conexao, versao):
+        # Respostas de outra versão dos dados nunca mais serão usadas
+        if versao != self._versao_limpa:
+            conexao.execute('DELETE FROM respostas WHERE versao != ?', (versao,))
+            self._versao_limpa = versao
+
+        conexao.execute('DELETE FROM respostas WHERE criado <= ?', (time.time() - self.ttl,))
+
+        total = conexao.execute('SELECT COALESCE(SUM(tamanho), 0) FROM respostas').fetchone()[0]
+        if total > self.tamanho_maximo:
+            # Remove as mais antigas até voltar a ~80% do limite
+            excesso = total - int(self.tamanho_maximo * 0.8)
+            removidas = []
+            for chave, tamanho in conexao.execute('SELECT chave, tamanho FROM respostas ORDER BY criado'):
+                if excesso <= 0:
+                    break
+                removidas.append((chave,))
+                excesso -= tamanho
+            conexao.executemany('DELETE FROM respostas WHERE chave = ?', removidas)
+
+    def memorizar(self, nome, versao):
+        """
+        Decorador para callbacks: a chave é o nome + os argumentos e `versao()`
+        informa a versão atual dos dados. Argumentos nomeados (ex.: `progresso`)
+        são repassados à função mas não entram na chave.
+        """
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def envoltorio(*args, **opcoes):
+                chave = nome + json.dumps(args, cls=PlotlyJSONEncoder, sort_keys=True)
+                return self.obter(chave, versao(), lambda: funcao(*args, **opcoes))
+            return envoltorio
+        return decorador
+
+    def estatisticas(self):
+        return {'acertos': self.acertos, 'falhas': self.falhas}
@@ -1,10 +1,19 @@
+import functools
+import importlib.util
+import os
+import threading
 import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
-import plotly.express as px
-import pandas as pd
-from src.processamento_dados import carregar_dados
-from src.insights import gerar_insights
+from flask import Response, request, stream_with_context
+from dash import dcc, html, dash_table, Patch
+from dash.dependencies import Input, Output, State
+from dash.exceptions import MissingCallbackContextException, PreventUpdate
+import plotly.graph_objects as go
+from src.cache import CacheLRU, CacheRespostas
+from src.metricas import Metricas
+
+# pandas/numpy e os módulos de dados (src.processamento_dados, src.insights, src.tabela)
+# são importados só quando usados: importar este módulo não carrega nada pesado,
+# e o worker do gunicorn fica pronto antes de ler clientes.csv.
 
 # =============================================
 # CONFIGURAÇÃO INICIAL
@@ -14,9 +23,233 @@ external_stylesheets = [
     'https://fonts.googleapis.com/css2?family=Montserrat:wght@300;400;500;600;700&display=swap'
 ]
 
-dados = carregar_dados()
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
-server = app.server
+# Acompanha data/clientes.csv e recarrega (incrementalmente) quando o arquivo muda.
+# Criado no primeiro uso (ou pelo aquecimento em segundo plano) por obter_gerenciador().
+gerenciador = None
+_trava_gerenciador = threading.Lock()
+cache_filtros = CacheLRU(capacidade=32)
+cache_insights = CacheLRU(capacidade=64)
+cache_tabela = CacheLRU(capacidade=16)
+
+# Respostas prontas dos callbacks, compartilhadas entre os workers (SQLite local).
+# A assinatura de clientes.csv é a versão: qualquer mudança no arquivo invalida o cache.
+cache_respostas = CacheRespostas(
+    os.environ.get('DASHBOARD_CACHE_RESPOSTAS', os.path.join('data', '.respostas.sqlite')),
+    ttl=int(os.environ.get('DASHBOARD_CACHE_TTL', '3600'))
+)
+
+def obter_gerenciador():
+    global gerenciador
+    if gerenciador is None:
+        with _trava_gerenciador:
+            if gerenciador is None:
+                from src.processamento_dados import criar_gerenciador
+                # DASHBOARD_ARMAZENAMENTO: 'csv' (memória) ou 'sqlite' (consultas no banco)
+                gerenciador = criar_gerenciador()
+    return gerenciador
+
+def obter_estado_com_aviso():
+    """
+    Estado atual e aviso de falha na carga dos dados (None se não houve falha).
+    Sem nenhum estado carregado, retorna (None, erro).
+    """
+    gerenciador_dados = obter_gerenciador()
+    try:
+        estado = gerenciador_dados.obter()
+    except RuntimeError as e:
+        return None, str(e)
+    if gerenciador_dados.erro:
+        # A recarga falhou: continuam os dados anteriores
+        return estado, f"Erro ao recarregar os dados (exibindo a versão anterior): {gerenciador_dados.erro}"
+    return estado, None
+
+def aquecer():
+    """
+    Carrega os dados e as figuras em uma thread, sem atrasar o início do servidor.
+    """
+    def carregar():
+        try:
+            obter_gerenciador().obter()
+        except RuntimeError:
+            # Falha já registrada no gerenciador; a próxima requisição tenta de novo
+            return
+        figuras_base()
+    threading.Thread(target=carregar, name='aquecimento', daemon=True).start()
+
+# Intervalo (ms) com que o navegador pergunta se há dados novos
+INTERVALO_ATUALIZACAO = 30 * 1000
+
+# Barras exibidas nos gráficos de bairros e itens; o restante é somado em "Outros"
+TOP_GRAFICOS = int(os.environ.get('DASHBOARD_TOP_GRAFICOS', '15'))
+
+# Alterar quando o conteúdo das respostas mudar, para não servir respostas antigas do cache
+VERSAO_RESPOSTAS = 2
+
+def versao_dados():
+    # As configurações que mudam as respostas (modo aproximado, barras dos gráficos) entram
+    # na chave: o cache em disco sobrevive a reinícios com outras variáveis de ambiente
+    from src.processamento_dados import APROXIMADO
+
+    configuracao = f"{'aproximado' if APROXIMADO else 'exato'}-top{TOP_GRAFICOS}"
+    return f"{VERSAO_RESPOSTAS}:{configuracao}:{obter_gerenciador().obter()['assinatura']}"
+
+# Opções devolvidas por busca no filtro de bairro (a lista completa nunca vai para o navegador)
+LIMITE_OPCOES_BAIRRO = 50
+
+# Análises pesadas (insights) rodam como callbacks em segundo plano, em processos
+# separados coordenados por um cache em disco (diskcache, sem broker externo):
+# o worker que recebeu a requisição fica livre para gráficos e tabela.
+# DASHBOARD_SEGUNDO_PLANO=0 volta a executá-las dentro da requisição.
+SEGUNDO_PLANO = os.environ.get('DASHBOARD_SEGUNDO_PLANO', '1') == '1'
+DIRETORIO_SEGUNDO_PLANO = os.environ.get(
+    'DASHBOARD_CACHE_SEGUNDO_PLANO', os.path.join('data', '.segundo_plano')
+)
+
+def criar_gerenciador_segundo_plano():
+    """
+    DiskcacheManager do Dash para os callbacks em segundo plano, ou None se estiver
+    desligado ou se as dependências opcionais (diskcache, multiprocess, psutil) faltarem.
+    """
+    if not SEGUNDO_PLANO:
+        return None
+    if any(importlib.util.find_spec(pacote) is None for pacote in ('diskcache', 'multiprocess', 'psutil')):
+        print("Callbacks em segundo plano desligados: instale dash[diskcache]")
+        return None
+
+    import diskcache
+    # Resultados não lidos (página fechada no meio do cálculo) expiram sozinhos
+    return dash.DiskcacheManager(diskcache.Cache(DIRETORIO_SEGUNDO_PLANO), expire=600)
+
+def ler_selecao(sexo, bairro, cidade, itens):
+    # Valores dos dropdowns de seleção múltipla -> tupla usada nos filtros e nas chaves de cache
+    from src.processamento_dados import normalizar_selecao
+
+    return normalizar_selecao(sexo=sexo, bairro=bairro, cidade=cidade, itens=itens)
+
+def obter_posicoes(estado, selecao, periodo=None):
+    from src.processamento_dados import filtrar_posicoes
+
+    return filtrar_posicoes(estado['indice'], selecao, periodo, estado['bitmaps'])
+
+def obter_subconjunto(estado, selecao, periodo=None):
+    """
+    Subconjunto filtrado compartilhado entre os callbacks: cada combinação
+    de filtros é calculada uma vez e reaproveitada enquanto estiver no cache.
+    A versão dos dados faz parte da chave, então recargas invalidam as entradas antigas.
+    """
+    from src.processamento_dados import selecionar_linhas
+
+    return cache_filtros.obter(
+        (selecao, periodo, estado['versao']),
+        lambda: selecionar_linhas(estado['dados'], estado['indice'], selecao, periodo, estado['bitmaps'])
+    )
+
+def obter_cubos(estado, selecao, periodo=None):
+    """
+    Fatias dos cubos de serviços e de itens para os filtros. Com filtros só de sexo e
+    bairro e sem período saem dos cubos pré-agregados; nos demais casos, das linhas
+    selecionadas pelos bitmaps e pelo índice de tempo.
+    """
+    from src.processamento_dados import agregar_linhas, cobre_selecao, fatiar_cubo
+
+    if 'banco' in estado:
+        # Modo SQLite: as fatias saem de GROUP BY no banco, com os filtros no WHERE
+        if not selecao and periodo is None:
+            return estado['cubo'], estado['cubos_itens']
+        return cache_filtros.obter(
+            ('cubos', selecao, periodo, estado['versao']),
+            lambda: estado['banco'].cubos(selecao, periodo)
+        )
+
+    sem_periodo = periodo is None or estado['indice'].get('data_servico') is None
+    if sem_periodo and cobre_selecao(selecao):
+        return fatiar_cubo(estado['cubo'], selecao), {
+            coluna: fatiar_cubo(cubo, selecao) for coluna, cubo in estado['cubos_itens'].items()
+        }
+    return cache_filtros.obter(
+        ('cubos', selecao, periodo, estado['versao']),
+        lambda: agregar_linhas(
+            estado['dados'], estado['itens'], obter_posicoes(estado, selecao, None if sem_periodo else periodo)
+        )
+    )
+
+def obter_rollups(estado, selecao):
+    """
+    Rollups de receita para a seleção: os pré-calculados quando cobrem os filtros,
+    ou os das linhas selecionadas (filtros de cidade e itens).
+    """
+    from src.processamento_dados import cobre_selecao, construir_rollups
+
+    if cobre_selecao(selecao):
+        return estado['rollups'], selecao
+    rollups = cache_filtros.obter(
+        ('rollups', selecao, estado['versao']),
+        lambda: construir_rollups(obter_subconjunto(estado, selecao))
+    )
+    return rollups, ()
+
+def limites_periodo(estado):
+    # Primeira e última data dos dados (AAAA-MM-DD), para o DatePickerRange
+    if estado and 'banco' in estado:
+        return estado['limites_periodo']
+    tempo = estado['indice'].get('data_servico') if estado else None
+    if tempo is None or not len(tempo['datas']):
+        return None, None
+    return str(tempo['datas'][0])[:10], str(tempo['datas'][-1])[:10]
+
+def opcoes_bairro(estado, busca='', selecionados=None):
+    """
+    Opções do filtro de bairro para o texto digitado: busca por prefixo no índice
+    do estado ou, sem texto, os bairros com mais serviços. Os bairros selecionados
+    continuam sempre entre as opções.
+    """
+    if estado is None or 'bairro' not in estado['busca']:
+        return []
+
+    from src.processamento_dados import buscar_prefixo, contar_por
+
+    if busca:
+        bairros = buscar_prefixo(estado['busca']['bairro'], busca, LIMITE_OPCOES_BAIRRO)
+    else:
+        # "Outros" fica sempre depois dos `top` primeiros
+        contagem = contar_por(estado['cubo'], 'bairro', top=LIMITE_OPCOES_BAIRRO)
+        bairros = contagem.index[:LIMITE_OPCOES_BAIRRO].tolist()
+    if isinstance(selecionados, str):
+        selecionados = [selecionados]
+    bairros += [bairro for bairro in selecionados or [] if bairro != 'all' and bairro not in bairros]
+    return [{'label': bairro, 'value': bairro} for bairro in bairros]
+
+def opcoes_filtro(estado, coluna):
+    # Filtros de seleção múltipla: nenhuma opção marcada = todos
+    if estado is None:
+        return []
+    if 'banco' in estado:
+        valores = estado['valores'].get(coluna, [])
+    elif coluna in estado['dados'].columns:
+        valores = estado['dados'][coluna].dropna().unique()
+    else:
+        return []
+    return [{'label': valor, 'value': valor} for valor in valores]
+
+def opcoes_itens(estado):
+    # Itens das duas colunas de itens (índice item -> linhas), em ordem alfabética
+    if estado is None:
+        return []
+    if 'banco' in estado:
+        itens = estado['valores']['itens']
+    else:
+        from src.processamento_dados import COLUNAS_ITENS
+
+        itens = {item for coluna in COLUNAS_ITENS for item in estado['indice'].get(coluna, {})}
+    return [{'label': item, 'value': item} for item in sorted(itens)]
+
+# Latência, bytes e linhas por callback em /metrics (formato Prometheus), com DASHBOARD_METRICAS=1.
+# Os valores são do processo que responde (cada worker do gunicorn tem os seus).
+metricas = Metricas()
+metricas.registrar_cache('filtros', cache_filtros)
+metricas.registrar_cache('insights', cache_insights)
+metricas.registrar_cache('tabela', cache_tabela)
+metricas.registrar_cache('respostas', cache_respostas)
 
 # =============================================
 # PALETA DE CORES PROFISSIONAL (OPÇÃO 2)
@@ -34,286 +267,624 @@ CORES = {
 }
 
 # =============================================
-# LAYOUT DO DASHBOARD
+# FIGURAS (estrutura e estilo montados uma vez)
 # =============================================
-app.layout = html.Div(style={
-    'fontFamily': "'Montserrat', sans-serif",
-    'backgroundColor': CORES['fundo'],
-    'minHeight': '100vh',
-    'margin': '0',
-    'padding': '0',
-    'color': CORES['texto']
-}, children=[
-    # Barra de Navegação Superior (Premium)
-    html.Div(style={
-        'background': CORES['gradiente'],
+# Só o que o template padrão do plotly muda nestas figuras (eixos e dicas): o
+# template completo (~9 KB por figura) iria junto de cada figura no layout
+TEMPLATE_FIGURAS = go.layout.Template(layout=dict(
+    xaxis=dict(gridcolor='white', linecolor='white', zerolinecolor='white', zerolinewidth=2,
+               ticks='', automargin=True, title=dict(standoff=15)),
+    yaxis=dict(gridcolor='white', linecolor='white', zerolinecolor='white', zerolinewidth=2,
+               ticks='', automargin=True, title=dict(standoff=15)),
+    hoverlabel=dict(align='left'),
+    hovermode='closest'
+))
+
+def criar_figura_sexo():
+    fig = go.Figure(go.Pie(
+        labels=[],
+        values=[],
+        hole=0.4,
+        hovertemplate='sexo=%{label}<br>count=%{value}<extra></extra>'
+    ))
+    fig.update_layout(
+        template=TEMPLATE_FIGURAS,
+        piecolorway=[CORES['primaria'], CORES['secundaria']],
+        margin=dict(l=20, r=20, t=20, b=20),
+        showlegend=True,
+        plot_bgcolor=CORES['terciaria'],
+        paper_bgcolor=CORES['terciaria'],
+        font=dict(color=CORES['texto']),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.1,
+            xanchor="center",
+            x=0.5
+        )
+    )
+    return fig
+
+def criar_figura_barras(coluna, cor, **layout):
+    fig = go.Figure(go.Bar(
+        x=[],
+        y=[],
+        orientation='h',
+        marker=dict(color=[], coloraxis='coloraxis'),
+        hovertemplate=f'count=%{{x}}<br>{coluna}=%{{y}}<extra></extra>'
+    ))
+    fig.update_layout(
+        template=TEMPLATE_FIGURAS,
+        coloraxis=dict(colorscale=[[0, CORES['fundo']], [1, cor]], showscale=False),
+        plot_bgcolor=CORES['terciaria'],
+        paper_bgcolor=CORES['terciaria'],
+        font=dict(color=CORES['texto']),
+        xaxis_title=None,
+        yaxis_title=None,
+        **layout
+    )
+    return fig
+
+def criar_figura_receita():
+    fig = go.Figure(go.Scatter(
+        x=[],
+        y=[],
+        customdata=[],
+        mode='lines+markers',
+        line=dict(color=CORES['secundaria'], width=3),
+        marker=dict(color=CORES['primaria'], size=6),
+        hovertemplate='%{x}<br>receita=R$ %{y:,.2f}<br>serviços=%{customdata}<extra></extra>'
+    ))
+    fig.update_layout(
+        template=TEMPLATE_FIGURAS,
+        margin=dict(l=60, r=20, t=20, b=40),
+        plot_bgcolor=CORES['terciaria'],
+        paper_bgcolor=CORES['terciaria'],
+        font=dict(color=CORES['texto']),
+        xaxis_title=None,
+        yaxis_title=None,
+        yaxis_tickprefix='R$ '
+    )
+    return fig
+
+@functools.lru_cache(maxsize=None)
+def figuras_base():
+    # Montadas uma vez, no primeiro carregamento da página (ou no aquecimento)
+    return {
+        'sexo': criar_figura_sexo(),
+        'bairros': criar_figura_barras(
+            'bairro', CORES['primaria'],
+            yaxis={'categoryorder': 'total ascending'},
+            margin=dict(l=100, r=20, t=20, b=20)
+        ),
+        'itens': criar_figura_barras(
+            'itens_higienizados', CORES['secundaria'],
+            xaxis_tickangle=-45,
+            margin=dict(l=20, r=20, t=20, b=80)
+        ),
+        'receita': criar_figura_receita()
+    }
+
+def atualizar_pizza(contagem):
+    # Só os dados do traço vão na resposta; o layout já está no navegador
+    patch = Patch()
+    patch['data'][0]['labels'] = contagem.index.tolist()
+    patch['data'][0]['values'] = contagem.tolist()
+    return patch
+
+def atualizar_barras(contagem):
+    patch = Patch()
+    patch['data'][0]['x'] = contagem.tolist()
+    patch['data'][0]['y'] = contagem.index.tolist()
+    patch['data'][0]['marker']['color'] = contagem.tolist()
+    return patch
+
+def atualizar_linha(receita):
+    patch = Patch()
+    patch['data'][0]['x'] = [periodo.strftime('%Y-%m-%d') for periodo in receita.index]
+    patch['data'][0]['y'] = receita['soma'].round(2).tolist()
+    patch['data'][0]['customdata'] = receita['servicos'].astype(int).tolist()
+    return patch
+
+def estilo_aviso(aviso):
+    # Faixa de aviso de falha na carga dos dados (oculta sem aviso)
+    if not aviso:
+        return {'display': 'none'}
+    return {
+        'backgroundColor': CORES['secundaria'],
         'color': CORES['terciaria'],
-        'padding': '25px 40px',
-        'boxShadow': '0 4px 12px rgba(0,0,0,0.1)',
-        'display': 'flex',
-        'alignItems': 'center',
-        'justifyContent': 'space-between',
-        'position': 'sticky',
-        'top': '0',
-        'zIndex': '1000',
-        'borderBottom': f'3px solid {CORES["secundaria"]}'
-    }, children=[
-        html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
-
-            
-            html.H1("SOFA NOVODENOVO", style={
-                'margin': '0',
-                'fontSize': '32px',
-                'fontWeight': '700',
-                'letterSpacing': '2px',
-                'textTransform': 'uppercase'
-            }),
-            html.Div(style={
-                'height': '40px',
-                'width': '3px',
-                'backgroundColor': CORES['secundaria'],
-                'margin': '0 20px',
-                'opacity': '0.8'
-            }),
-            html.P("DASHBOARD ANALÍTICO", style={
-                'margin': '0',
-                'fontSize': '18px',
-                'fontWeight': '300',
-                'letterSpacing': '1px',
-                'opacity': '0.9'
-                
-            })
-        ]),
-    ]),
-    
-    # Container Principal
-    html.Div(style={
-        'padding': '30px 40px',
-        'maxWidth': '1600px',
-        'margin': '0 auto'
+        'padding': '12px 40px',
+        'fontWeight': '500'
+    }
+
+# Estilos trocados enquanto os insights são calculados
+ESTILO_INSIGHTS = {
+    'normal': {'flex': '1', 'overflowY': 'auto', 'paddingRight': '10px'},
+    'calculando': {'flex': '1', 'overflowY': 'auto', 'paddingRight': '10px', 'opacity': '0.4'}
+}
+ESTILO_PROGRESSO = {
+    'oculto': {'display': 'none'},
+    'visivel': {'display': 'block', 'width': '100%', 'marginBottom': '15px', 'accentColor': CORES['secundaria']}
+}
+
+# =============================================
+# LAYOUT DO DASHBOARD
+# =============================================
+def montar_layout(carregar=True):
+    """
+    Layout como função: o Dash o monta a cada carregamento da página,
+    com as opções dos filtros e as colunas dos dados atuais.
+    Com carregar=False monta só a estrutura (ids), sem ler os dados.
+    """
+    estado, dados, assinatura, figuras, aviso = None, None, None, {}, None
+    if carregar:
+        # Sem dados carregados a página abre só com o aviso; verificar_dados tenta de novo
+        estado, aviso = obter_estado_com_aviso()
+        if estado is not None:
+            dados, assinatura, figuras = estado['dados'], estado['assinatura'], figuras_base()
+    data_minima, data_maxima = limites_periodo(estado)
+
+    return html.Div(style={
+        'fontFamily': "'Montserrat', sans-serif",
+        'backgroundColor': CORES['fundo'],
+        'minHeight': '100vh',
+        'margin': '0',
+        'padding': '0',
+        'color': CORES['texto']
     }, children=[
-        # Linha de Filtros (Premium)
+        # Verificação periódica de dados novos em clientes.csv
+        dcc.Interval(id='intervalo-dados', interval=INTERVALO_ATUALIZACAO),
+        dcc.Store(id='versao-dados', data=assinatura),
+        html.Div(aviso, id='aviso-dados', style=estilo_aviso(aviso)),
+
+        # Barra de Navegação Superior (Premium)
         html.Div(style={
-            'display': 'grid',
-            'gridTemplateColumns': 'repeat(auto-fit, minmax(300px, 1fr))',
-            'gap': '25px',
-            'marginBottom': '30px'
+            'background': CORES['gradiente'],
+            'color': CORES['terciaria'],
+            'padding': '25px 40px',
+            'boxShadow': '0 4px 12px rgba(0,0,0,0.1)',
+            'display': 'flex',
+            'alignItems': 'center',
+            'justifyContent': 'space-between',
+            'position': 'sticky',
+            'top': '0',
+            'zIndex': '1000',
+            'borderBottom': f'3px solid {CORES["secundaria"]}'
         }, children=[
-            # Filtro Sexo
-            html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '10px',
-                'padding': '20px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["destaque"]}',
-                'transition': 'all 0.3s ease'
-            }, children=[
+            html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+
+
+                html.H1("SOFA NOVODENOVO", style={
+                    'margin': '0',
+                    'fontSize': '32px',
+                    'fontWeight': '700',
+                    'letterSpacing': '2px',
+                    'textTransform': 'uppercase'
+                }),
                 html.Div(style={
-                    'display': 'flex',
-                    'alignItems': 'center',
-                    'marginBottom': '15px'
-                }, children=[
-                    html.I(className="fas fa-venus-mars", style={
-                        'color': CORES['destaque'],
-                        'fontSize': '20px',
-                        'marginRight': '10px'
-                    }),
-                    html.Label("FILTRAR POR SEXO", style={
-                        'fontWeight': '600',
-                        'color': CORES['primaria'],
-                        'fontSize': '14px',
-                        'textTransform': 'uppercase',
-                        'letterSpacing': '1px'
-                    })
-                ]),
-                dcc.Dropdown(
-                    id='filtro-sexo',
-                    options=[{'label': 'Todos', 'value': 'all'}] + 
-                           [{'label': sexo, 'value': sexo} for sexo in dados['sexo'].unique()],
-                    value='all',
-                    clearable=False,
-                    style={
-                        'width': '100%',
-                        'border': f'1px solid {CORES["borda"]}',
-                        'borderRadius': '8px',
-                        'fontFamily': "'Montserrat', sans-serif"
-                    }
-                )
+                    'height': '40px',
+                    'width': '3px',
+                    'backgroundColor': CORES['secundaria'],
+                    'margin': '0 20px',
+                    'opacity': '0.8'
+                }),
+                html.P("DASHBOARD ANALÍTICO", style={
+                    'margin': '0',
+                    'fontSize': '18px',
+                    'fontWeight': '300',
+                    'letterSpacing': '1px',
+                    'opacity': '0.9'
+
+                })
             ]),
-            
-            # Filtro Bairro
-            html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '10px',
-                'padding': '20px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["sucesso"]}',
-                'transition': 'all 0.3s ease'
-            }, children=[
-                html.Div(style={
-                    'display': 'flex',
-                    'alignItems': 'center',
-                    'marginBottom': '15px'
-                }, children=[
-                    html.I(className="fas fa-map-marker-alt", style={
-                        'color': CORES['sucesso'],
-                        'fontSize': '20px',
-                        'marginRight': '10px'
-                    }),
-                    html.Label("FILTRAR POR BAIRRO", style={
-                        'fontWeight': '600',
-                        'color': CORES['primaria'],
-                        'fontSize': '14px',
-                        'textTransform': 'uppercase',
-                        'letterSpacing': '1px'
-                    })
-                ]),
-                dcc.Dropdown(
-                    id='filtro-bairro',
-                    options=[{'label': 'Todos', 'value': 'all'}] + 
-                           [{'label': bairro, 'value': bairro} for bairro in dados['bairro'].unique()],
-                    value='all',
-                    clearable=False,
-                    style={
-                        'width': '100%',
-                        'border': f'1px solid {CORES["borda"]}',
-                        'borderRadius': '8px',
-                        'fontFamily': "'Montserrat', sans-serif"
-                    }
-                )
-            ])
         ]),
-        
-        # Grade de Gráficos (Premium)
+
+        # Container Principal
         html.Div(style={
-            'display': 'grid',
-            'gridTemplateColumns': 'repeat(auto-fit, minmax(400px, 1fr))',
-            'gap': '25px',
-            'marginBottom': '30px'
+            'padding': '30px 40px',
+            'maxWidth': '1600px',
+            'margin': '0 auto'
         }, children=[
-            # Gráfico de Sexo
+            # Linha de Filtros (Premium)
             html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '12px',
-                'padding': '25px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["secundaria"]}',
-                'minHeight': '450px',
-                'display': 'flex',
-                'flexDirection': 'column',
-                'transition': 'all 0.3s ease',
-                ':hover': {
-                    'transform': 'translateY(-5px)',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
-                }
+                'display': 'grid',
+                'gridTemplateColumns': 'repeat(auto-fit, minmax(300px, 1fr))',
+                'gap': '25px',
+                'marginBottom': '30px'
             }, children=[
+                # Filtro Sexo
                 html.Div(style={
-                    'display': 'flex',
-                    'justifyContent': 'space-between',
-                    'alignItems': 'center',
-                    'marginBottom': '20px',
-                    'paddingBottom': '15px',
-                    'borderBottom': f'1px solid {CORES["borda"]}'
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '10px',
+                    'padding': '20px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["destaque"]}',
+                    'transition': 'all 0.3s ease'
                 }, children=[
-                    html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '15px'
+                    }, children=[
                         html.I(className="fas fa-venus-mars", style={
-                            'color': CORES['secundaria'],
-                            'fontSize': '24px',
-                            'marginRight': '12px'
+                            'color': CORES['destaque'],
+                            'fontSize': '20px',
+                            'marginRight': '10px'
                         }),
-                        html.H3("Distribuição por Sexo", style={
+                        html.Label("FILTRAR POR SEXO", style={
+                            'fontWeight': '600',
                             'color': CORES['primaria'],
-                            'margin': '0',
+                            'fontSize': '14px',
+                            'textTransform': 'uppercase',
+                            'letterSpacing': '1px'
+                        })
+                    ]),
+                    dcc.Dropdown(
+                        id='filtro-sexo',
+                        options=opcoes_filtro(estado, 'sexo'),
+                        value=[],
+                        multi=True,
+                        placeholder='Todos',
+                        style={
+                            'width': '100%',
+                            'border': f'1px solid {CORES["borda"]}',
+                            'borderRadius': '8px',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        }
+                    )
+                ]),
+
+                # Filtro Bairro
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '10px',
+                    'padding': '20px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["sucesso"]}',
+                    'transition': 'all 0.3s ease'
+                }, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '15px'
+                    }, children=[
+                        html.I(className="fas fa-map-marker-alt", style={
+                            'color': CORES['sucesso'],
                             'fontSize': '20px',
-                            'fontWeight': '600'
+                            'marginRight': '10px'
+                        }),
+                        html.Label("FILTRAR POR BAIRRO", style={
+                            'fontWeight': '600',
+                            'color': CORES['primaria'],
+                            'fontSize': '14px',
+                            'textTransform': 'uppercase',
+                            'letterSpacing': '1px'
                         })
                     ]),
+                    dcc.Dropdown(
+                        id='filtro-bairro',
+                        options=opcoes_bairro(estado),
+                        placeholder='Todos (digite para buscar...)',
+                        value=[],
+                        multi=True,
+                        style={
+                            'width': '100%',
+                            'border': f'1px solid {CORES["borda"]}',
+                            'borderRadius': '8px',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        }
+                    )
+                ]),
+
+                # Filtro Cidade
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '10px',
+                    'padding': '20px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["primaria"]}',
+                    'transition': 'all 0.3s ease'
+                }, children=[
                     html.Div(style={
-                        'backgroundColor': CORES['primaria'],
-                        'color': CORES['terciaria'],
-                        'padding': '5px 12px',
-                        'borderRadius': '20px',
-                        'fontSize': '12px',
-                        'fontWeight': '500',
-                        'letterSpacing': '0.5px'
-                    }, children="DEMOGRAFIA")
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '15px'
+                    }, children=[
+                        html.I(className="fas fa-city", style={
+                            'color': CORES['primaria'],
+                            'fontSize': '20px',
+                            'marginRight': '10px'
+                        }),
+                        html.Label("FILTRAR POR CIDADE", style={
+                            'fontWeight': '600',
+                            'color': CORES['primaria'],
+                            'fontSize': '14px',
+                            'textTransform': 'uppercase',
+                            'letterSpacing': '1px'
+                        })
+                    ]),
+                    dcc.Dropdown(
+                        id='filtro-cidade',
+                        options=opcoes_filtro(estado, 'cidade'),
+                        value=[],
+                        multi=True,
+                        placeholder='Todos',
+                        style={
+                            'width': '100%',
+                            'border': f'1px solid {CORES["borda"]}',
+                            'borderRadius': '8px',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        }
+                    )
                 ]),
-                dcc.Graph(
-                    id='grafico-sexo',
-                    config={'displayModeBar': False},
-                    style={'flex': '1', 'height': '100%'}
-                )
-            ]),
-            
-            # Gráfico de Bairros
-            html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '12px',
-                'padding': '25px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["destaque"]}',
-                'minHeight': '450px',
-                'display': 'flex',
-                'flexDirection': 'column',
-                'transition': 'all 0.3s ease',
-                ':hover': {
-                    'transform': 'translateY(-5px)',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
-                }
-            }, children=[
+
+                # Filtro Itens
                 html.Div(style={
-                    'display': 'flex',
-                    'justifyContent': 'space-between',
-                    'alignItems': 'center',
-                    'marginBottom': '20px',
-                    'paddingBottom': '15px',
-                    'borderBottom': f'1px solid {CORES["borda"]}'
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '10px',
+                    'padding': '20px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["destaque"]}',
+                    'transition': 'all 0.3s ease'
                 }, children=[
-                    html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
-                        html.I(className="fas fa-map-marked-alt", style={
+                    html.Div(style={
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '15px'
+                    }, children=[
+                        html.I(className="fas fa-couch", style={
                             'color': CORES['destaque'],
-                            'fontSize': '24px',
-                            'marginRight': '12px'
+                            'fontSize': '20px',
+                            'marginRight': '10px'
                         }),
-                        html.H3("Top Bairros", style={
+                        html.Label("FILTRAR POR ITENS", style={
+                            'fontWeight': '600',
                             'color': CORES['primaria'],
-                            'margin': '0',
+                            'fontSize': '14px',
+                            'textTransform': 'uppercase',
+                            'letterSpacing': '1px'
+                        })
+                    ]),
+                    dcc.Dropdown(
+                        id='filtro-itens',
+                        options=opcoes_itens(estado),
+                        value=[],
+                        multi=True,
+                        placeholder='Todos',
+                        style={
+                            'width': '100%',
+                            'border': f'1px solid {CORES["borda"]}',
+                            'borderRadius': '8px',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        }
+                    )
+                ]),
+
+                # Filtro Período
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '10px',
+                    'padding': '20px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["secundaria"]}',
+                    'transition': 'all 0.3s ease'
+                }, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '15px'
+                    }, children=[
+                        html.I(className="fas fa-calendar-alt", style={
+                            'color': CORES['secundaria'],
                             'fontSize': '20px',
-                            'fontWeight': '600'
+                            'marginRight': '10px'
+                        }),
+                        html.Label("FILTRAR POR PERÍODO", style={
+                            'fontWeight': '600',
+                            'color': CORES['primaria'],
+                            'fontSize': '14px',
+                            'textTransform': 'uppercase',
+                            'letterSpacing': '1px'
                         })
                     ]),
+                    dcc.DatePickerRange(
+                        id='filtro-periodo',
+                        min_date_allowed=data_minima,
+                        max_date_allowed=data_maxima,
+                        initial_visible_month=data_maxima,
+                        display_format='DD/MM/YYYY',
+                        start_date_placeholder_text='Início',
+                        end_date_placeholder_text='Fim',
+                        clearable=True,
+                        style={
+                            'width': '100%',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        }
+                    )
+                ])
+            ]),
+
+            # Grade de Gráficos (Premium)
+            html.Div(style={
+                'display': 'grid',
+                'gridTemplateColumns': 'repeat(auto-fit, minmax(400px, 1fr))',
+                'gap': '25px',
+                'marginBottom': '30px'
+            }, children=[
+                # Gráfico de Sexo
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '12px',
+                    'padding': '25px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["secundaria"]}',
+                    'minHeight': '450px',
+                    'display': 'flex',
+                    'flexDirection': 'column',
+                    'transition': 'all 0.3s ease',
+                    ':hover': {
+                        'transform': 'translateY(-5px)',
+                        'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
+                    }
+                }, children=[
                     html.Div(style={
-                        'backgroundColor': CORES['primaria'],
-                        'color': CORES['terciaria'],
-                        'padding': '5px 12px',
-                        'borderRadius': '20px',
-                        'fontSize': '12px',
-                        'fontWeight': '500',
-                        'letterSpacing': '0.5px'
-                    }, children="GEOGRAFIA")
+                        'display': 'flex',
+                        'justifyContent': 'space-between',
+                        'alignItems': 'center',
+                        'marginBottom': '20px',
+                        'paddingBottom': '15px',
+                        'borderBottom': f'1px solid {CORES["borda"]}'
+                    }, children=[
+                        html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                            html.I(className="fas fa-venus-mars", style={
+                                'color': CORES['secundaria'],
+                                'fontSize': '24px',
+                                'marginRight': '12px'
+                            }),
+                            html.H3("Distribuição por Sexo", style={
+                                'color': CORES['primaria'],
+                                'margin': '0',
+                                'fontSize': '20px',
+                                'fontWeight': '600'
+                            })
+                        ]),
+                        html.Div(style={
+                            'backgroundColor': CORES['primaria'],
+                            'color': CORES['terciaria'],
+                            'padding': '5px 12px',
+                            'borderRadius': '20px',
+                            'fontSize': '12px',
+                            'fontWeight': '500',
+                            'letterSpacing': '0.5px'
+                        }, children="DEMOGRAFIA")
+                    ]),
+                    dcc.Graph(
+                        id='grafico-sexo',
+                        figure=figuras.get('sexo'),
+                        config={'displayModeBar': False},
+                        style={'flex': '1', 'height': '100%'}
+                    )
                 ]),
-                dcc.Graph(
-                    id='grafico-bairros',
-                    config={'displayModeBar': False},
-                    style={'flex': '1', 'height': '100%'}
-                )
+
+                # Gráfico de Bairros
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '12px',
+                    'padding': '25px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["destaque"]}',
+                    'minHeight': '450px',
+                    'display': 'flex',
+                    'flexDirection': 'column',
+                    'transition': 'all 0.3s ease',
+                    ':hover': {
+                        'transform': 'translateY(-5px)',
+                        'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
+                    }
+                }, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'justifyContent': 'space-between',
+                        'alignItems': 'center',
+                        'marginBottom': '20px',
+                        'paddingBottom': '15px',
+                        'borderBottom': f'1px solid {CORES["borda"]}'
+                    }, children=[
+                        html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                            html.I(className="fas fa-map-marked-alt", style={
+                                'color': CORES['destaque'],
+                                'fontSize': '24px',
+                                'marginRight': '12px'
+                            }),
+                            html.H3("Top Bairros", style={
+                                'color': CORES['primaria'],
+                                'margin': '0',
+                                'fontSize': '20px',
+                                'fontWeight': '600'
+                            })
+                        ]),
+                        html.Div(style={
+                            'backgroundColor': CORES['primaria'],
+                            'color': CORES['terciaria'],
+                            'padding': '5px 12px',
+                            'borderRadius': '20px',
+                            'fontSize': '12px',
+                            'fontWeight': '500',
+                            'letterSpacing': '0.5px'
+                        }, children="GEOGRAFIA")
+                    ]),
+                    dcc.Graph(
+                        id='grafico-bairros',
+                        figure=figuras.get('bairros'),
+                        config={'displayModeBar': False},
+                        style={'flex': '1', 'height': '100%'}
+                    )
+                ]),
+
+                # Gráfico de Itens
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '12px',
+                    'padding': '25px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["sucesso"]}',
+                    'minHeight': '450px',
+                    'display': 'flex',
+                    'flexDirection': 'column',
+                    'transition': 'all 0.3s ease',
+                    ':hover': {
+                        'transform': 'translateY(-5px)',
+                        'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
+                    }
+                }, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'justifyContent': 'space-between',
+                        'alignItems': 'center',
+                        'marginBottom': '20px',
+                        'paddingBottom': '15px',
+                        'borderBottom': f'1px solid {CORES["borda"]}'
+                    }, children=[
+                        html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                            html.I(className="fas fa-couch", style={
+                                'color': CORES['sucesso'],
+                                'fontSize': '24px',
+                                'marginRight': '12px'
+                            }),
+                            html.H3("Itens Mais Higienizados", style={
+                                'color': CORES['primaria'],
+                                'margin': '0',
+                                'fontSize': '20px',
+                                'fontWeight': '600'
+                            })
+                        ]),
+                        html.Div(style={
+                            'backgroundColor': CORES['primaria'],
+                            'color': CORES['terciaria'],
+                            'padding': '5px 12px',
+                            'borderRadius': '20px',
+                            'fontSize': '12px',
+                            'fontWeight': '500',
+                            'letterSpacing': '0.5px'
+                        }, children="PRODUTOS")
+                    ]),
+                    dcc.Graph(
+                        id='grafico-itens',
+                        figure=figuras.get('itens'),
+                        config={'displayModeBar': False},
+                        style={'flex': '1', 'height': '100%'}
+                    )
+                ])
             ]),
-            
-            # Gráfico de Itens
+
+            # Gráfico de Receita por Período
             html.Div(style={
                 'backgroundColor': CORES['terciaria'],
                 'borderRadius': '12px',
                 'padding': '25px',
                 'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["sucesso"]}',
-                'minHeight': '450px',
-                'display': 'flex',
-                'flexDirection': 'column',
-                'transition': 'all 0.3s ease',
-                ':hover': {
-                    'transform': 'translateY(-5px)',
-                    'boxShadow': '0 8px 25px rgba(0,0,0,0.12)'
-                }
+                'borderTop': f'4px solid {CORES["destaque"]}',
+                'marginBottom': '30px'
             }, children=[
                 html.Div(style={
                     'display': 'flex',
@@ -324,12 +895,12 @@ app.layout = html.Div(style={
                     'borderBottom': f'1px solid {CORES["borda"]}'
                 }, children=[
                     html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
-                        html.I(className="fas fa-couch", style={
-                            'color': CORES['sucesso'],
+                        html.I(className="fas fa-chart-line", style={
+                            'color': CORES['destaque'],
                             'fontSize': '24px',
                             'marginRight': '12px'
                         }),
-                        html.H3("Itens Mais Higienizados", style={
+                        html.H3("Receita por Período", style={
                             'color': CORES['primaria'],
                             'margin': '0',
                             'fontSize': '20px',
@@ -344,290 +915,314 @@ app.layout = html.Div(style={
                         'fontSize': '12px',
                         'fontWeight': '500',
                         'letterSpacing': '0.5px'
-                    }, children="PRODUTOS")
+                    }, children="FINANCEIRO")
                 ]),
                 dcc.Graph(
-                    id='grafico-itens',
+                    id='grafico-receita',
+                    figure=figuras.get('receita'),
                     config={'displayModeBar': False},
-                    style={'flex': '1', 'height': '100%'}
+                    style={'height': '350px'}
                 )
-            ])
-        ]),
-        
-        # Área Inferior (Tabela + Insights)
-        html.Div(style={
-            'display': 'grid',
-            'gridTemplateColumns': 'minmax(0, 2fr) minmax(0, 1fr)',
-            'gap': '25px',
-            'marginBottom': '30px'
-        }, children=[
-            # Tabela de Dados (Premium)
+            ]),
+
+            # Área Inferior (Tabela + Insights)
             html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '12px',
-                'padding': '25px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["primaria"]}'
+                'display': 'grid',
+                'gridTemplateColumns': 'minmax(0, 2fr) minmax(0, 1fr)',
+                'gap': '25px',
+                'marginBottom': '30px'
             }, children=[
+                # Tabela de Dados (Premium)
+                html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '12px',
+                    'padding': '25px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["primaria"]}'
+                }, children=[
+                    html.Div(style={
+                        'display': 'flex',
+                        'justifyContent': 'space-between',
+                        'alignItems': 'center',
+                        'marginBottom': '20px',
+                        'paddingBottom': '15px',
+                        'borderBottom': f'1px solid {CORES["borda"]}'
+                    }, children=[
+                        html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
+                            html.I(className="fas fa-table", style={
+                                'color': CORES['primaria'],
+                                'fontSize': '24px',
+                                'marginRight': '12px'
+                            }),
+                            html.H3("Dados dos Clientes", style={
+                                'color': CORES['primaria'],
+                                'margin': '0',
+                                'fontSize': '20px',
+                                'fontWeight': '600'
+                            })
+                        ]),
+                        html.Div([
+                            # Exportação com os filtros atuais (href montado no navegador)
+                            html.A([html.I(className="fas fa-file-csv", style={'marginRight': '6px'}), "CSV"],
+                                   id='exportar-csv', href='/exportar', style={
+                                'marginRight': '15px',
+                                'fontSize': '14px',
+                                'color': CORES['destaque'],
+                                'textDecoration': 'none'
+                            }),
+                            html.A([html.I(className="fas fa-file-excel", style={'marginRight': '6px'}), "Excel"],
+                                   id='exportar-xlsx', href='/exportar?formato=xlsx', style={
+                                'marginRight': '25px',
+                                'fontSize': '14px',
+                                'color': CORES['sucesso'],
+                                'textDecoration': 'none'
+                            }),
+                            html.Span("Itens por página: ", style={
+                                'marginRight': '10px',
+                                'fontSize': '14px'
+                            }),
+                            dcc.Dropdown(
+                                id='page-size',
+                                options=[{'label': str(i), 'value': i} for i in [5, 10, 20]],
+                                value=10,
+                                clearable=False,
+                                style={
+                                    'width': '80px',
+                                    'display': 'inline-block',
+                                    'fontFamily': "'Montserrat', sans-serif"
+                                }
+                            )
+                        ])
+                    ]),
+                    dash_table.DataTable(
+                        id='tabela-clientes',
+                        columns=[{"name": i, "id": i} for i in (dados.columns if dados is not None else [])],
+                        page_current=0,
+                        page_size=10,
+                        page_action='custom',
+                        sort_action='custom',
+                        sort_mode='multi',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query='',
+                        style_table={
+                            'overflowX': 'auto',
+                            'borderRadius': '8px',
+                            'border': f'1px solid {CORES["borda"]}'
+                        },
+                        style_header={
+                            'backgroundColor': CORES['primaria'],
+                            'color': CORES['terciaria'],
+                            'fontWeight': 'bold',
+                            'border': 'none',
+                            'fontFamily': "'Montserrat', sans-serif"
+                        },
+                        style_cell={
+                            'padding': '12px',
+                            'textAlign': 'left',
+                            'border': f'1px solid {CORES["borda"]}',
+                            'maxWidth': '150px',
+                            'overflow': 'hidden',
+                            'textOverflow': 'ellipsis',
+                            'fontFamily': "'Montserrat', sans-serif",
+                            'fontSize': '14px'
+                        },
+                        style_data_conditional=[
+                            {
+                                'if': {'row_index': 'odd'},
+                                'backgroundColor': CORES['fundo']
+                            },
+                            {
+                                'if': {'column_id': 'valor_servico'},
+                                'color': CORES['secundaria'],
+                                'fontWeight': 'bold'
+                            }
+                        ],
+                        tooltip_duration=None
+                    )
+                ]),
+
+                # Card de Insights (Premium)
                 html.Div(style={
+                    'backgroundColor': CORES['terciaria'],
+                    'borderRadius': '12px',
+                    'padding': '25px',
+                    'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
+                    'borderTop': f'4px solid {CORES["secundaria"]}',
+                    'height': '500px',
                     'display': 'flex',
-                    'justifyContent': 'space-between',
-                    'alignItems': 'center',
-                    'marginBottom': '20px',
-                    'paddingBottom': '15px',
-                    'borderBottom': f'1px solid {CORES["borda"]}'
+                    'flexDirection': 'column'
                 }, children=[
-                    html.Div(style={'display': 'flex', 'alignItems': 'center'}, children=[
-                        html.I(className="fas fa-table", style={
-                            'color': CORES['primaria'],
+                    html.Div(style={
+                        'display': 'flex',
+                        'alignItems': 'center',
+                        'marginBottom': '20px',
+                        'paddingBottom': '15px',
+                        'borderBottom': f'1px solid {CORES["borda"]}'
+                    }, children=[
+                        html.I(className="fas fa-lightbulb", style={
+                            'color': CORES['secundaria'],
                             'fontSize': '24px',
                             'marginRight': '12px'
                         }),
-                        html.H3("Dados dos Clientes", style={
+                        html.H3("Insights Estratégicos", style={
                             'color': CORES['primaria'],
                             'margin': '0',
                             'fontSize': '20px',
                             'fontWeight': '600'
                         })
                     ]),
-                    html.Div([
-                        html.Span("Itens por página: ", style={
-                            'marginRight': '10px',
-                            'fontSize': '14px'
-                        }),
-                        dcc.Dropdown(
-                            id='page-size',
-                            options=[{'label': str(i), 'value': i} for i in [5, 10, 20]],
-                            value=10,
-                            clearable=False,
-                            style={
-                                'width': '80px',
-                                'display': 'inline-block',
-                                'fontFamily': "'Montserrat', sans-serif"
-                            }
-                        )
-                    ])
-                ]),
-                dash_table.DataTable(
-                    id='tabela-clientes',
-                    columns=[{"name": i, "id": i} for i in dados.columns],
-                    page_size=10,
-                    style_table={
-                        'overflowX': 'auto',
-                        'borderRadius': '8px',
-                        'border': f'1px solid {CORES["borda"]}'
-                    },
-                    style_header={
-                        'backgroundColor': CORES['primaria'],
-                        'color': CORES['terciaria'],
-                        'fontWeight': 'bold',
-                        'border': 'none',
-                        'fontFamily': "'Montserrat', sans-serif"
-                    },
-                    style_cell={
-                        'padding': '12px',
-                        'textAlign': 'left',
-                        'border': f'1px solid {CORES["borda"]}',
-                        'maxWidth': '150px',
-                        'overflow': 'hidden',
-                        'textOverflow': 'ellipsis',
-                        'fontFamily': "'Montserrat', sans-serif",
-                        'fontSize': '14px'
-                    },
-                    style_data_conditional=[
-                        {
-                            'if': {'row_index': 'odd'},
-                            'backgroundColor': CORES['fundo']
-                        },
-                        {
-                            'if': {'column_id': 'valor_servico'},
-                            'color': CORES['secundaria'],
-                            'fontWeight': 'bold'
-                        }
-                    ],
-                    tooltip_data=[
-                        {
-                            column: {'value': str(value), 'type': 'markdown'}
-                            for column, value in row.items()
-                        } for row in dados.to_dict('records')
-                    ],
-                    tooltip_duration=None
-                )
+                    # Progresso do cálculo em segundo plano (visível só enquanto roda)
+                    html.Progress(id='progresso-insights', style=ESTILO_PROGRESSO['oculto']),
+                    html.Div(
+                        id='div-insights',
+                        style=ESTILO_INSIGHTS['normal']
+                    )
+                ])
             ]),
-            
-            # Card de Insights (Premium)
-            html.Div(style={
-                'backgroundColor': CORES['terciaria'],
-                'borderRadius': '12px',
-                'padding': '25px',
-                'boxShadow': '0 5px 15px rgba(0,0,0,0.08)',
-                'borderTop': f'4px solid {CORES["secundaria"]}',
-                'height': '500px',
-                'display': 'flex',
-                'flexDirection': 'column'
+
+            # Rodapé Profissional
+            html.Footer(style={
+                'textAlign': 'center',
+                'padding': '20px',
+                'backgroundColor': CORES['primaria'],
+                'color': CORES['terciaria'],
+                'marginTop': '40px',
+                'fontSize': '14px'
             }, children=[
                 html.Div(style={
+                    'maxWidth': '1200px',
+                    'margin': '0 auto',
                     'display': 'flex',
-                    'alignItems': 'center',
-                    'marginBottom': '20px',
-                    'paddingBottom': '15px',
-                    'borderBottom': f'1px solid {CORES["borda"]}'
+                    'justifyContent': 'space-between',
+                    'alignItems': 'center'
                 }, children=[
-                    html.I(className="fas fa-lightbulb", style={
-                        'color': CORES['secundaria'],
-                        'fontSize': '24px',
-                        'marginRight': '12px'
-                    }),
-                    html.H3("Insights Estratégicos", style={
-                        'color': CORES['primaria'],
-                        'margin': '0',
-                        'fontSize': '20px',
-                        'fontWeight': '600'
-                    })
-                ]),
-                html.Div(
-                    id='div-insights',
-                    style={
-                        'flex': '1',
-                        'overflowY': 'auto',
-                        'paddingRight': '10px'
-                    }
-                )
-            ])
-        ]),
-        
-        # Rodapé Profissional
-        html.Footer(style={
-            'textAlign': 'center',
-            'padding': '20px',
-            'backgroundColor': CORES['primaria'],
-            'color': CORES['terciaria'],
-            'marginTop': '40px',
-            'fontSize': '14px'
-        }, children=[
-            html.Div(style={
-                'maxWidth': '1200px',
-                'margin': '0 auto',
-                'display': 'flex',
-                'justifyContent': 'space-between',
-                'alignItems': 'center'
-            }, children=[
-                html.P("© 2025 Sofá Novo de Novo | Todos os direitos reservados"),
-                html.Div(style={'display': 'flex'}, children=[
-                    html.A("Termos de Uso", href="#", style={
-                        'color': CORES['terciaria'],
-                        'margin': '0 15px',
-                        'textDecoration': 'none'
-                    }),
-                    html.A("Política de Privacidade", href="#", style={
-                        'color': CORES['terciaria'],
-                        'margin': '0 15px',
-                        'textDecoration': 'none'
-                    }),
-                    
+                    html.P("© 2025 Sofá Novo de Novo | Todos os direitos reservados"),
+                    html.Div(style={'display': 'flex'}, children=[
+                        html.A("Termos de Uso", href="#", style={
+                            'color': CORES['terciaria'],
+                            'margin': '0 15px',
+                            'textDecoration': 'none'
+                        }),
+                        html.A("Política de Privacidade", href="#", style={
+                            'color': CORES['terciaria'],
+                            'margin': '0 15px',
+                            'textDecoration': 'none'
+                        }),
+
+                    ])
                 ])
             ])
         ])
     ])
-])
 
 # =============================================
-# CALLBACKS (mantidos iguais)
+# CALLBACKS
 # =============================================
-@app.callback(
-    [Output('grafico-sexo', 'figure'),
-     Output('grafico-bairros', 'figure'),
-     Output('grafico-itens', 'figure'),
-     Output('tabela-clientes', 'data'),
-     Output('tabela-clientes', 'page_size')],
-    [Input('filtro-sexo', 'value'),
-     Input('filtro-bairro', 'value'),
-     Input('page-size', 'value')]
-)
-def atualizar_conteudo(sexo, bairro, page_size):
-    df_filtrado = dados.copy()
-    
-    if sexo != 'all':
-        df_filtrado = df_filtrado[df_filtrado['sexo'] == sexo]
-    if bairro != 'all':
-        df_filtrado = df_filtrado[df_filtrado['bairro'] == bairro]
-    
-    # Gráfico de Sexo
-    fig_sexo = px.pie(
-        df_filtrado,
-        names='sexo',
-        color_discrete_sequence=[CORES['primaria'], CORES['secundaria']],
-        hole=0.4
-    )
-    fig_sexo.update_layout(
-        margin=dict(l=20, r=20, t=20, b=20),
-        showlegend=True,
-        plot_bgcolor=CORES['terciaria'],
-        paper_bgcolor=CORES['terciaria'],
-        font=dict(color=CORES['texto']),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.1,
-            xanchor="center",
-            x=0.5
-        )
-    )
-    
-    # Gráfico de Bairros
-    fig_bairros = px.bar(
-        df_filtrado['bairro'].value_counts().reset_index(),
-        x='count',
-        y='bairro',
-        orientation='h',
-        color='count',
-        color_continuous_scale=[CORES['fundo'], CORES['primaria']]
-    )
-    fig_bairros.update_layout(
-        yaxis={'categoryorder': 'total ascending'},
-        coloraxis_showscale=False,
-        margin=dict(l=100, r=20, t=20, b=20),
-        plot_bgcolor=CORES['terciaria'],
-        paper_bgcolor=CORES['terciaria'],
-        font=dict(color=CORES['texto']),
-        xaxis_title=None,
-        yaxis_title=None
+@cache_respostas.memorizar('atualizar_conteudo', versao_dados)
+def atualizar_conteudo(sexo, bairro, cidade, itens, inicio, fim, _versao):
+    from src.processamento_dados import converter_periodo, contar_por
+
+    # Os gráficos saem dos cubos pré-agregados: o custo não depende do número de linhas
+    # (com período, só das linhas do período)
+    estado = obter_gerenciador().obter()
+    fatia, fatias_itens = obter_cubos(
+        estado, ler_selecao(sexo, bairro, cidade, itens), converter_periodo(inicio, fim)
     )
+    metricas.contar_linhas(fatia['servicos'].sum())
+
+    # Itens contados individualmente (cubo da tabela de itens), não pela lista inteira
+    fatia_itens = fatias_itens.get('itens_higienizados', fatia)
     
-    # Gráfico de Itens
-    fig_itens = px.bar(
-        df_filtrado['itens_higienizados'].value_counts().reset_index(),
-        x='count',
-        y='itens_higienizados',
-        color='count',
-        color_continuous_scale=[CORES['fundo'], CORES['secundaria']]
+    return (
+        atualizar_pizza(contar_por(fatia, 'sexo')),
+        atualizar_barras(contar_por(fatia, 'bairro', top=TOP_GRAFICOS)),
+        atualizar_barras(contar_por(fatia_itens, 'item', top=TOP_GRAFICOS))
     )
-    fig_itens.update_layout(
-        xaxis_tickangle=-45,
-        coloraxis_showscale=False,
-        margin=dict(l=20, r=20, t=20, b=80),
-        plot_bgcolor=CORES['terciaria'],
-        paper_bgcolor=CORES['terciaria'],
-        font=dict(color=CORES['texto']),
-        xaxis_title=None,
-        yaxis_title=None
+
+@cache_respostas.memorizar('atualizar_receita', versao_dados)
+def atualizar_receita(sexo, bairro, cidade, itens, inicio, fim, _versao):
+    from src.processamento_dados import converter_periodo, receita_por_periodo
+
+    estado = obter_gerenciador().obter()
+    selecao = ler_selecao(sexo, bairro, cidade, itens)
+    periodo = converter_periodo(inicio, fim)
+    if 'banco' in estado:
+        receita = estado['banco'].receita(selecao, periodo)
+    else:
+        # Rollups diário/mensal, recortados por busca binária no período
+        rollups, selecao = obter_rollups(estado, selecao)
+        receita = receita_por_periodo(rollups, selecao, periodo)
+    metricas.contar_linhas(receita['servicos'].sum())
+    return atualizar_linha(receita)
+
+# Entradas da tabela que mudam o conjunto de linhas exibidas
+ENTRADAS_FILTRO_TABELA = {
+    'filtro-sexo.value', 'filtro-bairro.value', 'filtro-cidade.value', 'filtro-itens.value',
+    'filtro-periodo.start_date', 'filtro-periodo.end_date', 'tabela-clientes.filter_query'
+}
+
+def filtros_alterados():
+    # Indica se o callback foi disparado por um filtro (fora de um callback, não)
+    try:
+        return any(entrada in ENTRADAS_FILTRO_TABELA for entrada in dash.ctx.triggered_prop_ids)
+    except MissingCallbackContextException:
+        return False
+
+def atualizar_tabela(sexo, bairro, cidade, itens, inicio, fim, page_current, page_size, sort_by, filter_query,
+                     _versao):
+    from src.processamento_dados import converter_periodo
+    from src.tabela import formatar_registros, preparar_consulta, paginar, gerar_tooltips
+
+    if filtros_alterados():
+        # Com outros filtros a página atual pode nem existir: volta para a primeira
+        page_current = 0
+
+    # Paginação, ordenação e filtro no servidor: só a página visível vai para o navegador.
+    # Filtro e ordenação ficam em cache, então trocar de página ou de tamanho só recorta.
+    estado = obter_gerenciador().obter()
+    selecao = ler_selecao(sexo, bairro, cidade, itens)
+    periodo = converter_periodo(inicio, fim)
+    if 'banco' in estado:
+        # Modo SQLite: filtro, ordenação e LIMIT/OFFSET no banco; só a página é lida
+        pagina_df, total_paginas, pagina = estado['banco'].pagina(
+            selecao, periodo, sort_by, filter_query, page_current, page_size
+        )
+        registros = formatar_registros(pagina_df)
+        metricas.contar_linhas(len(registros))
+        return registros, total_paginas, pagina, gerar_tooltips(registros)
+
+    chave_ordem = tuple((col['column_id'], col['direction']) for col in sort_by or [])
+    df_tabela, ordem = cache_tabela.obter(
+        (selecao, periodo, estado['versao'], filter_query or '', chave_ordem),
+        lambda: preparar_consulta(obter_subconjunto(estado, selecao, periodo), sort_by, filter_query)
     )
-    
-    return fig_sexo, fig_bairros, fig_itens, df_filtrado.to_dict('records'), page_size
+    registros, total_paginas, pagina = paginar(df_tabela, ordem, page_current, page_size)
+    metricas.contar_linhas(len(df_tabela))
 
-@app.callback(
-    Output('div-insights', 'children'),
-    [Input('filtro-sexo', 'value'),
-     Input('filtro-bairro', 'value')]
-)
-def atualizar_insights(sexo, bairro):
-    df_filtrado = dados.copy()
-    if sexo != 'all':
-        df_filtrado = df_filtrado[df_filtrado['sexo'] == sexo]
-    if bairro != 'all':
-        df_filtrado = df_filtrado[df_filtrado['bairro'] == bairro]
-    
-    insights = gerar_insights(df_filtrado)
+    # Tooltips calculados junto com a página, sempre alinhados às linhas exibidas
+    return registros, total_paginas, pagina, gerar_tooltips(registros)
+
+@cache_respostas.memorizar('atualizar_insights', versao_dados)
+def atualizar_insights(sexo, bairro, cidade, itens, inicio, fim, _versao, progresso=None):
+    from src.processamento_dados import converter_periodo, esbocos_da_selecao
+    from src.insights import calcular_insights, formatar_insights
+
+    estado = obter_gerenciador().obter()
+    selecao = ler_selecao(sexo, bairro, cidade, itens)
+    periodo = converter_periodo(inicio, fim)
+    resultado = cache_insights.obter(
+        (selecao, periodo, estado['versao']),
+        lambda: calcular_insights(
+            # As estatísticas saem só dos cubos (mantidos por delta a cada anexo, ou
+            # agregados no banco no modo SQLite), sem percorrer as linhas; no modo
+            # aproximado, os esboços respondem quando cobrem a seleção
+            None, *obter_cubos(estado, selecao, periodo), progresso=progresso,
+            esbocos=esbocos_da_selecao(estado.get('esbocos'), selecao) if periodo is None else None
+        )
+    )
+    metricas.contar_linhas(resultado['total'])
+    insights = formatar_insights(resultado)
     
     return html.Ul([
         html.Li(
@@ -648,8 +1243,230 @@ def atualizar_insights(sexo, bairro):
         ) for insight in insights
     ])
 
+def atualizar_insights_segundo_plano(definir_progresso, sexo, bairro, cidade, itens, inicio, fim, versao):
+    # Executado em outro processo; o resultado volta pelo cache em disco
+    return atualizar_insights(
+        sexo, bairro, cidade, itens, inicio, fim, versao,
+        progresso=lambda etapa, total: definir_progresso((etapa, total))
+    )
+
+def verificar_dados(_n, versao_atual, aviso_atual):
+    # A assinatura do arquivo (mtime/tamanho) é a mesma em todos os workers
+    estado, aviso = obter_estado_com_aviso()
+    if estado is None or estado['assinatura'] == versao_atual:
+        if (aviso or None) == (aviso_atual or None):
+            raise PreventUpdate
+        return (dash.no_update,) * 6 + (aviso, estilo_aviso(aviso))
+
+    return (
+        estado['assinatura'],
+        opcoes_filtro(estado, 'sexo'),
+        opcoes_filtro(estado, 'cidade'),
+        opcoes_itens(estado),
+        *limites_periodo(estado),
+        aviso,
+        estilo_aviso(aviso)
+    )
+
+def exportar_clientes():
+    """
+    /exportar?formato=csv|xlsx&sexo=&bairro=&cidade=&itens=&inicio=&fim=&filtro=
+    Aplica os mesmos filtros do dashboard (e o filter_query da tabela) e envia o
+    resultado em pedaços, sem montar o conjunto filtrado inteiro em memória.
+    Filtros de seleção múltipla repetem o parâmetro (?bairro=A&bairro=B).
+    """
+    from src.processamento_dados import converter_periodo
+    from src.exportacao import LIMITE_LINHAS_XLSX, escrever_csv, escrever_xlsx, iterar_blocos, xlsx_disponivel
+
+    argumentos = request.args
+    estado = obter_gerenciador().obter()
+    selecao = ler_selecao(*(argumentos.getlist(nome) for nome in ('sexo', 'bairro', 'cidade', 'itens')))
+    periodo = converter_periodo(argumentos.get('inicio'), argumentos.get('fim'))
+    filtro = argumentos.get('filtro', '')
+
+    if 'banco' in estado:
+        # Modo SQLite: filtros e filter_query no banco, lidos em blocos
+        banco = estado['banco']
+        colunas = banco.colunas
+        blocos = banco.iterar_blocos(selecao, periodo, filtro)
+        contar = lambda: banco.contar_linhas(selecao, periodo, filtro)
+    else:
+        dados = estado['dados']
+        posicoes = obter_posicoes(estado, selecao, periodo)
+        colunas = dados.columns
+        blocos = iterar_blocos(dados, posicoes, filtro)
+        contar = lambda: len(dados) if posicoes is None else len(posicoes)
+
+    if argumentos.get('formato') == 'xlsx':
+        if not xlsx_disponivel():
+            return Response("Exportação em Excel requer o pacote openpyxl (pip install openpyxl).", status=501)
+        if contar() > LIMITE_LINHAS_XLSX:
+            return Response("Linhas demais para uma planilha do Excel: use a exportação em CSV.", status=400)
+        conteudo = escrever_xlsx(colunas, blocos)
+        tipo, nome = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'clientes.xlsx'
+    else:
+        conteudo = escrever_csv(colunas, blocos)
+        tipo, nome = 'text/csv; charset=utf-8', 'clientes.csv'
+
+    return Response(
+        stream_with_context(conteudo),
+        mimetype=tipo,
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
+    )
+
+def buscar_bairros(busca, _versao, selecionados):
+    # Chamado a cada tecla no filtro de bairro (e quando os dados mudam)
+    return opcoes_bairro(obter_gerenciador().obter(), busca, selecionados)
+
+def registrar_callbacks(app, segundo_plano=None):
+    """
+    Registra os callbacks no app. Com `segundo_plano` (um gerenciador de callbacks
+    do Dash) os insights rodam fora do worker; se os filtros mudarem durante o
+    cálculo, o Dash encerra o processo antigo antes de iniciar o novo.
+    """
+    filtros = [
+        Input('filtro-sexo', 'value'),
+        Input('filtro-bairro', 'value'),
+        Input('filtro-cidade', 'value'),
+        Input('filtro-itens', 'value'),
+        Input('filtro-periodo', 'start_date'),
+        Input('filtro-periodo', 'end_date')
+    ]
+
+    app.callback(
+        [Output('grafico-sexo', 'figure'),
+         Output('grafico-bairros', 'figure'),
+         Output('grafico-itens', 'figure')],
+        filtros + [Input('versao-dados', 'data')]
+    )(atualizar_conteudo)
+
+    app.callback(
+        Output('grafico-receita', 'figure'),
+        filtros + [Input('versao-dados', 'data')]
+    )(atualizar_receita)
+
+    # Itens por página só mexe na tabela: repassado no navegador, sem ida ao servidor.
+    # A nova página é buscada por atualizar_tabela, que não recalcula os gráficos.
+    app.clientside_callback(
+        """
+        function(tamanho) {
+            return tamanho;
+        }
+        """,
+        Output('tabela-clientes', 'page_size'),
+        Input('page-size', 'value'),
+        prevent_initial_call=True
+    )
+
+    app.callback(
+        [Output('tabela-clientes', 'data'),
+         Output('tabela-clientes', 'page_count'),
+         Output('tabela-clientes', 'page_current'),
+         Output('tabela-clientes', 'tooltip_data')],
+        filtros + [
+            Input('tabela-clientes', 'page_current'),
+            Input('tabela-clientes', 'page_size'),
+            Input('tabela-clientes', 'sort_by'),
+            Input('tabela-clientes', 'filter_query'),
+            Input('versao-dados', 'data')
+        ]
+    )(atualizar_tabela)
+
+    if segundo_plano is None:
+        app.callback(
+            Output('div-insights', 'children'),
+            filtros + [Input('versao-dados', 'data')]
+        )(atualizar_insights)
+    else:
+        app.callback(
+            Output('div-insights', 'children'),
+            filtros + [Input('versao-dados', 'data')],
+            background=True,
+            manager=segundo_plano,
+            progress=[Output('progresso-insights', 'value'),
+                      Output('progresso-insights', 'max')],
+            running=[
+                (Output('progresso-insights', 'style'), ESTILO_PROGRESSO['visivel'], ESTILO_PROGRESSO['oculto']),
+                (Output('div-insights', 'style'), ESTILO_INSIGHTS['calculando'], ESTILO_INSIGHTS['normal'])
+            ]
+        )(atualizar_insights_segundo_plano)
+
+    # Links de exportação acompanham os filtros sem ida ao servidor
+    app.clientside_callback(
+        """
+        function(sexo, bairro, cidade, itens, inicio, fim, filtro) {
+            const parametros = new URLSearchParams();
+            const selecoes = {sexo: sexo, bairro: bairro, cidade: cidade, itens: itens};
+            for (const [nome, valores] of Object.entries(selecoes)) {
+                (valores || []).forEach(valor => parametros.append(nome, valor));
+            }
+            if (inicio) { parametros.set('inicio', inicio); }
+            if (fim) { parametros.set('fim', fim); }
+            if (filtro) { parametros.set('filtro', filtro); }
+            const consulta = parametros.toString();
+            return ['/exportar?' + consulta, '/exportar?formato=xlsx&' + consulta];
+        }
+        """,
+        [Output('exportar-csv', 'href'),
+         Output('exportar-xlsx', 'href')],
+        filtros + [Input('tabela-clientes', 'filter_query')]
+    )
+
+    app.callback(
+        Output('filtro-bairro', 'options'),
+        [Input('filtro-bairro', 'search_value'),
+         Input('versao-dados', 'data')],
+        [State('filtro-bairro', 'value')]
+    )(buscar_bairros)
+
+    app.callback(
+        [Output('versao-dados', 'data'),
+         Output('filtro-sexo', 'options'),
+         Output('filtro-cidade', 'options'),
+         Output('filtro-itens', 'options'),
+         Output('filtro-periodo', 'min_date_allowed'),
+         Output('filtro-periodo', 'max_date_allowed'),
+         Output('aviso-dados', 'children'),
+         Output('aviso-dados', 'style')],
+        [Input('intervalo-dados', 'n_intervals')],
+        [State('versao-dados', 'data'),
+         State('aviso-dados', 'children')]
+    )(verificar_dados)
+
 # =============================================
 # INICIALIZAÇÃO
 # =============================================
+def create_app(aquecimento=False):
+    """
+    Cria o app Dash sem carregar dados: o layout é uma função (montada a cada
+    carregamento da página) e os dados são lidos no primeiro uso. Com
+    `aquecimento` a leitura começa em segundo plano logo em seguida.
+    """
+    app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+    # Com um layout de validação pronto o Dash não chama montar_layout() aqui
+    app.validation_layout = montar_layout(carregar=False)
+    app.layout = montar_layout
+    registrar_callbacks(app, criar_gerenciador_segundo_plano())
+    metricas.instalar(app)
+
+    # Verificação de saúde que não depende dos dados
+    app.server.add_url_rule('/saude', 'saude', lambda: 'ok')
+    app.server.add_url_rule('/exportar', 'exportar', exportar_clientes)
+
+    if aquecimento:
+        aquecer()
+    return app
+
+_app = None
+
+def __getattr__(nome):
+    # `app` e `server` (usado por `gunicorn src.dashboard:server`) são criados no primeiro acesso
+    global _app
+    if nome in ('app', 'server'):
+        if _app is None:
+            _app = create_app(aquecimento=True)
+        return _app if nome == 'app' else _app.server
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Esboços (sketches) mescláveis usados no modo aproximado dos insights.
+
+Cada esboço é montado por bloco de linhas e unido aos dos outros blocos (ou de
+outro processo) sem voltar às linhas: o resultado da união é o mesmo que se
+todas as linhas tivessem passado por um único esboço. Limites de erro:
+
+- HyperLogLog (m = 2^precisao registradores): erro padrão relativo de
+  1,04/√m na contagem de distintos (precisao 12: ≈1,6%; cerca de 95% das
+  estimativas ficam a menos de ±3,3% do valor exato).
+- Frequentes (Misra-Gries com k contadores): cada contagem é subestimada em no
+  máximo (N - soma dos contadores)/(k + 1) ≤ N/(k + 1), e todo valor com mais de
+  N/(k + 1) ocorrências está entre os contadores.
+- Quantis (DDSketch com erro relativo α): o valor devolvido para um quantil está
+  a no máximo α·|x| do valor x que ocupa aquela posição nos dados.
+"""
+import base64
+import math
+
+import numpy as np
+import pandas as pd
+
+# Precisão do HyperLogLog: 2^12 registradores de 1 byte (4 KB por esboço)
+PRECISAO_HLL = 12
+
+# Contadores mantidos por esboço de valores frequentes
+CAPACIDADE_FREQUENTES = 128
+
+# Erro relativo dos quantis
+ERRO_QUANTIS = 0.01
+
+
+def hash_valores(serie):
+    """
+    Hash de 64 bits de cada valor não nulo, igual em qualquer processo (não depende
+    do PYTHONHASHSEED) e igual para uma coluna categórica e seus valores. Números são
+    hasheados como float64: o mesmo id sai int64 de um bloco e float64 de outro com
+    ids ausentes (aplicar_esquema), e 5 e 5.0 precisam cair no mesmo registrador.
+    """
+    serie = serie.dropna()
+    valores = serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else serie
+    if pd.api.types.is_numeric_dtype(valores) and not pd.api.types.is_bool_dtype(valores):
+        serie = serie.astype('float64')
+    return pd.util.hash_pandas_object(serie, index=False).to_numpy()
+
+
+def comprimento_bits(valores):
+    # bit_length() vetorizado de inteiros sem sinal de 64 bits (0 -> 0)
+    altos = (valores >> np.uint64(32)).astype(np.float64)
+    baixos = (valores & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(altos > 0, 32 + np.frexp(altos)[1], np.frexp(baixos)[1])
+
+
+class HyperLogLog:
+    """
+    Estimativa do número de valores distintos. A união é o máximo registrador a registrador.
+    """
+
+    def __init__(self, precisao=PRECISAO_HLL, registros=None):
+        self.precisao = precisao
+        self.registros = np.zeros(1 << precisao, dtype=np.uint8) if registros is None else registros
+
+    def adicionar(self, hashes):
+        if not len(hashes):
+            return
+        restantes = 64 - self.precisao
+        posicoes = (hashes >> np.uint64(restantes)).astype(np.int64)
+        resto = hashes & np.uint64((1 << restantes) - 1)
+        # Posição do primeiro bit 1 nos bits restantes (restantes + 1 se forem todos 0)
+        ranks = (restantes - comprimento_bits(resto) + 1).astype(np.uint8)
+        np.maximum.at(self.registros, posicoes, ranks)
+
+    def unir(self, outro):
+        return HyperLogLog(self.precisao, np.maximum(self.registros, outro.registros))
+
+    @property
+    def erro_padrao(self):
+        return 1.04 / math.sqrt(len(self.registros))
+
+    def estimar(self):
+        m = len(self.registros)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.ldexp(1.0, -self.registros.astype(np.int64)).sum()
+        vazios = int((self.registros == 0).sum())
+        if estimativa <= 2.5 * m and vazios:
+            # Poucos valores: contagem linear pelos registradores vazios
+            estimativa = m * math.log(m / vazios)
+        return int(round(estimativa))
+
+    def para_dict(self):
+        return {'precisao': self.precisao, 'registros': base64.b64encode(self.registros.tobytes()).decode('ascii')}
+
+    @classmethod
+    def de_dict(cls, conteudo):
+        registros = np.frombuffer(base64.b64decode(conteudo['registros']), dtype=np.uint8).copy()
+        return cls(conteudo['precisao'], registros)
+
+
+class Frequentes:
+    """
+    Valores mais frequentes (Misra-Gries): até `capacidade` contadores. Ao passar do
+    limite, todos perdem a (capacidade + 1)-ésima maior contagem e os zerados saem.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_FREQUENTES, contadores=None, total=0):
+        self.capacidade = capacidade
+        self.contadores = contadores or {}
+        self.total = total
+
+    def adicionar(self, contagem):
+        # `contagem`: Series valor -> ocorrências (ex.: value_counts() de um bloco)
+        contagem = contagem[contagem > 0]
+        return self._somar({valor: int(quantidade) for valor, quantidade in contagem.items()}, int(contagem.sum()))
+
+    def unir(self, outro):
+        return Frequentes(self.capacidade, dict(self.contadores), self.total)._somar(outro.contadores, outro.total)
+
+    def _somar(self, contadores, total):
+        for valor, quantidade in contadores.items():
+            self.contadores[valor] = self.contadores.get(valor, 0) + quantidade
+        self.total += total
+        if len(self.contadores) > self.capacidade:
+            corte = sorted(self.contadores.values(), reverse=True)[self.capacidade]
+            self.contadores = {valor: quantidade - corte for valor, quantidade in self.contadores.items() if quantidade > corte}
+        return self
+
+    @property
+    def erro_maximo(self):
+        # Quanto cada contagem pode estar abaixo da real
+        return (self.total - sum(self.contadores.values())) / (self.capacidade + 1)
+
+    def contagem(self):
+        """
+        Contagens estimadas, da maior para a menor (empates pela ordem dos valores).
+        """
+        contagem = pd.Series(self.contadores, dtype='int64')
+        return contagem.sort_index().sort_values(ascending=False, kind='stable')
+
+    def para_dict(self):
+        return {'capacidade': self.capacidade, 'contadores': self.contadores, 'total': self.total}
+
+    @classmethod
+    def de_dict(cls, conteudo):
+        return cls(conteudo['capacidade'], dict(conteudo['contadores']), conteudo['total'])
+
+
+class Quantis:
+    """
+    Quantis com erro relativo limitado (DDSketch): cada valor positivo cai no balde
+    ceil(log_γ(x)), com γ = (1 + α)/(1 - α); zeros e negativos ficam num balde próprio.
+    """
+
+    def __init__(self, erro_relativo=ERRO_QUANTIS, baldes=None, zeros=0):
+        self.erro_relativo = erro_relativo
+        self.gama = (1 + erro_relativo) / (1 - erro_relativo)
+        self.baldes = baldes or {}
+        self.zeros = zeros
+
+    @property
+    def total(self):
+        return self.zeros + sum(self.baldes.values())
+
+    def adicionar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        valores = valores[~np.isnan(valores)]
+        positivos = valores[valores > 0]
+        self.zeros += len(valores) - len(positivos)
+        indices, quantidades = np.unique(np.ceil(np.log(positivos) / math.log(self.gama)), return_counts=True)
+        for indice, quantidade in zip(indices.astype(np.int64).tolist(), quantidades.tolist()):
+            self.baldes[indice] = self.baldes.get(indice, 0) + quantidade
+        return self
+
+    def unir(self, outro):
+        unido = Quantis(self.erro_relativo, dict(self.baldes), self.zeros + outro.zeros)
+        for indice, quantidade in outro.baldes.items():
+            unido.baldes[indice] = unido.baldes.get(indice, 0) + quantidade
+        return unido
+
+    def quantil(self, q):
+        """
+        Valor na posição q (0 a 1) dos dados ordenados, ou NaN sem valores.
+        """
+        total = self.total
+        if not total:
+            return float('nan')
+        posicao = q * (total - 1)
+        acumulado = self.zeros
+        if posicao < acumulado:
+            return 0.0
+        for indice in sorted(self.baldes):
+            acumulado += self.baldes[indice]
+            if posicao < acumulado:
+                # Ponto do balde (γ^(i-1), γ^i] com o mesmo erro relativo para as duas pontas
+                return 2 * self.gama ** indice / (self.gama + 1)
+        return 2 * self.gama ** max(self.baldes) / (self.gama + 1)
+
+    def para_dict(self):
+        return {'erro_relativo': self.erro_relativo, 'baldes': list(self.baldes.items()), 'zeros': self.zeros}
+
+    @classmethod
+    def de_dict(cls, conteudo):
+        return cls(conteudo['erro_relativo'], dict(map(tuple, conteudo['baldes'])), conteudo['zeros'])
+
+
+class Esbocos:
+    """
+    Esboços de um segmento: serviços (exato), clientes distintos, valores frequentes
+    por coluna e quantis de valor_servico.
+    """
+
+    def __init__(self, servicos=0, clientes=None, frequentes=None, quantis=None):
+        self.servicos = servicos
+        self.clientes = clientes or HyperLogLog()
+        self.frequentes = frequentes or {}
+        self.quantis = quantis or Quantis()
+
+    def unir(self, outro):
+        return Esbocos(
+            self.servicos + outro.servicos,
+            self.clientes.unir(outro.clientes),
+            {
+                coluna: self.frequentes[coluna].unir(outro.frequentes[coluna])
+                if coluna in self.frequentes and coluna in outro.frequentes
+                else self.frequentes.get(coluna) or outro.frequentes[coluna]
+                for coluna in {**self.frequentes, **outro.frequentes}
+            },
+            self.quantis.unir(outro.quantis)
+        )
+
+    def para_dict(self):
+        return {
+            'servicos': self.servicos,
+            'clientes': self.clientes.para_dict(),
+            'frequentes': {coluna: esboco.para_dict() for coluna, esboco in self.frequentes.items()},
+            'quantis': self.quantis.para_dict()
+        }
+
+    @classmethod
+    def de_dict(cls, conteudo):
+        return cls(
+            conteudo['servicos'],
+            HyperLogLog.de_dict(conteudo['clientes']),
+            {coluna: Frequentes.de_dict(esboco) for coluna, esboco in conteudo['frequentes'].items()},
+            Quantis.de_dict(conteudo['quantis'])
+        )
+
+
+def unir_segmentos(*partes):
+    """
+    Une dicionários segmento -> Esbocos (ex.: de blocos ou processos diferentes).
+    """
+    unidos = {}
+    for parte in partes:
+        for segmento, esbocos in parte.items():
+            unidos[segmento] = unidos[segmento].unir(esbocos) if segmento in unidos else esbocos
+    return unidos
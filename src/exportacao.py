@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import tempfile
+
+from src.tabela import FORMATO_DATA, filtrar
+
+# Linhas convertidas por vez: a memória usada não depende do tamanho da exportação
+LINHAS_POR_BLOCO = 50_000
+
+# Limite de linhas de uma planilha do Excel (além do cabeçalho)
+LIMITE_LINHAS_XLSX = 1_048_575
+
+
+def iterar_blocos(dados, posicoes=None, filter_query='', linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Percorre as linhas selecionadas em blocos de DataFrame. `posicoes` (ou None para
+    todas) vem dos índices de filtro; o filter_query da tabela é aplicado bloco a bloco.
+    """
+    total = len(dados) if posicoes is None else len(posicoes)
+    for inicio in range(0, total, linhas_por_bloco):
+        fim = min(inicio + linhas_por_bloco, total)
+        bloco = dados.iloc[inicio:fim] if posicoes is None else dados.iloc[posicoes[inicio:fim]]
+        bloco = filtrar(bloco, filter_query)
+        if len(bloco):
+            yield bloco
+
+
+def escrever_csv(colunas, blocos):
+    """
+    CSV (UTF-8 com BOM, para o Excel reconhecer os acentos) em pedaços de bytes, no
+    mesmo formato de data/clientes.csv, a partir de blocos de DataFrame de qualquer
+    origem (iterar_blocos sobre o DataFrame em memória ou consultas ao banco SQLite).
+    """
+    yield ('\ufeff' + ','.join(colunas) + '\n').encode('utf-8')
+    for bloco in blocos:
+        yield bloco.to_csv(
+            header=False, index=False, date_format=FORMATO_DATA, float_format='%.2f'
+        ).encode('utf-8')
+
+
+def xlsx_disponivel():
+    return importlib.util.find_spec('openpyxl') is not None
+
+
+def escrever_xlsx(colunas, blocos, tamanho_pedaco=1024 * 1024):
+    """
+    Planilha XLSX em pedaços de bytes. O openpyxl (dependência opcional) escreve
+    em modo write_only em um arquivo temporário, que depois é enviado e apagado.
+    """
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet('clientes')
+    planilha.append(list(colunas))
+    for bloco in blocos:
+        for linha in bloco.astype(object).where(bloco.notna(), None).itertuples(index=False, name=None):
+            planilha.append(linha)
+
+    descritor, caminho = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descritor)
+    try:
+        livro.save(caminho)
+        with open(caminho, 'rb') as arquivo:
+            while True:
+                pedaco = arquivo.read(tamanho_pedaco)
+                if not pedaco:
+                    break
+                yield pedaco
+    finally:
+        os.remove(caminho)
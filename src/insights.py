@@ -1,88 +1,227 @@
 # -*- coding: utf-8 -*-
-from collections import Counter
 import pandas as pd
+from src.processamento_dados import COLUNAS_ITENS, contar_itens, contar_por, resumir_valores
 
-def gerar_insights(dados):
+# Percentis de valor_servico calculados no modo aproximado
+PERCENTIS = [50, 90, 99]
+
+# Colunas analisadas e quantas entradas do ranking são guardadas (None = todas)
+COLUNAS_ANALISADAS = {
+    'sexo': None,
+    'bairro': 3,
+    'itens_higienizados': 3,
+    'itens_impermeabilizados': 3
+}
+
+
+def resumir_coluna(serie, top=None):
     """
-    Gera insights estratégicos a partir dos dados dos clientes.
-    Retorna uma lista de strings formatadas para exibição no dashboard.
+    Resume uma coluna em uma única passada (value_counts): ranking com
+    quantidades e percentuais, moda e número de valores distintos.
     """
-    insights = []
-    
-    # Verifica se há dados válidos
+    return resumir_contagem(serie.value_counts(), top)
 
-    if not isinstance(dados, pd.DataFrame) or dados.empty:
-        return ["⚠️ Nenhum dado válido para análise"]
 
-    if dados.empty or not isinstance(dados, pd.DataFrame):
-        return ["⚠️ Nenhum dado válido encontrado"]
-    
+def resumir_contagem(contagem, top=None, total=None):
+    """
+    Resume uma contagem por valor (ordenada do maior para o menor). Sem `total`,
+    os percentuais são sobre a soma das contagens.
+    """
+    # Colunas categóricas listam também as categorias sem ocorrência
+    contagem = contagem[contagem > 0]
+    if contagem.empty:
+        return None
+
+    total = int(contagem.sum()) if total is None else total
+    ranking = contagem if top is None else contagem.head(top)
+
+    # Mesmo critério de desempate de Series.mode(): o menor valor entre os mais frequentes
+    moda = contagem[contagem == contagem.iloc[0]].index.sort_values()[0]
+
+    return {
+        'ranking': [
+            {'valor': valor, 'quantidade': int(quantidade), 'percentual': quantidade / total * 100}
+            for valor, quantidade in ranking.items()
+        ],
+        'moda': moda,
+        'distintos': len(contagem),
+        'total': total
+    }
+
+
+def resumir_frequentes(frequentes, top=None, total=None):
+    """
+    Resume um esboço de valores frequentes como resumir_contagem, com o erro máximo
+    das contagens. 'distintos' conta só os valores guardados no esboço.
+    """
+    resumo = resumir_contagem(frequentes.contagem(), top, total)
+    if resumo is not None:
+        resumo['erro_maximo'] = frequentes.erro_maximo
+    return resumo
+
+
+def calcular_insights(dados, cubo=None, cubos_itens=None, progresso=None, esbocos=None):
+    """
+    Calcula as estatísticas dos insights e devolve um dicionário com números
+    (sem formatação), reutilizável por outros consumidores além do dashboard.
+    Se a fatia do cubo de agregados for informada, a análise financeira sai dela;
+    com as fatias dos cubos de itens, o ranking de itens também.
+    Colunas de itens são contadas por item: percentual = serviços que incluem o item.
+    Com `dados` None tudo sai das fatias dos cubos (ex.: agregadas no banco SQLite).
+    Com `esbocos` (modo aproximado, src/esbocos.py), os rankings de bairros e itens saem
+    dos valores frequentes e entram os clientes distintos e os percentis de valor_servico;
+    'aproximado' no resultado indica se foram usados.
+    `progresso(etapa, total)`, se informado, é chamado antes de cada coluna analisada e no fim.
+    """
+    aproximado = esbocos is not None
+    if aproximado:
+        if not esbocos.servicos:
+            return {'total': 0, 'aproximado': True}
+        total = esbocos.servicos
+        colunas = list(esbocos.frequentes) + (list(cubo.columns) if cubo is not None else [])
+    elif isinstance(dados, pd.DataFrame):
+        if dados.empty:
+            return {'total': 0, 'aproximado': False}
+        total, colunas = len(dados), list(dados.columns)
+    elif cubo is not None and int(cubo['servicos'].sum()):
+        total, colunas = int(cubo['servicos'].sum()), list(cubo.columns) + list(cubos_itens or {})
+    else:
+        return {'total': 0, 'aproximado': False}
+
+    resultado = {'total': total, 'aproximado': aproximado}
+    etapas = len(COLUNAS_ANALISADAS) + 1
     try:
-        # --- ANÁLISE DEMOGRÁFICA ---
-        if 'sexo' in dados.columns and not dados['sexo'].empty:
-            contagem_sexo = dados['sexo'].value_counts(normalize=True) * 100
-            for sexo, percentual in contagem_sexo.items():
-                insights.append(f"👥 {sexo}: {percentual:.1f}%")
-        
-        # --- TOP BAIRROS ---
-        if 'bairro' in dados.columns:
-            top_bairros = dados['bairro'].value_counts().head(3)
-            insights.append("\n🏘️ **Top Bairros:**")
-            for bairro, quantidade in top_bairros.items():
-                insights.append(f"• {bairro}: {quantidade} clientes")
-        
-        # --- ITENS MAIS POPULARES ---
-        if 'itens_higienizados' in dados.columns:
-            itens = dados['itens_higienizados'].value_counts().head(3)
-            if not itens.empty:
-                insights.append("\n🧼 **Itens Mais Higienizados:**")
-                for item, quantidade in itens.items():
-                    insights.append(f"• {item}: {quantidade}x")
-        
-        if 'itens_impermeabilizados' in dados.columns:
-            itens = dados['itens_impermeabilizados'].value_counts().head(3)
-            if not itens.empty:
-                insights.append("\n🛡️ **Itens Mais Impermeabilizados:**")
-                for item, quantidade in itens.items():
-                    insights.append(f"• {item}: {quantidade}x")
-        
-        # --- ANÁLISE FINANCEIRA ---
-        if 'valor_servico' in dados.columns:
-            media = dados['valor_servico'].mean()
-            maximo = dados['valor_servico'].max()
-            minimo = dados['valor_servico'].min()
-            
-            # Formatação profissional para BRL (Real Brasileiro)
-            def formatar_moeda(valor):
-                return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            
-            insights.append("\n💰 **Análise Financeira:**")
-            insights.append(f"• Valor médio: {formatar_moeda(media)}")
-            insights.append(f"• Ticket máximo: {formatar_moeda(maximo)}")
-            insights.append(f"• Ticket mínimo: {formatar_moeda(minimo)}")
-        
-        # --- SUGESTÕES DE CAMPANHA ---
-        insights.append("\n📈 **Sugestões para Tráfego Pago:**")
-        
-        if 'sexo' in dados.columns and len(dados['sexo'].unique()) > 1:
-            sexo_maioria = dados['sexo'].mode()[0]
-            insights.append(f"• Segmentar anúncios para público {sexo_maioria}")
-        
-        if 'bairro' in dados.columns:
-            bairro_top = dados['bairro'].mode()[0]
-            insights.append(f"• Geotargeting em {bairro_top} e arredores")
-        
-        if 'itens_higienizados' in dados.columns:
-            item_top = dados['itens_higienizados'].mode()[0]
-            insights.append(f"• Destaque promoções para {item_top}")
-    
+        for etapa, (coluna, top) in enumerate(COLUNAS_ANALISADAS.items(), 1):
+            if progresso is not None:
+                progresso(etapa - 1, etapas)
+            if coluna not in colunas:
+                continue
+            if aproximado and coluna in esbocos.frequentes:
+                resultado[coluna] = resumir_frequentes(esbocos.frequentes[coluna], top, total)
+            elif coluna not in COLUNAS_ITENS:
+                resultado[coluna] = resumir_coluna(dados[coluna], top) if dados is not None \
+                    else resumir_contagem(contar_por(cubo, coluna), top)
+            elif cubos_itens is not None and coluna in cubos_itens:
+                resultado[coluna] = resumir_contagem(contar_por(cubos_itens[coluna], 'item'), top, total)
+            else:
+                resultado[coluna] = resumir_contagem(contar_itens(dados[coluna]), top, total)
+
+        if cubo is not None:
+            resultado['financeiro'] = resumir_valores(cubo)
+        elif 'valor_servico' in colunas:
+            valores = dados['valor_servico']
+            resultado['financeiro'] = {
+                'media': valores.mean(),
+                'maximo': valores.max(),
+                'minimo': valores.min()
+            }
+
+        if aproximado:
+            if esbocos.clientes.registros.any():
+                resultado['clientes'] = {
+                    'distintos': esbocos.clientes.estimar(),
+                    'erro_padrao': esbocos.clientes.erro_padrao
+                }
+            if 'financeiro' in resultado and esbocos.quantis.total:
+                resultado['financeiro']['percentis'] = {
+                    percentil: esbocos.quantis.quantil(percentil / 100) for percentil in PERCENTIS
+                }
+                resultado['financeiro']['erro_relativo'] = esbocos.quantis.erro_relativo
+        if progresso is not None:
+            progresso(etapas, etapas)
     except Exception as e:
-        insights.append(f"\n⚠️ Erro na análise: {str(e)}")
-    
+        resultado['erro'] = str(e)
+
+    return resultado
+
+
+# Formatação profissional para BRL (Real Brasileiro)
+def formatar_moeda(valor):
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def formatar_insights(resultado):
+    """
+    Converte o resultado de calcular_insights na lista de strings exibida no dashboard.
+    """
+    if not resultado.get('total'):
+        return ["⚠️ Nenhum dado válido para análise"]
+
+    insights = []
+    # Estimativas do modo aproximado são marcadas com ~
+    aprox = '~' if resultado.get('aproximado') else ''
+    sexo = resultado.get('sexo')
+    bairro = resultado.get('bairro')
+    higienizados = resultado.get('itens_higienizados')
+    impermeabilizados = resultado.get('itens_impermeabilizados')
+    financeiro = resultado.get('financeiro')
+
+    # --- ANÁLISE DEMOGRÁFICA ---
+    if sexo:
+        for entrada in sexo['ranking']:
+            insights.append(f"👥 {entrada['valor']}: {entrada['percentual']:.1f}%")
+
+    clientes = resultado.get('clientes')
+    if clientes:
+        distintos = f"{clientes['distintos']:,}".replace(",", ".")
+        insights.append(f"👤 Clientes distintos: ~{distintos} (±{2 * clientes['erro_padrao'] * 100:.1f}%)")
+
+    # --- TOP BAIRROS ---
+    if 'bairro' in resultado:
+        insights.append("\n🏘️ **Top Bairros:**")
+        for entrada in (bairro or {}).get('ranking', []):
+            insights.append(f"• {entrada['valor']}: {aprox}{entrada['quantidade']} clientes")
+
+    # --- ITENS MAIS POPULARES ---
+    if higienizados:
+        insights.append("\n🧼 **Itens Mais Higienizados:**")
+        for entrada in higienizados['ranking']:
+            insights.append(f"• {entrada['valor']}: {aprox}{entrada['quantidade']}x")
+
+    if impermeabilizados:
+        insights.append("\n🛡️ **Itens Mais Impermeabilizados:**")
+        for entrada in impermeabilizados['ranking']:
+            insights.append(f"• {entrada['valor']}: {aprox}{entrada['quantidade']}x")
+
+    # --- ANÁLISE FINANCEIRA ---
+    if financeiro:
+        insights.append("\n💰 **Análise Financeira:**")
+        insights.append(f"• Valor médio: {formatar_moeda(financeiro['media'])}")
+        insights.append(f"• Ticket máximo: {formatar_moeda(financeiro['maximo'])}")
+        insights.append(f"• Ticket mínimo: {formatar_moeda(financeiro['minimo'])}")
+        for percentil, valor in financeiro.get('percentis', {}).items():
+            insights.append(f"• {percentil}% dos tickets até ~{formatar_moeda(valor)}")
+
+    # --- SUGESTÕES DE CAMPANHA ---
+    if 'erro' not in resultado:
+        insights.append("\n📈 **Sugestões para Tráfego Pago:**")
+
+        if sexo and sexo['distintos'] > 1:
+            insights.append(f"• Segmentar anúncios para público {sexo['moda']}")
+
+        if bairro:
+            insights.append(f"• Geotargeting em {bairro['moda']} e arredores")
+
+        if higienizados:
+            insights.append(f"• Destaque promoções para {higienizados['moda']}")
+    else:
+        insights.append(f"\n⚠️ Erro na análise: {resultado['erro']}")
+
+    if aprox:
+        insights.append("\nℹ️ Valores com ~ são estimativas (modo aproximado)")
+
     return insights
 
 
-# Teste local (execute com `python insights.py`)
+def gerar_insights(dados, cubo=None, cubos_itens=None, esbocos=None):
+    """
+    Gera insights estratégicos a partir dos dados dos clientes.
+    Retorna uma lista de strings formatadas para exibição no dashboard.
+    """
+    return formatar_insights(calcular_insights(dados, cubo, cubos_itens, esbocos=esbocos))
+
+
+# Teste local (execute com `python -m src.insights` na raiz do projeto)
 if __name__ == "__main__":
     # Dados de exemplo para teste
     dados_teste = pd.DataFrame({
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from flask import Response, g, request
+
+# Liga a instrumentação (DASHBOARD_METRICAS=1). Desligada, nenhum gancho é
+# instalado no servidor e contar_linhas() retorna imediatamente.
+METRICAS_ATIVAS = os.environ.get('DASHBOARD_METRICAS', '0') == '1'
+
+# Limites (le) dos histogramas
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Combinações de filtros contadas uma a uma (séries de dashboard_filtro_total); as
+# que aparecerem depois de atingido o limite são somadas com todos os valores "outros"
+LIMITE_COMBINACOES_FILTROS = 200
+
+# Rota interna do Dash que executa os callbacks no servidor
+ROTA_CALLBACKS = '/_dash-update-component'
+
+
+class Histograma:
+    """
+    Histograma cumulativo no formato do Prometheus (contagens por limite, soma e total).
+    """
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas(self, nome, rotulos):
+        acumulado = 0
+        for limite, contagem in zip(self.limites + ('+Inf',), self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}'
+        yield f'{nome}_sum{{{rotulos}}} {self.soma}'
+        yield f'{nome}_count{{{rotulos}}} {self.total}'
+
+
+def rotular_valor(valor):
+    # Seleção múltipla vira um rótulo estável ("F,M"); lista vazia = todos
+    if isinstance(valor, list):
+        return ','.join(sorted(str(v) for v in valor)) or 'all'
+    return valor
+
+
+def escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metricas:
+    """
+    Métricas dos callbacks do Dash: latência, bytes da resposta, linhas processadas,
+    combinações de filtros e acertos dos caches, exportadas em texto do Prometheus.
+    """
+
+    def __init__(self, ativo=METRICAS_ATIVAS, limite_combinacoes=LIMITE_COMBINACOES_FILTROS):
+        self.ativo = ativo
+        self.limite_combinacoes = limite_combinacoes
+        self._latencia = {}
+        self._bytes = {}
+        self._linhas = {}
+        self._erros = {}
+        self._filtros = {}
+        self._caches = {}
+        self._local = threading.local()
+        self._trava = Lock()
+
+    def registrar_cache(self, nome, cache):
+        """
+        Inclui as estatísticas de um cache (qualquer objeto com estatisticas()) na exportação.
+        """
+        self._caches[nome] = cache
+
+    def contar_linhas(self, quantidade):
+        """
+        Soma as linhas processadas ao callback em execução nesta thread.
+        """
+        if not self.ativo:
+            return
+        callback = getattr(self._local, 'callback', None)
+        if callback is not None:
+            with self._trava:
+                self._linhas[callback] = self._linhas.get(callback, 0) + int(quantidade)
+
+    def observar(self, callback, segundos, tamanho, erro=False, filtros=None):
+        with self._trava:
+            self._latencia.setdefault(callback, Histograma(LIMITES_LATENCIA)).observar(segundos)
+            self._bytes.setdefault(callback, Histograma(LIMITES_BYTES)).observar(tamanho)
+            if erro:
+                self._erros[callback] = self._erros.get(callback, 0) + 1
+            if filtros:
+                chave = (callback,) + filtros
+                if chave not in self._filtros and len(self._filtros) >= self.limite_combinacoes:
+                    # Seleções múltiplas geram combinações sem fim: memória e séries limitadas
+                    chave = (callback,) + tuple(f"{filtro.split('=', 1)[0]}=outros" for filtro in filtros)
+                self._filtros[chave] = self._filtros.get(chave, 0) + 1
+
+    def instalar(self, app, rota='/metrics'):
+        """
+        Instala os ganchos no servidor Flask do app Dash e publica as métricas em `rota`.
+        Não faz nada se as métricas estiverem desligadas.
+        """
+        if not self.ativo:
+            return
+
+        server = app.server
+
+        @server.before_request
+        def iniciar_medicao():
+            if request.path.endswith(ROTA_CALLBACKS):
+                g.inicio_callback = time.perf_counter()
+                corpo = request.get_json(silent=True) or {}
+                entrada = app.callback_map.get(corpo.get('output'), {})
+                funcao = entrada.get('callback')
+                self._local.callback = getattr(funcao, '__name__', corpo.get('output', 'desconhecido'))
+                # Valores dos filtros (componentes 'filtro-*') que dispararam o callback.
+                # O texto digitado nas buscas fica de fora (cardinalidade ilimitada).
+                g.filtros_callback = tuple(
+                    f"{item['id']}{'' if item.get('property') == 'value' else '-' + item.get('property', '')}"
+                    f"={rotular_valor(item.get('value'))}"
+                    for item in corpo.get('inputs', [])
+                    if isinstance(item, dict) and str(item.get('id', '')).startswith('filtro-')
+                    and item.get('property') != 'search_value'
+                )
+
+        @server.after_request
+        def registrar_medicao(resposta):
+            inicio = g.pop('inicio_callback', None)
+            if inicio is not None:
+                callback = self._local.callback
+                self._local.callback = None
+                self.observar(
+                    callback,
+                    time.perf_counter() - inicio,
+                    resposta.calculate_content_length() or 0,
+                    erro=resposta.status_code >= 500,
+                    filtros=g.pop('filtros_callback', None)
+                )
+            return resposta
+
+        server.add_url_rule(rota, 'metricas', lambda: Response(self.exportar(), mimetype='text/plain; version=0.0.4'))
+
+    def exportar(self):
+        """
+        Texto no formato de exposição do Prometheus.
+        """
+        with self._trava:
+            latencia = list(self._latencia.items())
+            tamanhos = list(self._bytes.items())
+            linhas = list(self._linhas.items())
+            erros = list(self._erros.items())
+            filtros = list(self._filtros.items())
+
+            saida = [
+                '# HELP dashboard_callback_segundos Duração das requisições de callback.',
+                '# TYPE dashboard_callback_segundos histogram'
+            ]
+            for callback, histograma in latencia:
+                saida.extend(histograma.linhas('dashboard_callback_segundos', f'callback="{escapar(callback)}"'))
+
+            saida += [
+                '# HELP dashboard_callback_resposta_bytes Tamanho da resposta JSON dos callbacks.',
+                '# TYPE dashboard_callback_resposta_bytes histogram'
+            ]
+            for callback, histograma in tamanhos:
+                saida.extend(histograma.linhas('dashboard_callback_resposta_bytes', f'callback="{escapar(callback)}"'))
+
+        saida += [
+            '# HELP dashboard_callback_linhas_total Linhas de dados processadas pelos callbacks.',
+            '# TYPE dashboard_callback_linhas_total counter'
+        ]
+        saida += [f'dashboard_callback_linhas_total{{callback="{escapar(c)}"}} {n}' for c, n in linhas]
+
+        saida += [
+            '# HELP dashboard_callback_erros_total Callbacks que terminaram com erro.',
+            '# TYPE dashboard_callback_erros_total counter'
+        ]
+        saida += [f'dashboard_callback_erros_total{{callback="{escapar(c)}"}} {n}' for c, n in erros]
+
+        saida += [
+            '# HELP dashboard_filtro_total Execuções por combinação de filtros.',
+            '# TYPE dashboard_filtro_total counter'
+        ]
+        for (callback, *valores), n in filtros:
+            rotulos = ','.join(
+                [f'callback="{escapar(callback)}"'] +
+                [f'{id_filtro.replace("-", "_")}="{escapar(valor)}"'
+                 for id_filtro, valor in (v.split('=', 1) for v in valores)]
+            )
+            saida.append(f'dashboard_filtro_total{{{rotulos}}} {n}')
+
+        saida += [
+            '# HELP dashboard_cache_acertos_total Acertos dos caches.',
+            '# TYPE dashboard_cache_acertos_total counter'
+        ]
+        estatisticas = {nome: cache.estatisticas() for nome, cache in self._caches.items()}
+        saida += [f'dashboard_cache_acertos_total{{cache="{nome}"}} {e["acertos"]}' for nome, e in estatisticas.items()]
+        saida += [
+            '# HELP dashboard_cache_falhas_total Falhas (cálculos) dos caches.',
+            '# TYPE dashboard_cache_falhas_total counter'
+        ]
+        saida += [f'dashboard_cache_falhas_total{{cache="{nome}"}} {e["falhas"]}' for nome, e in estatisticas.items()]
+
+        return '\n'.join(saida) + '\n'
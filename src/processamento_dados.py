@@ -1,22 +1,2106 @@
+import io
+import json
+import math
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import tracemalloc
+import unicodedata
+import weakref
+from contextlib import contextmanager
+from threading import Lock
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import os
 from pathlib import Path
 
-def carregar_dados():
+try:
+    import fcntl
+except ImportError:
+    # Windows: sem trava entre processos (o gunicorn, que cria vários, não roda nele)
+    fcntl = None
+
+CAMINHO_DADOS = Path('data') / 'clientes.csv'
+
+# Esquema explícito de clientes.csv (colunas ausentes são ignoradas)
+ESQUEMA = {
+    'id_cliente': 'inteiro',
+    'nome': 'texto',
+    'sexo': 'categoria',
+    'bairro': 'categoria',
+    'cidade': 'categoria',
+    'data_servico': 'data',
+    'itens_higienizados': 'categoria',
+    'itens_impermeabilizados': 'categoria',
+    'valor_servico': 'decimal'
+}
+
+# Alterar sempre que ESQUEMA mudar, para invalidar os caches já gravados
+VERSAO_ESQUEMA = 3
+
+# Colunas guardadas como categorias
+COLUNAS_CATEGORICAS = [coluna for coluna, tipo in ESQUEMA.items() if tipo == 'categoria']
+
+# Colunas com índice de linhas por valor, usado pelos filtros do dashboard
+COLUNAS_INDEXADAS = ['sexo', 'bairro', 'cidade']
+
+# Colunas com listas de itens separados por vírgula ("Sofá 2 lugares, Tapete", "Cadeira - assento x 6")
+COLUNAS_ITENS = ['itens_higienizados', 'itens_impermeabilizados']
+
+# Filtros de seleção múltipla do dashboard -> colunas do índice consultadas.
+# Valores de um mesmo filtro são combinados com OU; filtros diferentes, com E.
+# O filtro de itens aceita o item em qualquer uma das colunas de itens.
+FILTROS = {
+    'sexo': ['sexo'],
+    'bairro': ['bairro'],
+    'cidade': ['cidade'],
+    'itens': COLUNAS_ITENS
+}
+
+# Leitura do CSV em blocos para arquivos grandes (0 = ler o arquivo de uma vez)
+LINHAS_POR_BLOCO = int(os.environ.get('DASHBOARD_LINHAS_POR_BLOCO', '0'))
+
+# Teto de memória (MB) da leitura em blocos (0 = sem limite)
+LIMITE_MEMORIA_MB = float(os.environ.get('DASHBOARD_LIMITE_MEMORIA_MB', '0'))
+
+# Mapeia o cache colunar em memória (somente leitura), compartilhado entre os workers do gunicorn:
+# colunas, índices, bitmaps, tabelas de itens, cubos e rollups. Ficam privados de cada worker só o
+# índice de busca de bairros, os esboços do modo aproximado e o que for recalculado após um anexo
+MEMORIA_COMPARTILHADA = os.environ.get('DASHBOARD_MEMORIA_COMPARTILHADA', '0') == '1'
+
+def carregar_dados(caminho=CAMINHO_DADOS, usar_cache=True):
     try:
-        caminho = Path('data') / 'clientes.csv'
+        caminho = Path(caminho)
         
         if not caminho.exists():
             # Dados de exemplo se o arquivo não existir
-            return pd.DataFrame({
+            return aplicar_esquema(pd.DataFrame({
                 'sexo': ['M', 'F', 'M', 'F'],
                 'bairro': ['Centro', 'Vila Olímpia', 'Centro', 'Moema'],
                 'itens_higienizados': ['Sofá', 'Cadeira', 'Sofá', 'Poltrona'],
                 'valor_servico': [350.50, 420.0, 380.25, 500.75]
-            })
+            }))
         
-        return pd.read_csv(caminho, encoding='utf-8')
+        if not usar_cache:
+            return ler_csv(caminho)
+        return carregar_com_cache(caminho)[0]
     
     except Exception as e:
         print(f"Erro ao carregar dados: {str(e)}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+def ler_csv(fonte, **opcoes):
+    """
+    Lê o CSV (caminho ou buffer) e aplica o ESQUEMA.
+    """
+    return aplicar_esquema(pd.read_csv(fonte, encoding='utf-8', **opcoes))
+
+
+def aplicar_esquema(dados):
+    """
+    Converte as colunas para os tipos do ESQUEMA: categorias, datas no formato
+    DD/MM/AAAA e valores numéricos.
+    """
+    for coluna, tipo in ESQUEMA.items():
+        if coluna not in dados.columns:
+            continue
+
+        serie = dados[coluna]
+        if tipo == 'categoria' and not isinstance(serie.dtype, pd.CategoricalDtype):
+            # astype(object) garante dicionário de texto mesmo em colunas só com "NA"
+            dados[coluna] = serie.astype(object).astype('category')
+        elif tipo == 'data' and not pd.api.types.is_datetime64_any_dtype(serie):
+            dados[coluna] = pd.to_datetime(serie, format='%d/%m/%Y', errors='coerce')
+        elif tipo == 'decimal':
+            dados[coluna] = pd.to_numeric(serie, errors='coerce').astype('float64')
+        elif tipo == 'inteiro':
+            numeros = pd.to_numeric(serie, errors='coerce')
+            dados[coluna] = numeros.astype('int64') if numeros.notna().all() else numeros
+    return dados
+
+
+# =============================================
+# LEITURA EM BLOCOS
+# =============================================
+class LeitorLimitado(io.RawIOBase):
+    """
+    Arquivo somente leitura que para em `limite` bytes, para que a leitura não
+    inclua linhas anexadas depois da assinatura ter sido tirada.
+    """
+
+    def __init__(self, arquivo, limite):
+        self._arquivo = arquivo
+        self._restante = limite
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        tamanho = min(len(buffer), self._restante)
+        if tamanho <= 0:
+            return 0
+        lidos = self._arquivo.readinto(memoryview(buffer)[:tamanho])
+        self._restante -= lidos
+        return lidos
+
+
+def concatenar_blocos(blocos):
+    """
+    Junta os blocos coluna a coluna; categorias são unidas sem passar por texto.
+    """
+    if not blocos:
+        return pd.DataFrame()
+
+    colunas = {}
+    for coluna in blocos[0].columns:
+        partes = [bloco[coluna] for bloco in blocos]
+        if isinstance(partes[0].dtype, pd.CategoricalDtype):
+            colunas[coluna] = union_categoricals(partes, sort_categories=True)
+        else:
+            # Blocos com valores ausentes ficaram em float64; o concat promove para o tipo mais amplo
+            colunas[coluna] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+
+def ler_csv_em_blocos(fonte, linhas_por_bloco=100_000, limite_memoria_mb=None):
+    """
+    Lê o CSV em blocos, convertendo cada bloco para o ESQUEMA antes de ler o próximo
+    (o resultado é o mesmo DataFrame de ler_csv). A memória é medida com tracemalloc;
+    se o pico passar de limite_memoria_mb, a leitura é interrompida com MemoryError.
+    Retorna (dados, relatório com linhas, blocos, tempo, linhas/s e pico de memória).
+    """
+    inicio = time.perf_counter()
+    limite = limite_memoria_mb * 1024 * 1024 if limite_memoria_mb else None
+    blocos = []
+
+    # Se alguém já estiver medindo (ex.: benchmark), o pico dele não é zerado:
+    # o pico desta leitura só é conhecido quando passa do pico anterior
+    rastreando = tracemalloc.is_tracing()
+    if not rastreando:
+        tracemalloc.start()
+    base, pico_anterior = tracemalloc.get_traced_memory()
+    pico = 0
+
+    def medir():
+        atual, maximo = tracemalloc.get_traced_memory()
+        return max(pico, atual - base, maximo - base if maximo > pico_anterior else 0)
+
+    try:
+        for bloco in pd.read_csv(fonte, encoding='utf-8', chunksize=linhas_por_bloco):
+            blocos.append(aplicar_esquema(bloco))
+            pico = medir()
+            if limite and pico > limite:
+                raise MemoryError(
+                    f"Leitura em blocos excedeu o limite de {limite_memoria_mb:.0f} MB "
+                    f"após {sum(len(b) for b in blocos)} linhas"
+                )
+
+        dados = concatenar_blocos(blocos)
+        # Durante a concatenação os blocos e o resultado coexistem
+        pico = medir()
+    finally:
+        if not rastreando:
+            tracemalloc.stop()
+
+    duracao = time.perf_counter() - inicio
+    relatorio = {
+        'linhas': len(dados),
+        'blocos': len(blocos),
+        'segundos': duracao,
+        'linhas_por_segundo': len(dados) / duracao if duracao else float('inf'),
+        'pico_memoria_mb': pico / (1024 * 1024)
+    }
+    return dados, relatorio
+
+
+# =============================================
+# CACHE COLUNAR (NumPy)
+# =============================================
+def assinatura_arquivo(caminho):
+    stat = Path(caminho).stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}", stat.st_size
+
+
+def caminho_cache(caminho):
+    """
+    Diretório do cache colunar, ao lado do CSV (ex.: data/.clientes.cache).
+    """
+    caminho = Path(caminho)
+    return caminho.parent / f'.{caminho.stem}.cache'
+
+
+def salvar_cache(dados, diretorio, assinatura):
+    """
+    Grava cada coluna como um arquivo .npy. Textos e categorias são gravados
+    como códigos inteiros + dicionário de valores. O manifesto guarda a
+    assinatura do CSV de origem e o tipo de cada coluna.
+    """
+    diretorio = Path(diretorio)
+    temporario = diretorio.with_name(f'{diretorio.name}.{os.getpid()}.tmp')
+    shutil.rmtree(temporario, ignore_errors=True)
+    temporario.mkdir(parents=True)
+
+    colunas = []
+    for posicao, coluna in enumerate(dados.columns):
+        serie = dados[coluna]
+        base = temporario / f'{posicao}'
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            tipo = 'categoria'
+            codigos = serie.cat.codes.to_numpy()
+            np.save(f'{base}.codigos.npy', codigos)
+            np.save(f'{base}.valores.npy', np.asarray(serie.cat.categories.astype(str), dtype=str))
+            if coluna in COLUNAS_INDEXADAS:
+                # Índice de linhas gravado junto, para também ser mapeado pelos workers
+                ordem, limites = ordenar_codigos(codigos, len(serie.cat.categories))
+                np.save(f'{base}.ordem.npy', ordem)
+                np.save(f'{base}.limites.npy', limites)
+        elif pd.api.types.is_datetime64_any_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+            tipo = 'numero'
+            np.save(f'{base}.npy', serie.to_numpy())
+        else:
+            tipo = 'texto'
+            # Dicionário ordenado: mapeada como categoria, a coluna ordena como o texto
+            codigos, valores = pd.factorize(serie, sort=True)
+            np.save(f'{base}.codigos.npy', codigos.astype(np.int32))
+            np.save(f'{base}.valores.npy', np.asarray(valores.astype(str), dtype=str))
+        colunas.append({'nome': coluna, 'tipo': tipo})
+
+    # O manifesto é gravado por último: sem ele o cache não é considerado válido
+    with open(temporario / 'manifesto.json', 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'assinatura': assinatura,
+            'versao_esquema': VERSAO_ESQUEMA,
+            'linhas': len(dados),
+            'colunas': colunas
+        }, arquivo, ensure_ascii=False)
+
+    # Vários workers podem gravar o mesmo cache ao mesmo tempo: quem perder a troca desiste
+    antigo = diretorio.with_name(f'{diretorio.name}.{os.getpid()}.old')
+    try:
+        if diretorio.exists():
+            diretorio.rename(antigo)
+        temporario.rename(diretorio)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+def ler_manifesto(diretorio, assinatura):
+    try:
+        with open(Path(diretorio) / 'manifesto.json', encoding='utf-8') as arquivo:
+            manifesto = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+    if manifesto.get('assinatura') != assinatura or manifesto.get('versao_esquema') != VERSAO_ESQUEMA:
+        return None
+    return manifesto
+
+
+def ler_cache(diretorio, assinatura, mapear=False):
+    """
+    Carrega o DataFrame do cache colunar se ele corresponder à assinatura do CSV.
+    Com mapear=True os arrays são mapeados do disco (somente leitura) em vez de
+    copiados, e colunas de texto ficam como categorias sobre os códigos gravados:
+    todos os processos que mapeiam o mesmo cache compartilham as mesmas páginas.
+    Retorna None se não existir ou estiver desatualizado.
+    """
+    manifesto = ler_manifesto(diretorio, assinatura)
+    if manifesto is None:
+        return None
+
+    modo = 'r' if mapear else None
+    diretorio = Path(diretorio)
+    colunas = {}
+    for posicao, coluna in enumerate(manifesto['colunas']):
+        base = diretorio / f'{posicao}'
+        if coluna['tipo'] == 'numero':
+            colunas[coluna['nome']] = np.load(f'{base}.npy', mmap_mode=modo)
+            continue
+
+        codigos = np.load(f'{base}.codigos.npy', mmap_mode=modo)
+        valores = np.load(f'{base}.valores.npy').astype(object)
+        if coluna['tipo'] == 'categoria' or mapear:
+            colunas[coluna['nome']] = pd.Categorical.from_codes(codigos, valores)
+        else:
+            texto = valores[codigos] if len(valores) else np.full(len(codigos), np.nan, dtype=object)
+            texto[codigos == -1] = np.nan
+            colunas[coluna['nome']] = texto
+
+    return pd.DataFrame(colunas, copy=False)
+
+
+def ler_indice_cache(diretorio, assinatura, dados):
+    """
+    Monta o índice de linhas a partir dos arrays de ordem gravados no cache,
+    mapeados do disco. Colunas sem índice gravado são indexadas em memória.
+    """
+    manifesto = ler_manifesto(diretorio, assinatura)
+    if manifesto is None:
+        return indexar_linhas(dados)
+
+    indice = {}
+    for posicao, coluna in enumerate(manifesto['colunas']):
+        base = Path(diretorio) / f'{posicao}'
+        if coluna['nome'] in COLUNAS_INDEXADAS and Path(f'{base}.ordem.npy').exists():
+            indice[coluna['nome']] = indice_de_ordem(
+                dados[coluna['nome']].cat.categories,
+                np.load(f'{base}.ordem.npy', mmap_mode='r'),
+                np.load(f'{base}.limites.npy')
+            )
+
+    faltantes = [coluna for coluna in COLUNAS_INDEXADAS if coluna in dados.columns and coluna not in indice]
+    indice.update(indexar_linhas(dados, faltantes))
+    return indice
+
+
+def salvar_derivados(estado, diretorio, assinatura):
+    """
+    Grava no cache colunar (subdiretório `derivados`) as estruturas que montar_estado
+    calcula a partir dos dados: índice de tempo, tabelas e índices de itens, bitmaps,
+    cubos e rollups. Os workers as mapeiam (ler_derivados) em vez de recalculá-las.
+    """
+    destino = Path(diretorio) / 'derivados'
+    temporario = destino.with_name(f'derivados.{os.getpid()}.tmp')
+    shutil.rmtree(temporario, ignore_errors=True)
+    temporario.mkdir(parents=True)
+
+    tempo = estado['indice'].get(COLUNA_DATA)
+    if tempo is not None:
+        np.save(temporario / 'tempo.datas.npy', tempo['datas'])
+        np.save(temporario / 'tempo.ordem.npy', tempo['ordem'])
+
+    itens = list(estado['itens'])
+    for posicao, coluna in enumerate(itens):
+        tabela = estado['itens'][coluna]
+        salvar_cache(tabela, temporario / f'itens.{posicao}', assinatura)
+        ordem, limites = ordenar_itens(tabela)
+        np.save(temporario / f'itens.{posicao}.ordem.npy', ordem)
+        np.save(temporario / f'itens.{posicao}.limites.npy', limites)
+        salvar_cache(estado['cubos_itens'][coluna], temporario / f'cubos_itens.{posicao}', assinatura)
+
+    # Bitmaps de cada coluna empilhados numa matriz (uma linha por valor)
+    bitmaps = []
+    for posicao, (coluna, mapa) in enumerate(estado['bitmaps']['colunas'].items()):
+        bitmaps.append({'coluna': coluna, 'valores': list(mapa)})
+        if mapa:
+            np.save(temporario / f'bitmaps.{posicao}.npy', np.stack(list(mapa.values())))
+
+    salvar_cache(estado['cubo'], temporario / 'cubo', assinatura)
+    for nome, rollup in estado['rollups'].items():
+        salvar_cache(rollup, temporario / f'rollups.{nome}', assinatura)
+
+    with open(temporario / 'manifesto.json', 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'assinatura': assinatura,
+            'versao_esquema': VERSAO_ESQUEMA,
+            'linhas': len(estado['dados']),
+            'tempo': tempo is not None,
+            'itens': itens,
+            'bitmaps': bitmaps,
+            'rollups': list(estado['rollups'])
+        }, arquivo, ensure_ascii=False)
+
+    antigo = destino.with_name(f'derivados.{os.getpid()}.old')
+    try:
+        if destino.exists():
+            destino.rename(antigo)
+        temporario.rename(destino)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+def ler_derivados(diretorio, assinatura, linhas):
+    """
+    Estruturas gravadas por salvar_derivados, mapeadas do disco (somente leitura),
+    no formato usado por montar_estado; None se não existirem ou forem de outro CSV.
+    """
+    destino = Path(diretorio) / 'derivados'
+    manifesto = ler_manifesto(destino, assinatura)
+    if manifesto is None or manifesto['linhas'] != linhas:
+        return None
+
+    try:
+        indice = {COLUNA_DATA: None}
+        if manifesto['tempo']:
+            indice[COLUNA_DATA] = {
+                'datas': np.load(destino / 'tempo.datas.npy', mmap_mode='r'),
+                'ordem': np.load(destino / 'tempo.ordem.npy', mmap_mode='r')
+            }
+
+        itens, cubos_itens = {}, {}
+        for posicao, coluna in enumerate(manifesto['itens']):
+            itens[coluna] = ler_cache(destino / f'itens.{posicao}', assinatura, mapear=True)
+            indice[coluna] = indice_de_ordem(
+                itens[coluna]['item'].cat.categories,
+                np.load(destino / f'itens.{posicao}.ordem.npy', mmap_mode='r'),
+                np.load(destino / f'itens.{posicao}.limites.npy')
+            )
+            cubos_itens[coluna] = ler_cache(destino / f'cubos_itens.{posicao}', assinatura, mapear=True)
+
+        colunas_bitmaps = {}
+        for posicao, entrada in enumerate(manifesto['bitmaps']):
+            matriz = np.load(destino / f'bitmaps.{posicao}.npy', mmap_mode='r') if entrada['valores'] else []
+            colunas_bitmaps[entrada['coluna']] = dict(zip(entrada['valores'], matriz))
+
+        derivados = {
+            'indice': indice,
+            'bitmaps': {'linhas': linhas, 'colunas': colunas_bitmaps},
+            'itens': itens,
+            'cubo': ler_cache(destino / 'cubo', assinatura, mapear=True),
+            'cubos_itens': cubos_itens,
+            'rollups': {nome: ler_cache(destino / f'rollups.{nome}', assinatura, mapear=True)
+                        for nome in manifesto['rollups']}
+        }
+    except OSError:
+        return None
+    if any(tabela is None for tabela in [derivados['cubo'], *itens.values(), *cubos_itens.values(),
+                                          *derivados['rollups'].values()]):
+        return None
+    return derivados
+
+
+def carregar_com_cache(caminho, mapear=False):
+    """
+    Carrega o CSV usando o cache colunar quando válido; caso contrário lê o CSV
+    e grava o cache para as próximas inicializações.
+    Retorna (dados, assinatura, bytes lidos do CSV).
+    """
+    caminho = Path(caminho)
+    assinatura, tamanho = assinatura_arquivo(caminho)
+    diretorio = caminho_cache(caminho)
+
+    dados = ler_cache(diretorio, assinatura, mapear)
+    if dados is not None:
+        return dados, assinatura, tamanho
+
+    with open(caminho, 'rb') as arquivo:
+        if LINHAS_POR_BLOCO:
+            dados, relatorio = ler_csv_em_blocos(
+                io.BufferedReader(LeitorLimitado(arquivo, tamanho)),
+                LINHAS_POR_BLOCO, LIMITE_MEMORIA_MB or None
+            )
+            print(
+                f"Leitura em blocos: {relatorio['linhas']} linhas em {relatorio['segundos']:.1f}s "
+                f"({relatorio['linhas_por_segundo']:,.0f} linhas/s, pico {relatorio['pico_memoria_mb']:.1f} MB)"
+            )
+        else:
+            dados = ler_csv(io.BytesIO(arquivo.read(tamanho)))
+
+    try:
+        salvar_cache(dados, diretorio, assinatura)
+    except OSError as e:
+        print(f"Erro ao gravar cache de dados: {str(e)}")
+
+    if mapear:
+        # Troca a cópia recém-lida pela versão mapeada do cache
+        mapeados = ler_cache(diretorio, assinatura, mapear=True)
+        if mapeados is not None:
+            dados = mapeados
+    return dados, assinatura, tamanho
+
+
+def materializar_cache(caminho=CAMINHO_DADOS):
+    """
+    Garante que o cache colunar do CSV e as estruturas derivadas estejam atualizados.
+    Chamado uma vez no processo principal do gunicorn, antes dos workers mapearem o cache.
+    """
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return
+    dados, assinatura, _ = carregar_com_cache(caminho, mapear=True)
+    diretorio = caminho_cache(caminho)
+    if ler_derivados(diretorio, assinatura, len(dados)) is None:
+        estado = montar_estado(dados, assinatura=assinatura, indice=ler_indice_cache(diretorio, assinatura, dados))
+        salvar_derivados(estado, diretorio, assinatura)
+
+
+def indexar_linhas(dados, colunas=COLUNAS_INDEXADAS):
+    """
+    Monta, para cada coluna, um mapa valor -> posições das linhas (arrays de inteiros).
+    Feito uma vez no carregamento para que os filtros não comparem strings a cada requisição.
+    """
+    indice = {}
+    for coluna in colunas:
+        if coluna not in dados.columns:
+            continue
+        serie = dados[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = serie.cat.categories
+            indice[coluna] = indice_de_ordem(categorias, *ordenar_codigos(serie.cat.codes.to_numpy(), len(categorias)))
+        else:
+            grupos = serie.groupby(serie, observed=True, sort=False).indices
+            indice[coluna] = {valor: posicoes.astype(np.int64) for valor, posicoes in grupos.items()}
+    return indice
+
+
+def ordenar_codigos(codigos, quantidade):
+    """
+    Ordena as posições das linhas pelo código da categoria (ordenação estável).
+    As linhas da categoria i ficam em ordem[limites[i]:limites[i + 1]].
+    """
+    ordem = np.argsort(codigos, kind='stable').astype(np.int64)
+    limites = np.searchsorted(codigos[ordem], np.arange(quantidade + 1), side='left')
+    return ordem, limites
+
+
+def indice_de_ordem(categorias, ordem, limites):
+    """
+    Mapa valor -> posições, com fatias (views, sem cópia) do array de ordem.
+    """
+    return {
+        valor: ordem[limites[i]:limites[i + 1]]
+        for i, valor in enumerate(categorias)
+        if limites[i + 1] > limites[i]
+    }
+
+
+def normalizar_selecao(**filtros):
+    """
+    Converte os valores dos dropdowns de seleção múltipla (lista, valor único,
+    'all' ou vazio) em uma tupla ((filtro, valores), ...) só com os filtros ativos,
+    na ordem de FILTROS e com os valores ordenados: serve como chave de cache.
+    """
+    selecao = []
+    for nome in FILTROS:
+        valores = filtros.get(nome)
+        if valores is None or isinstance(valores, str):
+            valores = [] if valores in (None, '', 'all') else [valores]
+        valores = tuple(sorted({str(valor) for valor in valores if valor != 'all'}))
+        if valores:
+            selecao.append((nome, valores))
+    return tuple(selecao)
+
+
+def filtrar_posicoes(indice, selecao=(), periodo=None, bitmaps=None):
+    """
+    Posições (ordenadas) das linhas que atendem aos filtros, ou None se nenhum filtro está ativo.
+    `selecao` vem de normalizar_selecao e `periodo` é um par (inicio, fim) de converter_periodo,
+    resolvido pelo índice de tempo. Com `bitmaps` (indexar_bitmaps) os valores frequentes
+    são combinados bit a bit; os demais, pelas posições do índice.
+    """
+    conjuntos = [
+        unir_valores(indice, bitmaps, FILTROS[nome], valores)
+        for nome, valores in selecao
+        if any(coluna in indice for coluna in FILTROS[nome])
+    ]
+
+    if periodo is not None and indice.get(COLUNA_DATA) is not None:
+        # As posições do período vêm na ordem das datas
+        linhas = fatiar_periodo(indice[COLUNA_DATA], *periodo)
+        if bitmaps is not None and denso(len(linhas), bitmaps['linhas']):
+            conjuntos.append(('bitmap', empacotar(linhas, bitmaps['linhas'])))
+        else:
+            conjuntos.append(('posicoes', np.sort(linhas)))
+
+    if not conjuntos:
+        return None
+    return combinar_conjuntos(conjuntos, bitmaps['linhas'] if bitmaps is not None else 0)
+
+
+def selecionar_linhas(dados, indice, selecao=(), periodo=None, bitmaps=None):
+    """
+    Seleciona as linhas que atendem aos filtros usando o índice de posições.
+    Sem filtro ativo devolve o próprio DataFrame, sem cópia.
+    """
+    posicoes = filtrar_posicoes(indice, selecao, periodo, bitmaps)
+    if posicoes is None:
+        return dados
+    return dados.iloc[posicoes]
+
+
+# =============================================
+# BITMAPS (SELEÇÃO MÚLTIPLA)
+# =============================================
+# Valores presentes em mais de 1/DENSIDADE_BITMAP das linhas ganham um bitmap
+# compactado (1 bit por linha); os raros ficam só com as posições do índice, que
+# ocupam menos. Como nos contêineres do roaring, cada valor usa a forma menor.
+DENSIDADE_BITMAP = 64
+
+
+def denso(quantidade, linhas):
+    return quantidade * DENSIDADE_BITMAP >= linhas
+
+
+def empacotar(posicoes, linhas):
+    """
+    Bitmap compactado (np.packbits, uint8) com os bits das `posicoes` ligados.
+    """
+    bits = np.zeros(linhas, dtype=bool)
+    bits[posicoes] = True
+    return np.packbits(bits)
+
+
+def testar_bits(bitmap, posicoes):
+    """
+    Máscara das `posicoes` cujo bit está ligado no bitmap, sem descompactá-lo.
+    """
+    deslocamento = (7 - (posicoes & 7)).astype(np.uint8)
+    return ((bitmap[posicoes >> 3] >> deslocamento) & 1).astype(bool)
+
+
+def indexar_bitmaps(indice, linhas, filtros=FILTROS):
+    """
+    Bitmaps dos valores frequentes de cada coluna dos filtros, a partir das posições
+    do índice. Feito uma vez no carregamento (montar_estado).
+    """
+    colunas = {coluna for colunas_filtro in filtros.values() for coluna in colunas_filtro}
+    return {
+        'linhas': linhas,
+        'colunas': {
+            coluna: {
+                valor: empacotar(posicoes, linhas)
+                for valor, posicoes in indice[coluna].items()
+                if denso(len(posicoes), linhas)
+            }
+            for coluna in colunas if coluna in indice
+        }
+    }
+
+
+def unir_valores(indice, bitmaps, colunas, valores):
+    """
+    Linhas com qualquer um dos `valores` em qualquer uma das `colunas` (OU), como
+    ('bitmap', bits) se algum valor tiver bitmap ou ('posicoes', posições ordenadas).
+    """
+    densos, esparsos = [], []
+    for coluna in colunas:
+        bitmaps_coluna = bitmaps['colunas'].get(coluna, {}) if bitmaps is not None else {}
+        for valor in valores:
+            if valor in bitmaps_coluna:
+                densos.append(bitmaps_coluna[valor])
+            elif valor in indice.get(coluna, {}):
+                esparsos.append(indice[coluna][valor])
+
+    if not densos:
+        if len(esparsos) == 1:
+            return 'posicoes', esparsos[0]
+        # Um serviço pode ter o mesmo item nas duas colunas: np.unique ordena e remove repetidas
+        return 'posicoes', np.unique(np.concatenate(esparsos)) if esparsos else np.empty(0, dtype=np.int64)
+
+    bitmap = np.bitwise_or.reduce(densos) if len(densos) > 1 else densos[0].copy()
+    if esparsos:
+        bitmap |= empacotar(np.concatenate(esparsos), bitmaps['linhas'])
+    return 'bitmap', bitmap
+
+
+def combinar_conjuntos(conjuntos, linhas):
+    """
+    Interseção (E) dos conjuntos de unir_valores. Bitmaps são combinados com AND
+    vetorizado; havendo listas de posições, a menor é filtrada pelas demais.
+    """
+    bitmaps = [conjunto for tipo, conjunto in conjuntos if tipo == 'bitmap']
+    listas = sorted((conjunto for tipo, conjunto in conjuntos if tipo == 'posicoes'), key=len)
+    bitmap = np.bitwise_and.reduce(bitmaps) if bitmaps else None
+
+    if not listas:
+        return np.flatnonzero(np.unpackbits(bitmap, count=linhas)).astype(np.int64)
+
+    posicoes = listas[0]
+    for outra in listas[1:]:
+        posicoes = np.intersect1d(posicoes, outra, assume_unique=True)
+    if bitmap is not None:
+        posicoes = posicoes[testar_bits(bitmap, posicoes)]
+    return posicoes
+
+
+# =============================================
+# BUSCA POR PREFIXO
+# =============================================
+def normalizar_texto(texto):
+    # Sem acentos e sem diferença entre maiúsculas e minúsculas
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def indexar_prefixos(serie):
+    """
+    Índice de busca por prefixo dos valores distintos da coluna: chaves normalizadas
+    ordenadas, uma para o início de cada palavra ("Jardim Paulista" é achado por
+    "jar" e por "paul"). Cada busca são duas buscas binárias.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Só as categorias presentes nos dados
+        codigos = serie.cat.codes.to_numpy()
+        valores = serie.cat.categories[np.unique(codigos[codigos >= 0])]
+    else:
+        valores = serie.dropna().unique()
+
+    pares = []
+    for valor in valores:
+        palavras = normalizar_texto(valor).split()
+        pares.extend((' '.join(palavras[i:]), valor) for i in range(len(palavras)))
+    pares.sort(key=lambda par: par[0])
+    return {
+        'chaves': np.array([chave for chave, _ in pares], dtype=str),
+        'valores': np.array([valor for _, valor in pares], dtype=object)
+    }
+
+
+def buscar_prefixo(indice, prefixo, limite=50):
+    """
+    Valores com alguma palavra começando por `prefixo` (sem acentos/maiúsculas), até `limite`.
+    """
+    chave = normalizar_texto(prefixo).strip()
+    chaves = indice['chaves']
+    a = np.searchsorted(chaves, chave, side='left')
+    b = np.searchsorted(chaves, chave + '\U0010ffff', side='left')
+
+    encontrados = []
+    for valor in indice['valores'][a:b]:
+        if valor not in encontrados:
+            encontrados.append(valor)
+            if len(encontrados) >= limite:
+                break
+    return encontrados
+
+
+# =============================================
+# ÍNDICE DE TEMPO E ROLLUPS
+# =============================================
+COLUNA_DATA = 'data_servico'
+
+# Acima deste número de dias o gráfico de receita agrupa por mês
+DIAS_GRAFICO_DIARIO = 92
+
+
+def indexar_tempo(dados, coluna=COLUNA_DATA):
+    """
+    Ordena as datas uma única vez: `datas` (ordenadas, sem datas inválidas) e `ordem`
+    (posição da linha de cada data). Um período vira uma fatia por busca binária.
+    """
+    if coluna not in dados.columns or not pd.api.types.is_datetime64_any_dtype(dados[coluna]):
+        return None
+    valores = dados[coluna].to_numpy(dtype='datetime64[ns]')
+    ordem = np.argsort(valores, kind='stable')
+    # NaT vai para o final da ordenação
+    validas = int((~np.isnat(valores)).sum())
+    ordem = ordem[:validas].astype(np.int64)
+    return {'datas': valores[ordem], 'ordem': ordem}
+
+
+def converter_periodo(inicio=None, fim=None):
+    """
+    Converte as datas do DatePickerRange (AAAA-MM-DD ou None) em (inicio, fim) datetime64,
+    com o fim exclusivo (dia seguinte ao último dia). Sem nenhuma das datas retorna None.
+    """
+    if not inicio and not fim:
+        return None
+    inicio = np.datetime64(pd.Timestamp(inicio).normalize(), 'ns') if inicio else None
+    fim = np.datetime64(pd.Timestamp(fim).normalize() + pd.Timedelta(days=1), 'ns') if fim else None
+    return inicio, fim
+
+
+def fatiar_periodo(tempo, inicio=None, fim=None):
+    """
+    Posições das linhas com data em [inicio, fim), na ordem das datas: O(log n + k).
+    """
+    datas = tempo['datas']
+    a = 0 if inicio is None else np.searchsorted(datas, inicio, side='left')
+    b = len(datas) if fim is None else np.searchsorted(datas, fim, side='left')
+    return tempo['ordem'][a:b]
+
+
+def construir_rollup(dados, frequencia):
+    """
+    Serviços e soma de valor_servico por período ('D' = dia, 'M' = mês) × sexo × bairro,
+    ordenado pelo período para ser fatiado por busca binária.
+    """
+    dimensoes = [col for col in DIMENSOES_CUBO if col in dados.columns]
+    if dados.empty or not pd.api.types.is_datetime64_any_dtype(dados.get(COLUNA_DATA)) \
+            or 'valor_servico' not in dados.columns:
+        return pd.DataFrame(columns=['periodo'] + dimensoes + ['servicos', 'soma'])
+
+    datas = dados[COLUNA_DATA]
+    periodo = datas.dt.floor('D') if frequencia == 'D' else datas.dt.to_period('M').dt.to_timestamp()
+    rollup = dados['valor_servico'].astype('float64').groupby(
+        [periodo.rename('periodo')] + [dados[col] for col in dimensoes], dropna=False, observed=True
+    ).agg(['size', 'sum'])
+    rollup.columns = ['servicos', 'soma']
+    rollup = rollup.reset_index()
+    return rollup[rollup['periodo'].notna()].reset_index(drop=True)
+
+
+def construir_rollups(dados):
+    return {'diario': construir_rollup(dados, 'D'), 'mensal': construir_rollup(dados, 'M')}
+
+
+def receita_por_periodo(rollups, selecao=(), periodo=None):
+    """
+    Serviços e receita por dia (períodos curtos) ou por mês, a partir dos rollups.
+    O período é localizado por busca binária na coluna 'periodo' do rollup diário.
+    """
+    if periodo is None:
+        rollup = rollups['mensal']
+        frequencia = 'M'
+    else:
+        rollup = rollups['diario']
+        datas = rollup['periodo'].to_numpy(dtype='datetime64[ns]')
+        inicio, fim = periodo
+        a = 0 if inicio is None else np.searchsorted(datas, inicio, side='left')
+        b = len(datas) if fim is None else np.searchsorted(datas, fim, side='left')
+        rollup = rollup.iloc[a:b]
+        dias = (datas[b - 1] - datas[a]) / np.timedelta64(1, 'D') if b > a else 0
+        frequencia = 'D' if dias <= DIAS_GRAFICO_DIARIO else 'M'
+
+    fatia = fatiar_cubo(rollup, selecao)
+    if fatia.empty:
+        return pd.DataFrame({'servicos': [], 'soma': []})
+    chave = fatia['periodo'] if frequencia == 'D' else fatia['periodo'].dt.to_period('M').dt.to_timestamp()
+    return fatia.groupby(chave)[['servicos', 'soma']].sum()
+
+
+# =============================================
+# ITENS (listas separadas por vírgula)
+# =============================================
+# Quantidade no final do item: "Cadeira - assento x 6"
+PADRAO_QUANTIDADE = re.compile(r'^(.*?)\s+x\s*(\d+)$')
+
+
+def separar_itens(texto):
+    """
+    Separa uma lista de itens em pares (item, quantidade), somando itens repetidos.
+    Ex.: 'Tapete, Cadeira - assento x 6' -> [('Tapete', 1), ('Cadeira - assento', 6)]; 'NA' -> [].
+    """
+    itens = {}
+    for parte in str(texto).split(','):
+        parte = parte.strip()
+        if not parte or parte.upper() == 'NA':
+            continue
+        encontrado = PADRAO_QUANTIDADE.match(parte)
+        if encontrado:
+            item, quantidade = encontrado.group(1).strip(), int(encontrado.group(2))
+        else:
+            item, quantidade = parte, 1
+        itens[item] = itens.get(item, 0) + quantidade
+    return list(itens.items())
+
+
+def explodir_itens(serie):
+    """
+    Tabela normalizada dos itens de uma coluna: uma linha por (linha do serviço, item),
+    com o código do item (categórico; as categorias são o dicionário de itens) e a quantidade.
+    Cada lista distinta é separada uma única vez; as linhas saem por repetição vetorizada.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object).astype('category')
+
+    listas = [separar_itens(texto) for texto in serie.cat.categories]
+    dicionario = pd.Index(sorted({item for lista in listas for item, _ in lista}), dtype=object)
+    codigos_itens = np.array([dicionario.get_loc(item) for lista in listas for item, _ in lista], dtype=np.int64)
+    quantidades = np.array([quantidade for lista in listas for _, quantidade in lista], dtype=np.int32)
+
+    # Posição de cada lista nos arrays acima; o código -1 (valor ausente) aponta para uma lista vazia
+    tamanhos = np.array([len(lista) for lista in listas] + [0], dtype=np.int64)
+    inicios = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+    codigos = serie.cat.codes.to_numpy()
+    codigos = np.where(codigos < 0, len(listas), codigos)
+
+    repeticoes = tamanhos[codigos]
+    tipo_linha = np.int32 if len(serie) < 2 ** 31 else np.int64
+    linhas = np.repeat(np.arange(len(serie), dtype=tipo_linha), repeticoes)
+    deslocamentos = np.arange(len(linhas)) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+    posicoes = np.repeat(inicios[codigos], repeticoes) + deslocamentos
+
+    return pd.DataFrame({
+        'linha': linhas,
+        'item': pd.Categorical.from_codes(codigos_itens[posicoes], dicionario),
+        'quantidade': quantidades[posicoes]
+    })
+
+
+def explodir_colunas_itens(dados):
+    return {coluna: explodir_itens(dados[coluna]) for coluna in COLUNAS_ITENS if coluna in dados.columns}
+
+
+def indexar_itens(tabela):
+    """
+    Mapa item -> posições (ordenadas) das linhas que contêm o item, para filtros por item.
+    """
+    return indice_de_ordem(tabela['item'].cat.categories, *ordenar_itens(tabela))
+
+
+def ordenar_itens(tabela):
+    # Linhas da tabela de itens na ordem dos itens, com os limites de cada item (ver ordenar_codigos)
+    ordem, limites = ordenar_codigos(tabela['item'].cat.codes.to_numpy(), len(tabela['item'].cat.categories))
+    return tabela['linha'].to_numpy()[ordem].astype(np.int64), limites
+
+
+def recortar_itens(tabela, posicoes):
+    """
+    Itens das linhas em `posicoes` (ordenadas), com a linha renumerada para a posição
+    dentro do subconjunto. A tabela está ordenada por linha: busca binária, O(k log n).
+    """
+    linhas = tabela['linha'].to_numpy()
+    inicios = np.searchsorted(linhas, posicoes, side='left')
+    tamanhos = np.searchsorted(linhas, posicoes, side='right') - inicios
+    deslocamentos = np.arange(tamanhos.sum()) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+    recorte = tabela.iloc[np.repeat(inicios, tamanhos) + deslocamentos].reset_index(drop=True)
+    recorte['linha'] = np.repeat(np.arange(len(posicoes), dtype=linhas.dtype), tamanhos)
+    return recorte
+
+
+def contar_itens(serie):
+    """
+    Quantos serviços incluem cada item (como value_counts(), mas por item e não pela lista inteira).
+    """
+    return explodir_itens(serie)['item'].value_counts()
+
+
+# =============================================
+# CUBOS DE AGREGADOS
+# =============================================
+# Dimensões dos cubos usados pelos gráficos e pelos insights
+DIMENSOES_CUBO = ['sexo', 'bairro']
+
+
+def construir_cubo(dados):
+    """
+    Pré-agrega os dados por sexo × bairro uma única vez, no carregamento.
+    Cada célula guarda a quantidade de serviços e soma/mínimo/máximo de valor_servico,
+    de modo que os callbacks trabalham sobre o cubo e não sobre as linhas.
+    """
+    dimensoes = [col for col in DIMENSOES_CUBO if col in dados.columns]
+    if dados.empty or not dimensoes:
+        return pd.DataFrame(columns=dimensoes + ['servicos', 'valores', 'soma', 'minimo', 'maximo'])
+
+    if 'valor_servico' in dados.columns:
+        # Somas sempre em float64
+        valores = dados['valor_servico'].astype('float64')
+    else:
+        valores = pd.Series(float('nan'), index=dados.index)
+    cubo = valores.groupby([dados[col] for col in dimensoes], dropna=False, observed=True).agg(
+        ['size', 'count', 'sum', 'min', 'max']
+    )
+    cubo.columns = ['servicos', 'valores', 'soma', 'minimo', 'maximo']
+    return cubo.reset_index()
+
+
+def construir_cubo_itens(dados, tabela):
+    """
+    Cubo sexo × bairro × item a partir da tabela de itens: quantos serviços incluem cada item.
+    """
+    dimensoes = [col for col in DIMENSOES_CUBO if col in dados.columns]
+    if tabela.empty:
+        return pd.DataFrame(columns=dimensoes + ['item', 'servicos'])
+
+    linhas = tabela['linha'].to_numpy()
+    chaves = [dados[col].iloc[linhas].reset_index(drop=True) for col in dimensoes] + [tabela['item']]
+    cubo = tabela['linha'].groupby(chaves, dropna=False, observed=True).size()
+    return cubo.rename('servicos').reset_index()
+
+
+def agregar_linhas(dados, itens, posicoes):
+    """
+    Cubos de serviços e de itens de um subconjunto de linhas, para filtros que os cubos
+    pré-agregados não cobrem (ex.: período). O custo é proporcional ao subconjunto.
+    """
+    subconjunto = dados.iloc[posicoes]
+    return construir_cubo(subconjunto), {
+        coluna: construir_cubo_itens(subconjunto, recortar_itens(tabela, posicoes))
+        for coluna, tabela in itens.items()
+    }
+
+
+def cobre_selecao(selecao):
+    """
+    Indica se os cubos e rollups (dimensões DIMENSOES_CUBO) respondem à seleção.
+    """
+    return all(nome in DIMENSOES_CUBO for nome, _ in selecao)
+
+
+def fatiar_cubo(cubo, selecao=()):
+    """
+    Retorna as células do cubo que atendem à seleção (só filtros em DIMENSOES_CUBO).
+    """
+    mascara = pd.Series(True, index=cubo.index)
+    for nome, valores in selecao:
+        if nome in cubo.columns:
+            mascara &= cubo[nome].isin(valores)
+    return cubo[mascara]
+
+
+def contar_por(fatia, dimensao, top=None, rotulo_outros='Outros'):
+    """
+    Equivalente a value_counts() da dimensão, somando as células da fatia do cubo.
+    Com `top`, mantém só os `top` maiores, escolhidos por seleção parcial (sem ordenar
+    todos os valores), e soma o restante em `rotulo_outros`.
+    """
+    if dimensao not in fatia.columns:
+        return pd.Series(dtype='int64', name='count')
+
+    contagem = fatia.groupby(dimensao, observed=True)['servicos'].sum()
+    contagem = contagem[contagem > 0]
+    outros = 0
+    if top is not None and len(contagem) > top:
+        valores = contagem.to_numpy()
+        # Posições voltam à ordem original para o desempate ser o mesmo da ordenação estável
+        maiores = np.sort(np.argpartition(-valores, top - 1)[:top])
+        outros = int(valores.sum() - valores[maiores].sum())
+        contagem = contagem.iloc[maiores]
+
+    contagem = contagem.sort_values(ascending=False, kind='stable')
+    if outros:
+        contagem = pd.concat([contagem, pd.Series([outros], index=[rotulo_outros])])
+    contagem.name = 'count'
+    return contagem
+
+
+def resumir_valores(fatia):
+    """
+    Média, máximo e mínimo de valor_servico a partir da fatia do cubo.
+    """
+    valores = fatia['valores'].sum()
+    return {
+        'media': fatia['soma'].sum() / valores if valores else float('nan'),
+        'maximo': fatia['maximo'].max(),
+        'minimo': fatia['minimo'].min()
+    }
+
+
+def montar_estado(dados, versao=0, assinatura=None, indice=None, derivados=None):
+    """
+    Reúne o DataFrame e as estruturas derivadas (índices de linhas e de tempo, bitmaps,
+    tabelas de itens, cubos e rollups) em um único objeto, trocado de uma vez quando os dados mudam.
+    Com `derivados` (ler_derivados), essas estruturas vêm mapeadas do cache em vez de calculadas.
+    """
+    indice = dict(indexar_linhas(dados) if indice is None else indice)
+    if derivados is None:
+        itens = explodir_colunas_itens(dados)
+        indice.update({coluna: indexar_itens(tabela) for coluna, tabela in itens.items()})
+        indice[COLUNA_DATA] = indexar_tempo(dados)
+        derivados = {'bitmaps': indexar_bitmaps(indice, len(dados)), 'itens': itens, **construir_agregados(dados, itens)}
+    else:
+        indice.update(derivados['indice'])
+    return {
+        'versao': versao,
+        'assinatura': assinatura,
+        'dados': dados,
+        'indice': indice,
+        'bitmaps': derivados['bitmaps'],
+        'itens': derivados['itens'],
+        'cubo': derivados['cubo'],
+        'cubos_itens': derivados['cubos_itens'],
+        'rollups': derivados['rollups'],
+        'busca': {'bairro': indexar_prefixos(dados['bairro'])} if 'bairro' in dados.columns else {},
+        'esbocos': esbocar_blocos(fatiar_blocos(dados)) if APROXIMADO else None
+    }
+
+
+def construir_agregados(dados, itens):
+    """
+    Cubos de serviços e de itens e rollups de receita calculados do zero.
+    """
+    return {
+        'cubo': construir_cubo(dados),
+        'cubos_itens': {coluna: construir_cubo_itens(dados, tabela) for coluna, tabela in itens.items()},
+        'rollups': construir_rollups(dados)
+    }
+
+
+def anexar_linhas(dados, novas):
+    """
+    Concatena as linhas novas (já no ESQUEMA) ao DataFrame, coluna a coluna,
+    unindo os dicionários das colunas categóricas. Colunas de texto mapeadas do
+    cache são categóricas (ler_cache); nas linhas novas elas viram categorias também.
+    """
+    colunas = {}
+    for coluna in dados.columns:
+        if isinstance(dados[coluna].dtype, pd.CategoricalDtype):
+            nova = novas[coluna]
+            if not isinstance(nova.dtype, pd.CategoricalDtype):
+                nova = nova.astype(object).astype('category')
+            colunas[coluna] = union_categoricals([dados[coluna], nova], sort_categories=True)
+        else:
+            colunas[coluna] = pd.concat([dados[coluna], novas[coluna]], ignore_index=True)
+    return pd.DataFrame(colunas)
+
+
+# =============================================
+# ESBOÇOS (MODO APROXIMADO)
+# =============================================
+# Modo aproximado dos insights: esboços mescláveis (src/esbocos.py) por segmento,
+# montados bloco a bloco na carga e unidos aos das linhas anexadas
+APROXIMADO = os.environ.get('DASHBOARD_APROXIMADO', '0') == '1'
+
+# Cada valor desta coluna é um segmento com esboços próprios; seleções só por ela
+# (e sem período) são respondidas unindo os esboços dos segmentos escolhidos
+DIMENSAO_ESBOCOS = 'sexo'
+
+# Colunas com esboço de valores frequentes (itens contados por serviço que os inclui)
+COLUNAS_FREQUENTES = ['bairro'] + COLUNAS_ITENS
+
+# Linhas por bloco ao montar os esboços de um DataFrame já carregado
+LINHAS_POR_BLOCO_ESBOCOS = 100_000
+
+
+def esbocar_bloco(bloco):
+    """
+    Esboços de um bloco de linhas, por segmento: serviços, clientes distintos
+    (id_cliente, ou nome), bairros e itens frequentes e quantis de valor_servico.
+    """
+    from src.esbocos import Esbocos, Frequentes, HyperLogLog, Quantis, hash_valores
+
+    coluna_clientes = next((coluna for coluna in ('id_cliente', 'nome') if coluna in bloco.columns), None)
+    if DIMENSAO_ESBOCOS in bloco.columns:
+        segmentos = bloco[DIMENSAO_ESBOCOS].astype(object).reset_index(drop=True)
+        grupos = segmentos.groupby(segmentos, dropna=False, sort=False).indices
+    else:
+        grupos = {None: np.arange(len(bloco))}
+
+    esbocos = {}
+    for segmento, posicoes in grupos.items():
+        parte = bloco.iloc[posicoes]
+        clientes = HyperLogLog()
+        if coluna_clientes is not None:
+            clientes.adicionar(hash_valores(parte[coluna_clientes]))
+        frequentes = {
+            coluna: Frequentes().adicionar(
+                contar_itens(parte[coluna]) if coluna in COLUNAS_ITENS else parte[coluna].value_counts()
+            )
+            for coluna in COLUNAS_FREQUENTES if coluna in parte.columns
+        }
+        quantis = Quantis()
+        if 'valor_servico' in parte.columns:
+            quantis.adicionar(parte['valor_servico'].to_numpy(dtype='float64', na_value=np.nan))
+        esbocos[None if pd.isna(segmento) else segmento] = Esbocos(len(parte), clientes, frequentes, quantis)
+    return esbocos
+
+
+def esbocar_blocos(blocos):
+    """
+    Esboços de uma sequência de blocos (ex.: leitura do CSV em blocos), unidos um a um:
+    a memória usada é a de um bloco mais a dos esboços.
+    """
+    from src.esbocos import unir_segmentos
+
+    esbocos = {}
+    for bloco in blocos:
+        esbocos = unir_segmentos(esbocos, esbocar_bloco(bloco))
+    return esbocos
+
+
+def fatiar_blocos(dados, linhas_por_bloco=LINHAS_POR_BLOCO_ESBOCOS):
+    return (dados.iloc[inicio:inicio + linhas_por_bloco] for inicio in range(0, len(dados), linhas_por_bloco))
+
+
+def esbocos_da_selecao(esbocos, selecao=()):
+    """
+    Esboços unidos dos segmentos da seleção, ou None se não houver esboços ou a
+    seleção filtrar por outra coluna além de DIMENSAO_ESBOCOS.
+    """
+    from src.esbocos import Esbocos
+
+    if esbocos is None or any(nome != DIMENSAO_ESBOCOS for nome, _ in selecao):
+        return None
+    valores = dict(selecao).get(DIMENSAO_ESBOCOS)
+    unidos = Esbocos()
+    for segmento, esboco in esbocos.items():
+        if valores is None or segmento in valores:
+            unidos = unidos.unir(esboco)
+    return unidos
+
+
+# =============================================
+# ATUALIZAÇÃO INCREMENTAL
+# =============================================
+# Segundos entre as conferências dos agregados incrementais contra uma
+# reconstrução completa (0 = não conferir)
+INTERVALO_CONFERENCIA = float(os.environ.get('DASHBOARD_CONFERENCIA_AGREGADOS', '600'))
+
+# Abaixo desse total de linhas, reconstruir o estado sai mais barato que aplicar o
+# delta (o custo fixo das operações do pandas domina); a partir dele, anexos são incrementais
+LINHAS_MINIMAS_INCREMENTAL = 50_000
+
+
+def somar_agregados(anterior, delta, chaves, somas, minimos=(), maximos=()):
+    """
+    Junta dois agregados com as mesmas chaves: células iguais somam as colunas de
+    `somas` e combinam `minimos`/`maximos`. O custo depende só do número de células.
+    """
+    partes = [tabela for tabela in (anterior, delta) if not tabela.empty]
+    if len(partes) < 2:
+        return partes[0] if partes else anterior
+
+    funcoes = {
+        **{coluna: 'sum' for coluna in somas},
+        **{coluna: 'min' for coluna in minimos},
+        **{coluna: 'max' for coluna in maximos}
+    }
+    # Dicionários das chaves categóricas unidos antes: o agrupamento continua sobre códigos
+    juntos = concatenar_agregados(*partes)
+    soma = juntos.groupby(chaves, dropna=False, observed=True).agg(funcoes).reset_index()
+    return soma[list(anterior.columns)]
+
+
+def somar_cubos(anterior, delta):
+    chaves = [coluna for coluna in anterior.columns if coluna in DIMENSOES_CUBO or coluna == 'item']
+    return somar_agregados(
+        anterior, delta, chaves,
+        [coluna for coluna in ('servicos', 'valores', 'soma') if coluna in anterior.columns],
+        [coluna for coluna in ('minimo',) if coluna in anterior.columns],
+        [coluna for coluna in ('maximo',) if coluna in anterior.columns]
+    )
+
+
+def somar_rollups(anterior, delta):
+    """
+    Rollups com o delta das linhas anexadas. Os rollups são ordenados por período:
+    só as células dos períodos presentes no delta são reagrupadas com ele; as outras
+    são copiadas como estão e os períodos reagrupados voltam para o seu lugar.
+    """
+    somados = {}
+    for nome, rollup in anterior.items():
+        novo = delta[nome]
+        chaves = ['periodo'] + [coluna for coluna in DIMENSOES_CUBO if coluna in rollup.columns]
+        if rollup.empty or novo.empty:
+            somados[nome] = somar_agregados(rollup, novo, chaves, ['servicos', 'soma'])
+            continue
+
+        # Faixas [início, fim) de cada período do delta no rollup (busca binária)
+        datas = rollup['periodo'].to_numpy()
+        periodos = np.unique(novo['periodo'].to_numpy())
+        marcas = np.zeros(len(rollup) + 1, dtype=np.int64)
+        np.add.at(marcas, np.searchsorted(datas, periodos, side='left'), 1)
+        np.add.at(marcas, np.searchsorted(datas, periodos, side='right'), -1)
+        afetadas = np.cumsum(marcas[:-1]) > 0
+
+        reagrupadas = somar_agregados(rollup[afetadas], novo, chaves, ['servicos', 'soma'])
+        mantidas = rollup[~afetadas]
+        pontos = np.searchsorted(mantidas['periodo'].to_numpy(), reagrupadas['periodo'].to_numpy(), side='left')
+        ordem = np.insert(np.arange(len(mantidas)), pontos, len(mantidas) + np.arange(len(reagrupadas)))
+        somados[nome] = concatenar_agregados(mantidas, reagrupadas).take(ordem).reset_index(drop=True)
+    return somados
+
+
+def concatenar_agregados(*partes):
+    # Empilha agregados com as mesmas colunas, unindo os dicionários das dimensões categóricas
+    partes = [parte for parte in partes if not parte.empty] or partes[:1]
+    if len(partes) < 2:
+        return partes[0].reset_index(drop=True)
+    colunas = {}
+    for coluna in partes[0].columns:
+        series = [parte[coluna] for parte in partes]
+        if all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+            categorias = series[0].cat.categories
+            if all(serie.cat.categories.isin(categorias).all() for serie in series[1:]):
+                # Caso comum (nenhum valor novo): os códigos das outras partes são traduzidos
+                # para o dicionário da primeira, sem recodificar a primeira
+                series = [series[0]] + [serie.cat.set_categories(categorias) for serie in series[1:]]
+                colunas[coluna] = pd.concat(series, ignore_index=True)
+            else:
+                colunas[coluna] = union_categoricals(series, sort_categories=True)
+        else:
+            colunas[coluna] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(colunas)
+
+
+def unir_posicoes(mapa, novos, inicio):
+    """
+    Índice valor -> posições estendido com as posições (relativas) das linhas anexadas
+    a partir de `inicio`. As novas são maiores que as anteriores: a ordem se mantém.
+    """
+    unido = dict(mapa)
+    for valor, posicoes in novos.items():
+        posicoes = posicoes.astype(np.int64) + inicio
+        unido[valor] = np.concatenate([mapa[valor], posicoes]) if valor in mapa else posicoes
+    return unido
+
+
+def unir_tempo(tempo, novo, inicio):
+    """
+    Intercala as datas anexadas (já ordenadas) no índice de tempo. Em datas iguais
+    as linhas novas ficam depois, como na ordenação estável do índice completo.
+    """
+    if tempo is None or novo is None:
+        return novo if tempo is None else tempo
+    pontos = np.searchsorted(tempo['datas'], novo['datas'], side='right')
+    return {
+        'datas': np.insert(tempo['datas'], pontos, novo['datas']),
+        'ordem': np.insert(tempo['ordem'], pontos, novo['ordem'] + inicio)
+    }
+
+
+def estender_bitmaps(bitmaps, indice, linhas):
+    """
+    Bitmaps com as linhas anexadas: os existentes são copiados para o novo tamanho e
+    recebem só os bits das linhas novas; valores que passaram a ser frequentes ganham
+    bitmap e os que deixaram de ser voltam a usar só as posições.
+    """
+    anteriores = bitmaps['linhas']
+    colunas = {}
+    for coluna, mapa in bitmaps['colunas'].items():
+        colunas[coluna] = {}
+        for valor, posicoes in indice[coluna].items():
+            if not denso(len(posicoes), linhas):
+                continue
+            if valor not in mapa:
+                colunas[coluna][valor] = empacotar(posicoes, linhas)
+                continue
+            bitmap = np.zeros((linhas + 7) // 8, dtype=np.uint8)
+            bitmap[:len(mapa[valor])] = mapa[valor]
+            novas = posicoes[np.searchsorted(posicoes, anteriores):]
+            np.bitwise_or.at(bitmap, novas >> 3, (0x80 >> (novas & 7)).astype(np.uint8))
+            colunas[coluna][valor] = bitmap
+    return {'linhas': linhas, 'colunas': colunas}
+
+
+def atualizar_estado(anterior, dados, versao=0, assinatura=None):
+    """
+    Estado após anexar linhas ao final de `anterior['dados']` (`dados` já as inclui).
+    Os agregados (cubos, cubos de itens e rollups) e os esboços do modo aproximado
+    recebem só o delta das linhas novas, e os índices e tabelas de itens são estendidos
+    em vez de refeitos. O cálculo depende das linhas novas (e do número de células dos
+    cubos); o que é proporcional aos dados é só copiar os arrays existentes, pois o
+    estado anterior continua em uso por outras requisições e não pode ser alterado.
+    """
+    from src.esbocos import unir_segmentos
+
+    inicio = len(anterior['dados'])
+    novas = dados.iloc[inicio:].reset_index(drop=True)
+    tipo_linha = np.int32 if len(dados) < 2 ** 31 else np.int64
+
+    itens, cubos_itens = {}, {}
+    indice = dict(anterior['indice'])
+    for coluna, tabela in anterior['itens'].items():
+        # Só as listas presentes nas linhas novas, não o dicionário da coluna inteira
+        delta = explodir_itens(novas[coluna].cat.remove_unused_categories()
+                               if isinstance(novas[coluna].dtype, pd.CategoricalDtype) else novas[coluna])
+        cubos_itens[coluna] = somar_cubos(anterior['cubos_itens'][coluna], construir_cubo_itens(novas, delta))
+        indice[coluna] = unir_posicoes(indice[coluna], indexar_itens(delta), inicio)
+        itens[coluna] = pd.DataFrame({
+            'linha': np.concatenate([tabela['linha'].to_numpy(), delta['linha'].to_numpy() + inicio]).astype(tipo_linha),
+            'item': union_categoricals([tabela['item'], delta['item']], sort_categories=True),
+            'quantidade': np.concatenate([tabela['quantidade'].to_numpy(), delta['quantidade'].to_numpy()])
+        })
+
+    for coluna, posicoes in indexar_linhas(novas).items():
+        indice[coluna] = unir_posicoes(indice.get(coluna, {}), posicoes, inicio)
+    indice[COLUNA_DATA] = unir_tempo(indice.get(COLUNA_DATA), indexar_tempo(novas), inicio)
+
+    busca = anterior['busca']
+    if 'bairro' in dados.columns and len(indice.get('bairro', ())) != len(anterior['indice'].get('bairro', ())):
+        # Apareceu um bairro novo: o índice de busca é refeito
+        busca = {'bairro': indexar_prefixos(dados['bairro'])}
+
+    return {
+        'versao': versao,
+        'assinatura': assinatura,
+        'dados': dados,
+        'indice': indice,
+        'bitmaps': estender_bitmaps(anterior['bitmaps'], indice, len(dados)),
+        'itens': itens,
+        'cubo': somar_cubos(anterior['cubo'], construir_cubo(novas)),
+        'cubos_itens': cubos_itens,
+        'rollups': somar_rollups(anterior['rollups'], construir_rollups(novas)),
+        'busca': busca,
+        'esbocos': None if anterior.get('esbocos') is None else unir_segmentos(anterior['esbocos'], esbocar_bloco(novas))
+    }
+
+
+def agregados_iguais(a, b):
+    """
+    Compara dois agregados (tabelas ou dicionários de tabelas) sem depender da ordem
+    das células nem do tipo das chaves; somas em ponto flutuante com tolerância.
+    """
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(agregados_iguais(a[nome], b[nome]) for nome in a)
+    if len(a) != len(b) or set(a.columns) != set(b.columns):
+        return False
+    if a.empty:
+        return True
+
+    chaves = [coluna for coluna in a.columns if coluna in DIMENSOES_CUBO or coluna in ('item', 'periodo')]
+    a, b = (
+        tabela.astype({chave: object for chave in chaves if chave != 'periodo'})
+        .sort_values(chaves, na_position='last', kind='stable').reset_index(drop=True)
+        for tabela in (a, b[a.columns])
+    )
+    for coluna in a.columns:
+        if coluna in chaves:
+            if not a[coluna].equals(b[coluna]):
+                return False
+        elif not np.allclose(a[coluna].astype('float64'), b[coluna].astype('float64'), rtol=1e-9, equal_nan=True):
+            return False
+    return True
+
+
+class GerenciadorBase:
+    """
+    Parte comum dos gerenciadores: o estado publicado, verificado no máximo a cada
+    `intervalo_verificacao` segundos sob uma trava, e o erro da última carga.
+    As subclasses implementam _verificar, que publica o novo estado em self._estado.
+    """
+
+    def __init__(self, intervalo_verificacao):
+        self.intervalo_verificacao = intervalo_verificacao
+        self._trava = Lock()
+        self._estado = None
+        self._ultima_verificacao = 0.0
+        # Mensagem da última falha de carga (None depois de uma carga bem-sucedida)
+        self.erro = None
+
+    @property
+    def versao(self):
+        return self.obter()['versao']
+
+    def obter(self):
+        """
+        Retorna o estado atual, recarregando se a fonte mudou. Se a recarga falhar,
+        o estado anterior continua valendo e a próxima verificação tenta de novo;
+        sem nenhum estado carregado, levanta RuntimeError com o erro.
+        """
+        agora = time.monotonic()
+        if self._estado is None or agora - self._ultima_verificacao >= self.intervalo_verificacao:
+            with self._trava:
+                if self._estado is None or agora - self._ultima_verificacao >= self.intervalo_verificacao:
+                    self._verificar()
+                    self._ultima_verificacao = time.monotonic()
+        if self._estado is None:
+            raise RuntimeError(f"Dados indisponíveis: {self.erro}")
+        return self._estado
+
+    def _verificar(self):
+        raise NotImplementedError
+
+
+class GerenciadorDados(GerenciadorBase):
+    """
+    Mantém o dataset de clientes.csv em memória e acompanha o arquivo (mtime/tamanho).
+    Quando o arquivo cresce, só os bytes anexados são lidos e, a partir de
+    LINHAS_MINIMAS_INCREMENTAL linhas, os agregados recebem apenas o delta
+    (atualizar_estado); quando é reescrito, o arquivo é carregado por
+    inteiro. Cada troca gera um novo estado com versão incrementada, que os callbacks
+    usam nas chaves de cache. A cada `intervalo_conferencia` segundos, os agregados
+    incrementais são conferidos em segundo plano contra uma reconstrução completa.
+    """
+
+    # Bytes finais já lidos comparados a cada verificação, para detectar reescritas
+    TAMANHO_ASSINATURA = 256
+
+    def __init__(self, caminho=CAMINHO_DADOS, intervalo_verificacao=2.0, mapear=MEMORIA_COMPARTILHADA,
+                 intervalo_conferencia=INTERVALO_CONFERENCIA):
+        super().__init__(intervalo_verificacao)
+        self.caminho = Path(caminho)
+        self.mapear = mapear
+        self.intervalo_conferencia = intervalo_conferencia
+        self._ultima_conferencia = time.monotonic()
+        # Assinatura do arquivo já lido (a publicada muda também quando a conferência corrige o estado)
+        self._assinatura_lida = None
+        self._deslocamento = 0
+        self._final_lido = b''
+        self._colunas = None
+
+    def _assinatura(self, stat):
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _verificar(self):
+        try:
+            stat = self.caminho.stat()
+        except OSError:
+            if self._estado is None:
+                self._publicar(carregar_dados(self.caminho), None)
+            return
+
+        assinatura = self._assinatura(stat)
+        if self._estado is not None and assinatura == self._assinatura_lida:
+            return
+
+        try:
+            if self._estado is not None and self._colunas is not None and self._cresceu_por_anexo(stat.st_size):
+                self._carregar_anexo(assinatura)
+            else:
+                self._carregar_completo()
+        except Exception as e:
+            # Nada é publicado: a assinatura não é registrada e a próxima verificação tenta de novo
+            print(f"Erro ao recarregar dados: {str(e)}")
+            self.erro = str(e) or type(e).__name__
+
+    def _cresceu_por_anexo(self, tamanho):
+        if tamanho < self._deslocamento:
+            return False
+
+        # Os últimos bytes já lidos precisam continuar iguais; senão o arquivo foi reescrito
+        inicio = self._deslocamento - len(self._final_lido)
+        with open(self.caminho, 'rb') as arquivo:
+            arquivo.seek(inicio)
+            return arquivo.read(len(self._final_lido)) == self._final_lido
+
+    def _carregar_completo(self):
+        dados, assinatura, tamanho = carregar_com_cache(self.caminho, self.mapear)
+        diretorio = caminho_cache(self.caminho)
+        indice = derivados = None
+        if self.mapear:
+            indice = ler_indice_cache(diretorio, assinatura, dados)
+            derivados = ler_derivados(diretorio, assinatura, len(dados))
+
+        with open(self.caminho, 'rb') as arquivo:
+            arquivo.seek(max(0, tamanho - self.TAMANHO_ASSINATURA))
+            final = arquivo.read(min(tamanho, self.TAMANHO_ASSINATURA))
+
+        self._colunas = list(dados.columns)
+        self._registrar_leitura(final, tamanho)
+        self._publicar(dados, assinatura, indice=indice, derivados=derivados)
+        if self.mapear and derivados is None:
+            # Os outros workers (e os próximos inícios) mapeiam o que este calculou
+            try:
+                salvar_derivados(self._estado, diretorio, assinatura)
+            except OSError as e:
+                print(f"Erro ao gravar estruturas derivadas no cache: {str(e)}")
+
+    def _carregar_anexo(self, assinatura):
+        with open(self.caminho, 'rb') as arquivo:
+            arquivo.seek(self._deslocamento)
+            novos = arquivo.read()
+
+        if not self._final_lido.endswith(b'\n') and not novos.startswith((b'\n', b'\r\n')):
+            # A última linha lida não tinha quebra e foi continuada: releitura completa.
+            # Isso também corrige uma linha lida enquanto ainda estava sendo escrita.
+            self._carregar_completo()
+            return
+
+        deslocamento = self._deslocamento + len(novos)
+        if novos.strip():
+            linhas = ler_csv(io.BytesIO(novos), header=None, names=self._colunas)
+            dados = anexar_linhas(self._estado['dados'], linhas)
+            self._registrar_leitura(self._final_lido + novos, deslocamento)
+            self._publicar(dados, assinatura, anexo=True)
+        else:
+            self._registrar_leitura(self._final_lido + novos, deslocamento)
+            self._publicar(self._estado['dados'], assinatura, nova_versao=False)
+
+    def _registrar_leitura(self, conteudo, deslocamento):
+        self._deslocamento = deslocamento
+        self._final_lido = conteudo[-self.TAMANHO_ASSINATURA:]
+
+    def _publicar(self, dados, assinatura, nova_versao=True, indice=None, anexo=False, derivados=None):
+        versao = 0 if self._estado is None else self._estado['versao'] + int(nova_versao)
+        incremental = anexo and len(self._estado['dados']) >= LINHAS_MINIMAS_INCREMENTAL
+        if incremental:
+            estado = atualizar_estado(self._estado, dados, versao, assinatura)
+        elif nova_versao or self._estado is None:
+            estado = montar_estado(dados, versao, assinatura, indice, derivados)
+            self._ultima_conferencia = time.monotonic()
+        else:
+            estado = dict(self._estado, assinatura=assinatura)
+        # Troca atômica: os callbacks em andamento continuam com o estado anterior
+        self._estado = estado
+        self._assinatura_lida = assinatura
+        self.erro = None
+
+        if incremental and self.intervalo_conferencia and \
+                time.monotonic() - self._ultima_conferencia >= self.intervalo_conferencia:
+            self._ultima_conferencia = time.monotonic()
+            threading.Thread(target=self._conferir, args=(estado,), daemon=True).start()
+
+    def _conferir(self, estado):
+        """
+        Reconstrói os agregados do zero e compara com os incrementais do estado. Se
+        divergirem, o estado passa a usar os reconstruídos, desde que ainda seja o
+        estado atual, com nova versão (caches do processo) e nova assinatura: o cache
+        de respostas e o navegador usam a assinatura e não podem ficar com os agregados errados.
+        """
+        try:
+            completos = construir_agregados(estado['dados'], explodir_colunas_itens(estado['dados']))
+            divergentes = [nome for nome, agregado in completos.items() if not agregados_iguais(estado[nome], agregado)]
+        except Exception as e:
+            print(f"Erro ao conferir os agregados: {str(e)}")
+            return
+
+        if divergentes:
+            print(f"Agregados incrementais divergentes ({', '.join(divergentes)}); usando a reconstrução completa")
+            with self._trava:
+                if self._estado is estado:
+                    self._estado = dict(
+                        estado, versao=estado['versao'] + 1, assinatura=f"{estado['assinatura']}+conferido", **completos
+                    )
+
+# =============================================
+# ARMAZENAMENTO SQLITE
+# =============================================
+# Onde ficam os dados consultados pelo dashboard: 'csv' (DataFrame em memória, padrão)
+# ou 'sqlite' (banco embutido; filtros, contagens e páginas da tabela são consultas SQL,
+# e só os resultados passam pela memória: serve para dados maiores que a RAM)
+ARMAZENAMENTO = os.environ.get('DASHBOARD_ARMAZENAMENTO', 'csv')
+CAMINHO_BANCO = Path(os.environ.get('DASHBOARD_BANCO', str(Path('data') / 'clientes.sqlite')))
+
+# Alterar quando as tabelas do banco mudarem, para forçar uma nova importação
+VERSAO_BANCO = 1
+
+# Linhas lidas do CSV (e gravadas no banco) por vez na importação
+LINHAS_POR_BLOCO_BANCO = 100_000
+
+# Colunas do banco com índice (filtros do dashboard e período)
+COLUNAS_INDEXADAS_BANCO = COLUNAS_INDEXADAS + [COLUNA_DATA]
+
+TIPOS_SQL = {'inteiro': 'INTEGER', 'decimal': 'REAL'}
+
+
+def nome_sql(coluna):
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def criar_tabelas(conexao, colunas):
+    definicoes = ', '.join(
+        f'{nome_sql(coluna)} {TIPOS_SQL.get(ESQUEMA.get(coluna), "TEXT")}' for coluna in colunas
+    )
+    conexao.execute(f'CREATE TABLE clientes (linha INTEGER PRIMARY KEY, {definicoes})')
+    conexao.execute('CREATE TABLE itens (linha INTEGER, coluna TEXT, item TEXT, quantidade INTEGER)')
+    conexao.execute('CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT)')
+
+
+def gravar_bloco(conexao, bloco, inicio):
+    """
+    Insere um bloco (já no ESQUEMA) a partir da linha `inicio`: datas como AAAA-MM-DD,
+    categorias como texto e os itens de cada serviço na tabela `itens`.
+    """
+    saida = bloco
+    if COLUNA_DATA in bloco.columns:
+        saida = bloco.assign(**{COLUNA_DATA: bloco[COLUNA_DATA].dt.strftime('%Y-%m-%d')})
+    saida = saida.astype(object).where(saida.notna(), None)
+    saida.insert(0, 'linha', range(inicio, inicio + len(saida)))
+    marcadores = ', '.join('?' * len(saida.columns))
+    conexao.executemany(f'INSERT INTO clientes VALUES ({marcadores})', saida.itertuples(index=False, name=None))
+
+    for coluna in COLUNAS_ITENS:
+        if coluna not in bloco.columns:
+            continue
+        tabela = explodir_itens(bloco[coluna])
+        conexao.executemany('INSERT INTO itens VALUES (?, ?, ?, ?)', zip(
+            (tabela['linha'].to_numpy() + inicio).tolist(),
+            [coluna] * len(tabela),
+            tabela['item'].astype(str).tolist(),
+            tabela['quantidade'].tolist()
+        ))
+
+
+def importar_sqlite(blocos, caminho_banco, assinatura):
+    """
+    Grava os blocos (DataFrames no ESQUEMA) em um banco SQLite novo: tabela `clientes`
+    (linha = posição no CSV), tabela `itens` (uma linha por serviço × item) e índices
+    nas colunas dos filtros. A memória usada é a de um bloco. O banco é montado em um
+    arquivo temporário e trocado no fim, sem afetar quem está lendo o anterior.
+    No modo aproximado, os esboços de cada bloco são unidos e gravados na tabela `esbocos`.
+    """
+    from src.esbocos import unir_segmentos
+
+    caminho_banco = Path(caminho_banco)
+    caminho_banco.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho_banco.with_name(f'{caminho_banco.name}.{os.getpid()}.tmp')
+    temporario.unlink(missing_ok=True)
+
+    conexao = sqlite3.connect(temporario)
+    try:
+        conexao.execute('PRAGMA journal_mode=OFF')
+        conexao.execute('PRAGMA synchronous=OFF')
+        colunas = None
+        linhas = 0
+        esbocos = {}
+        for bloco in blocos:
+            if colunas is None:
+                colunas = list(bloco.columns)
+                criar_tabelas(conexao, colunas)
+            gravar_bloco(conexao, bloco, linhas)
+            if APROXIMADO:
+                esbocos = unir_segmentos(esbocos, esbocar_bloco(bloco))
+            linhas += len(bloco)
+        if colunas is None:
+            raise ValueError("Nenhum dado para importar")
+        if APROXIMADO:
+            # Esboços montados durante a leitura, lidos prontos por todos os workers
+            conexao.execute('CREATE TABLE esbocos (segmento TEXT, conteudo TEXT)')
+            conexao.executemany('INSERT INTO esbocos VALUES (?, ?)', [
+                (segmento, json.dumps(esboco.para_dict())) for segmento, esboco in esbocos.items()
+            ])
+
+        # Índices criados depois da carga (mais rápido que mantê-los a cada inserção)
+        for coluna in COLUNAS_INDEXADAS_BANCO:
+            if coluna in colunas:
+                conexao.execute(f'CREATE INDEX "ix_clientes_{coluna}" ON clientes ({nome_sql(coluna)})')
+        conexao.execute('CREATE INDEX ix_itens_item ON itens (item, linha)')
+        conexao.execute('CREATE INDEX ix_itens_linha ON itens (linha)')
+        conexao.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('assinatura', assinatura), ('versao_banco', str(VERSAO_BANCO)), ('linhas', str(linhas))
+        ])
+        conexao.execute('ANALYZE')
+        conexao.commit()
+    except Exception:
+        conexao.close()
+        temporario.unlink(missing_ok=True)
+        raise
+    conexao.close()
+    os.replace(temporario, caminho_banco)
+
+
+def ler_meta(caminho_banco):
+    """
+    Metadados do banco (assinatura do CSV importado, versão, linhas), ou None se
+    o banco não existir ou for de outra VERSAO_BANCO.
+    """
+    caminho_banco = Path(caminho_banco)
+    if not caminho_banco.exists():
+        return None
+    try:
+        conexao = sqlite3.connect(f'file:{caminho_banco}?mode=ro', uri=True)
+        try:
+            meta = dict(conexao.execute('SELECT chave, valor FROM meta').fetchall())
+        finally:
+            conexao.close()
+    except sqlite3.Error:
+        return None
+    return meta if meta.get('versao_banco') == str(VERSAO_BANCO) else None
+
+
+@contextmanager
+def trava_arquivo(caminho):
+    """
+    Trava exclusiva entre processos (flock sobre `caminho`), liberada ao sair do bloco.
+    """
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'a') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def fechar_conexoes(conexoes):
+    # Só as abertas por este processo (as herdadas no fork pertencem ao processo principal)
+    for pid, conexao in conexoes:
+        if pid == os.getpid():
+            conexao.close()
+    conexoes.clear()
+
+
+def materializar_banco(caminho=CAMINHO_DADOS, caminho_banco=CAMINHO_BANCO):
+    """
+    Garante que o banco corresponda ao CSV atual. Chamado uma vez no processo
+    principal do gunicorn, para que os workers não importem o CSV ao mesmo tempo.
+    """
+    GerenciadorSQLite(caminho, caminho_banco).obter()
+
+
+class ArmazenamentoSQLite:
+    """
+    Consultas do dashboard executadas no banco (somente leitura): os filtros viram
+    WHERE, as contagens e agregados viram GROUP BY com o mesmo formato dos cubos
+    (as funções de cubo e de insights funcionam sobre o resultado) e a tabela é
+    paginada com LIMIT/OFFSET.
+    """
+
+    def __init__(self, caminho_banco):
+        self.caminho = Path(caminho_banco)
+        self._local = threading.local()
+        # Conexões de todas as threads, fechadas quando o banco deixa de ser usado
+        # (estado substituído e sem consultas em andamento)
+        self._conexoes = []
+        weakref.finalize(self, fechar_conexoes, self._conexoes)
+        conexao = self._conexao()
+        self.colunas = [linha[1] for linha in conexao.execute('PRAGMA table_info(clientes)') if linha[1] != 'linha']
+        # Tipos usados na tradução do filter_query da tabela
+        self.tipos = {
+            coluna: 'data' if ESQUEMA.get(coluna) == 'data'
+            else 'numero' if ESQUEMA.get(coluna) in TIPOS_SQL else 'texto'
+            for coluna in self.colunas
+        }
+
+    def _conexao(self):
+        # Uma conexão por thread e por processo (workers do gunicorn são criados por fork)
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            from src.tabela import FUNCOES_SQL
+
+            # check_same_thread=False: o fechamento pode acontecer em outra thread
+            conexao = sqlite3.connect(f'file:{self.caminho}?mode=ro', uri=True, check_same_thread=False)
+            for nome, (argumentos, funcao) in FUNCOES_SQL.items():
+                conexao.create_function(nome, argumentos, funcao, deterministic=True)
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+            self._conexoes.append((os.getpid(), conexao))
+        return conexao
+
+    def consultar(self, sql, parametros=()):
+        return pd.read_sql_query(sql, self._conexao(), params=list(parametros))
+
+    def ler_linhas(self, sql, parametros=()):
+        """
+        Linhas de `clientes` como DataFrame no ESQUEMA (mesmos tipos do modo CSV).
+        """
+        dados = self.consultar(sql, parametros)
+        if COLUNA_DATA in dados.columns:
+            dados[COLUNA_DATA] = pd.to_datetime(dados[COLUNA_DATA], format='%Y-%m-%d', errors='coerce')
+        return aplicar_esquema(dados)
+
+    def filtro(self, selecao=(), periodo=None, filter_query=''):
+        """
+        Cláusula WHERE (ou '') e parâmetros para a seleção, o período e o filter_query.
+        """
+        from src.tabela import filtro_sql
+
+        condicoes, parametros = [], []
+        for nome, valores in selecao:
+            marcadores = ', '.join('?' * len(valores))
+            if nome == 'itens':
+                condicoes.append(f'linha IN (SELECT linha FROM itens WHERE item IN ({marcadores}))')
+            elif nome in self.colunas:
+                condicoes.append(f'{nome_sql(nome)} IN ({marcadores})')
+            else:
+                continue
+            parametros.extend(valores)
+
+        if periodo is not None and COLUNA_DATA in self.colunas:
+            inicio, fim = periodo
+            if inicio is not None:
+                condicoes.append(f'{nome_sql(COLUNA_DATA)} >= ?')
+                parametros.append(str(inicio)[:10])
+            if fim is not None:
+                condicoes.append(f'{nome_sql(COLUNA_DATA)} < ?')
+                parametros.append(str(fim)[:10])
+
+        condicoes_tabela, parametros_tabela = filtro_sql(filter_query, self.tipos)
+        condicoes += condicoes_tabela
+        parametros += parametros_tabela
+        return ('WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+
+    def cubos(self, selecao=(), periodo=None):
+        """
+        Fatias do cubo de serviços e dos cubos de itens (mesmas colunas de construir_cubo
+        e construir_cubo_itens) calculadas no banco para a seleção e o período.
+        """
+        onde, parametros = self.filtro(selecao, periodo)
+        dimensoes = [nome_sql(coluna) for coluna in DIMENSOES_CUBO if coluna in self.colunas]
+        grupo = ', '.join(dimensoes)
+        valor = nome_sql('valor_servico') if 'valor_servico' in self.colunas else 'NULL'
+        cubo = self.consultar(
+            f'SELECT {grupo}, COUNT(*) AS servicos, COUNT({valor}) AS valores, TOTAL({valor}) AS soma, '
+            f'MIN({valor}) AS minimo, MAX({valor}) AS maximo FROM clientes {onde} GROUP BY {grupo}',
+            parametros
+        )
+
+        cubos_itens = {}
+        for coluna in COLUNAS_ITENS:
+            if coluna not in self.colunas:
+                continue
+            colunas_grupo = ', '.join([f'c.{dimensao}' for dimensao in dimensoes] + ['i.item'])
+            cubos_itens[coluna] = self.consultar(
+                f'SELECT {colunas_grupo}, COUNT(*) AS servicos FROM itens i '
+                f'JOIN (SELECT linha, {grupo} FROM clientes {onde}) c ON c.linha = i.linha '
+                f'WHERE i.coluna = ? GROUP BY {colunas_grupo}',
+                parametros + [coluna]
+            )
+        return cubo, cubos_itens
+
+    def receita(self, selecao=(), periodo=None):
+        """
+        Serviços e receita por dia (períodos curtos) ou por mês, no formato de receita_por_periodo.
+        """
+        if COLUNA_DATA not in self.colunas or 'valor_servico' not in self.colunas:
+            return pd.DataFrame({'servicos': [], 'soma': []})
+        onde, parametros = self.filtro(selecao, periodo)
+        onde = (onde + ' AND ' if onde else 'WHERE ') + f'{nome_sql(COLUNA_DATA)} IS NOT NULL'
+        por_dia = self.consultar(
+            f'SELECT {nome_sql(COLUNA_DATA)} AS periodo, COUNT(*) AS servicos, '
+            f'TOTAL({nome_sql("valor_servico")}) AS soma FROM clientes {onde} GROUP BY 1 ORDER BY 1',
+            parametros
+        )
+        if por_dia.empty:
+            return pd.DataFrame({'servicos': [], 'soma': []})
+
+        por_dia['periodo'] = pd.to_datetime(por_dia['periodo'], format='%Y-%m-%d')
+        dias = (por_dia['periodo'].iloc[-1] - por_dia['periodo'].iloc[0]).days
+        if periodo is not None and dias <= DIAS_GRAFICO_DIARIO:
+            return por_dia.set_index('periodo')[['servicos', 'soma']]
+        chave = por_dia['periodo'].dt.to_period('M').dt.to_timestamp()
+        return por_dia.groupby(chave)[['servicos', 'soma']].sum()
+
+    def contar_linhas(self, selecao=(), periodo=None, filter_query=''):
+        onde, parametros = self.filtro(selecao, periodo, filter_query)
+        return self._conexao().execute(f'SELECT COUNT(*) FROM clientes {onde}', parametros).fetchone()[0]
+
+    def pagina(self, selecao, periodo, sort_by, filter_query, page_current, page_size):
+        """
+        Página da tabela filtrada e ordenada no banco (LIMIT/OFFSET).
+        Retorna (DataFrame da página, total de páginas, página efetiva), como paginar().
+        """
+        page_size = page_size or 10
+        total_paginas = max(1, math.ceil(self.contar_linhas(selecao, periodo, filter_query) / page_size))
+        pagina = min(page_current or 0, total_paginas - 1)
+
+        onde, parametros = self.filtro(selecao, periodo, filter_query)
+        # Ausentes por último nos dois sentidos e desempate pela ordem do CSV, como no modo CSV
+        ordem = [
+            f'{nome_sql(col["column_id"])} IS NULL, {nome_sql(col["column_id"])} '
+            f'{"ASC" if col["direction"] == "asc" else "DESC"}'
+            for col in sort_by or [] if col['column_id'] in self.colunas
+        ] + ['linha']
+        colunas = ', '.join(nome_sql(coluna) for coluna in self.colunas)
+        dados = self.ler_linhas(
+            f'SELECT {colunas} FROM clientes {onde} ORDER BY {", ".join(ordem)} LIMIT ? OFFSET ?',
+            parametros + [page_size, pagina * page_size]
+        )
+        return dados, total_paginas, pagina
+
+    def iterar_blocos(self, selecao=(), periodo=None, filter_query='', linhas_por_bloco=LINHAS_POR_BLOCO_BANCO):
+        """
+        Linhas selecionadas em blocos de DataFrame, na ordem do CSV. Cada bloco continua
+        da última linha do anterior (sem OFFSET, que releria as linhas já enviadas).
+        """
+        onde, parametros = self.filtro(selecao, periodo, filter_query)
+        onde = (onde + ' AND ' if onde else 'WHERE ') + 'linha > ?'
+        colunas = ', '.join(['linha'] + [nome_sql(coluna) for coluna in self.colunas])
+        ultima = -1
+        while True:
+            bloco = self.ler_linhas(
+                f'SELECT {colunas} FROM clientes {onde} ORDER BY linha LIMIT ?',
+                parametros + [ultima, linhas_por_bloco]
+            )
+            if bloco.empty:
+                return
+            ultima = int(bloco['linha'].iloc[-1])
+            yield bloco.drop(columns='linha')
+
+    def esbocos(self):
+        """
+        Esboços gravados na importação (modo aproximado), ou None se o banco não os tiver.
+        """
+        from src.esbocos import Esbocos
+
+        try:
+            linhas = self._conexao().execute('SELECT segmento, conteudo FROM esbocos').fetchall()
+        except sqlite3.OperationalError:
+            return None
+        return {segmento: Esbocos.de_dict(json.loads(conteudo)) for segmento, conteudo in linhas}
+
+    def valores(self, coluna):
+        # Valores distintos da coluna (pelo índice), para as opções dos filtros
+        if coluna not in self.colunas:
+            return []
+        return [linha[0] for linha in self._conexao().execute(
+            f'SELECT DISTINCT {nome_sql(coluna)} FROM clientes WHERE {nome_sql(coluna)} IS NOT NULL ORDER BY 1'
+        )]
+
+    def valores_itens(self):
+        return [linha[0] for linha in self._conexao().execute('SELECT DISTINCT item FROM itens ORDER BY 1')]
+
+    def limites_periodo(self):
+        if COLUNA_DATA not in self.colunas:
+            return None, None
+        return self._conexao().execute(
+            f'SELECT MIN({nome_sql(COLUNA_DATA)}), MAX({nome_sql(COLUNA_DATA)}) FROM clientes'
+        ).fetchone()
+
+    def estrutura(self):
+        # DataFrame sem linhas com as colunas e os tipos dos dados (colunas da tabela do dashboard)
+        colunas = ', '.join(nome_sql(coluna) for coluna in self.colunas)
+        return self.ler_linhas(f'SELECT {colunas} FROM clientes LIMIT 0')
+
+
+class GerenciadorSQLite(GerenciadorBase):
+    """
+    Equivalente ao GerenciadorDados para DASHBOARD_ARMAZENAMENTO=sqlite. Quando o CSV
+    muda, ele é importado de novo para o banco, em blocos, por um único processo de
+    cada vez (os outros esperam a trava e usam o banco que ele gravou). O estado
+    publicado guarda o banco (ArmazenamentoSQLite) e só resumos pequenos: opções dos
+    filtros, cubo completo e índice de busca dos bairros, nunca as linhas.
+    """
+
+    def __init__(self, caminho=CAMINHO_DADOS, caminho_banco=CAMINHO_BANCO, intervalo_verificacao=2.0,
+                 linhas_por_bloco=LINHAS_POR_BLOCO_BANCO):
+        super().__init__(intervalo_verificacao)
+        self.caminho = Path(caminho)
+        self.caminho_banco = Path(caminho_banco)
+        self.linhas_por_bloco = linhas_por_bloco
+
+    def _desatualizado(self, meta):
+        # Banco ausente, ilegível (meta None) ou de outra versão do CSV
+        if meta is None:
+            return True
+        return self.caminho.exists() and meta.get('assinatura') != assinatura_arquivo(self.caminho)[0]
+
+    def _importar(self):
+        """
+        Importa o CSV se o banco não corresponder a ele e retorna os metadados do banco.
+        """
+        meta = ler_meta(self.caminho_banco)
+        if not self._desatualizado(meta):
+            return meta
+
+        with trava_arquivo(self.caminho_banco.with_name(f'{self.caminho_banco.name}.lock')):
+            # Outro processo pode ter importado enquanto esta esperava a trava
+            meta = ler_meta(self.caminho_banco)
+            if not self._desatualizado(meta):
+                return meta
+            if self.caminho.exists():
+                assinatura, tamanho = assinatura_arquivo(self.caminho)
+                with open(self.caminho, 'rb') as arquivo:
+                    # Só até o tamanho da assinatura: linhas anexadas durante a importação ficam para a próxima
+                    fonte = io.BufferedReader(LeitorLimitado(arquivo, tamanho))
+                    blocos = pd.read_csv(fonte, encoding='utf-8', chunksize=self.linhas_por_bloco)
+                    importar_sqlite((aplicar_esquema(bloco) for bloco in blocos), self.caminho_banco, assinatura)
+            else:
+                # Sem CSV nem banco: os mesmos dados de exemplo de carregar_dados
+                importar_sqlite([carregar_dados(self.caminho)], self.caminho_banco, 'exemplo')
+            return ler_meta(self.caminho_banco)
+
+    def _verificar(self):
+        try:
+            meta = self._importar()
+            if meta is None:
+                raise RuntimeError(f"Banco {self.caminho_banco} ilegível após a importação")
+        except Exception as e:
+            # Fica o banco que já existir (mesmo desatualizado); a próxima verificação tenta de novo
+            print(f"Erro ao importar dados para o SQLite: {str(e)}")
+            self.erro = str(e) or type(e).__name__
+            meta = ler_meta(self.caminho_banco)
+            if meta is None:
+                return
+        else:
+            self.erro = None
+
+        if self._estado is None or meta['assinatura'] != self._estado['assinatura']:
+            versao = 0 if self._estado is None else self._estado['versao'] + 1
+            # O banco anterior fecha suas conexões quando o último pedido que o usa termina
+            self._estado = montar_estado_sqlite(ArmazenamentoSQLite(self.caminho_banco), versao, meta['assinatura'])
+
+
+def montar_estado_sqlite(banco, versao=0, assinatura=None):
+    """
+    Estado do modo SQLite com as mesmas chaves usadas pelo dashboard para opções
+    dos filtros, busca de bairros e cubos sem filtro; as consultas vão para `banco`.
+    """
+    cubo, cubos_itens = banco.cubos()
+    return {
+        'versao': versao,
+        'assinatura': assinatura,
+        'banco': banco,
+        'dados': banco.estrutura(),
+        'cubo': cubo,
+        'cubos_itens': cubos_itens,
+        'valores': {
+            **{coluna: banco.valores(coluna) for coluna in COLUNAS_INDEXADAS},
+            'itens': banco.valores_itens()
+        },
+        'limites_periodo': banco.limites_periodo(),
+        'busca': {'bairro': indexar_prefixos(pd.Series(banco.valores('bairro'), dtype=object))}
+        if 'bairro' in banco.colunas else {},
+        # Banco importado sem o modo aproximado: os esboços são montados lendo-o em blocos
+        'esbocos': (banco.esbocos() or esbocar_blocos(banco.iterar_blocos())) if APROXIMADO else None
+    }
+
+
+def criar_gerenciador(armazenamento=ARMAZENAMENTO, caminho=CAMINHO_DADOS):
+    """
+    Gerenciador dos dados conforme DASHBOARD_ARMAZENAMENTO ('csv' ou 'sqlite').
+    """
+    if armazenamento == 'sqlite':
+        return GerenciadorSQLite(caminho)
+    return GerenciadorDados(caminho)
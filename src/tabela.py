@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import math
+import pandas as pd
+
+# Formato de exibição (e de filtro) das colunas de data
+FORMATO_DATA = '%d/%m/%Y'
+
+# Operadores aceitos no filter_query do DataTable (modo 'custom')
+OPERADORES = [
+    ['ge ', '>='],
+    ['le ', '<='],
+    ['lt ', '<'],
+    ['gt ', '>'],
+    ['ne ', '!='],
+    ['eq ', '='],
+    ['contains '],
+    ['datestartswith ']
+]
+
+
+def separar_filtro(parte):
+    """
+    Separa um trecho do filter_query (ex.: '{bairro} contains Vila')
+    em (coluna, operador, valor textual). Retorna (None, None, None) se não reconhecer.
+    """
+    fim_nome = parte.find('}')
+    if fim_nome == -1:
+        return None, None, None
+
+    nome = parte[parte.find('{') + 1:fim_nome]
+    resto = parte[fim_nome + 1:].lstrip()
+
+    # O operador vem logo após o nome da coluna; procurar no texto todo confundiria
+    # valores como "Jorge Silva" com o operador 'ge '
+    for tipo_operador in OPERADORES:
+        for operador in tipo_operador:
+            if resto.startswith(operador):
+                valor = resto[len(operador):].strip()
+                if len(valor) > 1 and valor[0] == valor[-1] and valor[0] in ("'", '"', '`'):
+                    valor = valor[1:-1].replace('\\' + valor[0], valor[0])
+
+                # Sempre retorna a forma textual do operador (ex.: 'ge' e não '>=')
+                return nome, tipo_operador[0].strip(), valor
+
+    return None, None, None
+
+
+def filtrar(dados, filter_query):
+    """
+    Aplica o filter_query do DataTable sobre o DataFrame.
+    Os filtros são combinados em uma única máscara booleana, sem cópias intermediárias.
+    """
+    if not filter_query:
+        return dados
+
+    mascara = pd.Series(True, index=dados.index)
+    for parte in filter_query.split(' && '):
+        coluna, operador, valor = separar_filtro(parte)
+        if coluna not in dados.columns:
+            continue
+
+        serie = dados[coluna]
+        eh_data = pd.api.types.is_datetime64_any_dtype(serie)
+        if operador in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            if eh_data:
+                valor = pd.to_datetime(valor, format=FORMATO_DATA, errors='coerce')
+                if pd.isna(valor):
+                    continue
+            elif pd.api.types.is_numeric_dtype(serie):
+                try:
+                    valor = float(valor)
+                except ValueError:
+                    continue
+            else:
+                serie = serie.astype(str)
+            comparacao = {
+                'eq': serie.__eq__, 'ne': serie.__ne__,
+                'lt': serie.__lt__, 'le': serie.__le__,
+                'gt': serie.__gt__, 'ge': serie.__ge__
+            }[operador]
+            mascara &= comparacao(valor)
+        elif eh_data:
+            # Busca textual em datas usa o mesmo formato exibido na tabela
+            serie = serie.dt.strftime(FORMATO_DATA)
+            if operador == 'contains':
+                mascara &= serie.str.contains(valor, regex=False, na=False)
+            elif operador == 'datestartswith':
+                mascara &= serie.str.startswith(valor, na=False)
+        elif operador == 'contains':
+            mascara &= serie.astype(str).str.contains(valor, case=False, regex=False, na=False)
+        elif operador == 'datestartswith':
+            mascara &= serie.astype(str).str.startswith(valor, na=False)
+
+    return dados[mascara.to_numpy()]
+
+
+# Comparações do filter_query em SQL
+COMPARACOES_SQL = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+
+def texto_sql(valor):
+    # Mesmo texto de Series.astype(str): valores ausentes viram 'nan'
+    return 'nan' if valor is None else str(valor)
+
+
+# Funções registradas nas conexões SQLite para "contains"/"datestartswith" em texto,
+# com a mesma comparação sem maiúsculas de filtrar() (lower() do SQLite só trata ASCII)
+FUNCOES_SQL = {
+    'contem_texto': (2, lambda valor, busca: busca.upper() in texto_sql(valor).upper()),
+    'comeca_com': (2, lambda valor, busca: texto_sql(valor).startswith(busca))
+}
+
+
+def filtro_sql(filter_query, tipos):
+    """
+    Traduz o filter_query para condições SQL com a mesma semântica de filtrar(), para
+    backends que filtram no banco. `tipos` mapeia coluna -> 'data' (gravada como
+    AAAA-MM-DD), 'numero' ou 'texto'. Retorna (lista de condições, parâmetros).
+    """
+    condicoes, parametros = [], []
+    if not filter_query:
+        return condicoes, parametros
+
+    for parte in filter_query.split(' && '):
+        coluna, operador, valor = separar_filtro(parte)
+        if coluna not in tipos:
+            continue
+
+        tipo = tipos[coluna]
+        nome = '"' + coluna.replace('"', '""') + '"'
+        if operador in COMPARACOES_SQL:
+            if tipo == 'data':
+                valor = pd.to_datetime(valor, format=FORMATO_DATA, errors='coerce')
+                if pd.isna(valor):
+                    continue
+                valor = valor.strftime('%Y-%m-%d')
+            elif tipo == 'numero':
+                try:
+                    valor = float(valor)
+                except ValueError:
+                    continue
+            else:
+                nome = f"COALESCE({nome}, 'nan')"
+            condicao = f'{nome} {COMPARACOES_SQL[operador]} ?'
+            # No pandas, valores ausentes são diferentes de qualquer valor
+            condicoes.append(f'({nome} IS NULL OR {condicao})' if operador == 'ne' else condicao)
+            parametros.append(valor)
+        elif tipo == 'data':
+            texto = f"strftime('{FORMATO_DATA}', {nome})"
+            if operador == 'contains':
+                condicoes.append(f'instr({texto}, ?) > 0')
+                parametros.append(valor)
+            elif operador == 'datestartswith':
+                condicoes.append(f'substr({texto}, 1, ?) = ?')
+                parametros.extend([len(valor), valor])
+        elif operador == 'contains':
+            condicoes.append(f'contem_texto({nome}, ?)')
+            parametros.append(valor)
+        elif operador == 'datestartswith':
+            condicoes.append(f'comeca_com({nome}, ?)')
+            parametros.append(valor)
+
+    return condicoes, parametros
+
+
+def ordenar(dados, sort_by):
+    """
+    Retorna as posições das linhas na ordem pedida pelo sort_by do DataTable.
+    Só as colunas de ordenação são copiadas, nunca o DataFrame inteiro.
+    """
+    if not sort_by:
+        return None
+
+    colunas = [col['column_id'] for col in sort_by if col['column_id'] in dados.columns]
+    if not colunas:
+        return None
+
+    ascendente = [col['direction'] == 'asc' for col in sort_by if col['column_id'] in dados.columns]
+    chaves = dados[colunas].reset_index(drop=True)
+    return chaves.sort_values(colunas, ascending=ascendente, kind='mergesort').index.to_numpy()
+
+
+def preparar_consulta(dados, sort_by=None, filter_query=''):
+    """
+    Parte cara da consulta (filtro e ordenação), que só muda com sort_by/filter_query.
+    Retorna (DataFrame filtrado, posições na ordem pedida ou None).
+    """
+    df = filtrar(dados, filter_query)
+    return df, ordenar(df, sort_by)
+
+
+def paginar(df, ordem, page_current, page_size):
+    """
+    Recorta a página pedida do resultado de preparar_consulta.
+    Retorna (registros da página atual, total de páginas, página efetiva).
+    """
+    page_size = page_size or 10
+    total_paginas = max(1, math.ceil(len(df) / page_size))
+    pagina = min(page_current or 0, total_paginas - 1)
+    inicio = pagina * page_size
+    fim = inicio + page_size
+
+    if ordem is None:
+        pagina_df = df.iloc[inicio:fim]
+    else:
+        pagina_df = df.iloc[ordem[inicio:fim]]
+
+    return formatar_registros(pagina_df), total_paginas, pagina
+
+
+def formatar_registros(pagina_df):
+    """
+    Converte a página em registros para o DataTable, exibindo datas como DD/MM/AAAA.
+    """
+    colunas_data = [col for col in pagina_df.columns if pd.api.types.is_datetime64_any_dtype(pagina_df[col])]
+    if colunas_data:
+        pagina_df = pagina_df.assign(**{col: pagina_df[col].dt.strftime(FORMATO_DATA) for col in colunas_data})
+    return pagina_df.to_dict('records')
+
+
+def gerar_tooltips(registros):
+    """
+    Gera o tooltip_data apenas para os registros da página visível.
+    """
+    return [
+        {
+            coluna: {'value': str(valor), 'type': 'markdown'}
+            for coluna, valor in registro.items()
+        } for registro in registros
+    ]
@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+CSV_EXEMPLO = RAIZ / 'data' / 'clientes.csv'
+
+
+@pytest.fixture
+def linhas_csv():
+    # Cabeçalho + linhas do CSV de exemplo, com as quebras de linha
+    return CSV_EXEMPLO.read_text(encoding='utf-8').splitlines(keepends=True)
@@ -0,0 +1,99 @@
+import io
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.esbocos import ERRO_QUANTIS, Frequentes, HyperLogLog, Quantis, hash_valores
+from src.processamento_dados import aplicar_esquema, esbocar_bloco, esbocar_blocos, esbocos_da_selecao, ler_csv
+
+from conftest import CSV_EXEMPLO
+
+
+@pytest.fixture
+def csv_clientes():
+    # 300 serviços sobre as linhas do exemplo, com clientes que voltam e um id ausente
+    cabecalho, *linhas = CSV_EXEMPLO.read_text(encoding='utf-8').splitlines()
+    corpo = []
+    for posicao in range(300):
+        id_cliente = '' if posicao == 5 else str(posicao % 120 + 1)
+        corpo.append(id_cliente + ',' + linhas[posicao % len(linhas)].split(',', 1)[1])
+    return '\n'.join([cabecalho] + corpo) + '\n'
+
+
+def resumo(esbocos):
+    # Conteúdo comparável dos esboços de cada segmento
+    return {
+        segmento: (
+            esboco.servicos,
+            esboco.clientes.registros.tolist(),
+            {coluna: (frequentes.contadores, frequentes.total) for coluna, frequentes in esboco.frequentes.items()},
+            (esboco.quantis.baldes, esboco.quantis.zeros)
+        )
+        for segmento, esboco in esbocos.items()
+    }
+
+
+@pytest.mark.parametrize('linhas_por_bloco', [1, 7, 50])
+def test_esbocos_em_blocos_iguais_a_um_bloco(csv_clientes, linhas_por_bloco):
+    inteiro = ler_csv(io.StringIO(csv_clientes))
+    blocos = (aplicar_esquema(bloco) for bloco in pd.read_csv(io.StringIO(csv_clientes), chunksize=linhas_por_bloco))
+
+    # O bloco com o id ausente tem id_cliente float64; os outros, int64
+    assert resumo(esbocar_blocos(blocos)) == resumo(esbocar_bloco(inteiro))
+
+
+def test_clientes_que_voltam_nao_contam_de_novo():
+    clientes = HyperLogLog()
+    clientes.adicionar(hash_valores(pd.Series([*range(1000), np.nan])))
+    estimativa = clientes.estimar()
+    clientes.adicionar(hash_valores(pd.Series(range(1000))))
+    assert clientes.estimar() == estimativa
+
+
+def test_hyperloglog_dentro_do_erro():
+    clientes = HyperLogLog()
+    for inicio in range(0, 50_000, 10_000):
+        clientes.adicionar(hash_valores(pd.Series(np.arange(inicio, inicio + 10_000))))
+    assert abs(clientes.estimar() - 50_000) / 50_000 <= 3 * clientes.erro_padrao
+    assert clientes.erro_padrao == pytest.approx(1.04 / math.sqrt(4096))
+
+
+def test_frequentes_dentro_do_limite():
+    gerador = np.random.default_rng(7)
+    valores = pd.Series(gerador.zipf(1.3, 20_000) % 2_000)
+    frequentes = Frequentes(capacidade=32)
+    for inicio in range(0, len(valores), 2_500):
+        bloco = valores.iloc[inicio:inicio + 2_500]
+        frequentes = frequentes.unir(Frequentes(capacidade=32).adicionar(bloco.value_counts()))
+
+    exatas = valores.value_counts()
+    estimadas = frequentes.contagem().reindex(exatas.index, fill_value=0)
+    assert (estimadas <= exatas).all()
+    assert (exatas - estimadas <= frequentes.erro_maximo).all()
+    assert frequentes.erro_maximo <= len(valores) / 33
+    assert set(exatas[exatas > len(valores) / 33].index) <= set(frequentes.contadores)
+
+
+def test_quantis_dentro_do_erro_relativo():
+    gerador = np.random.default_rng(11)
+    valores = np.concatenate([gerador.lognormal(5, 1, 20_000), np.zeros(100)])
+    quantis = Quantis()
+    for bloco in np.array_split(valores, 5):
+        quantis = quantis.unir(Quantis().adicionar(bloco))
+
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        exato = np.quantile(valores, q, method='lower')
+        assert abs(quantis.quantil(q) - exato) <= ERRO_QUANTIS * abs(exato) + 1e-9, q
+
+
+def test_esbocos_da_selecao():
+    dados = ler_csv(CSV_EXEMPLO)
+    esbocos = esbocar_bloco(dados)
+
+    assert esbocos_da_selecao(esbocos).servicos == len(dados)
+    assert esbocos_da_selecao(esbocos, [('sexo', ['F'])]).servicos == (dados['sexo'] == 'F').sum()
+    # Seleções por outras colunas não são respondidas pelos esboços
+    assert esbocos_da_selecao(esbocos, [('bairro', ['Santo Amaro'])]) is None
+    assert esbocos_da_selecao(None) is None
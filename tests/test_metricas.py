@@ -0,0 +1,12 @@
+from src.metricas import Metricas
+
+
+def test_combinacoes_de_filtros_limitadas():
+    metricas = Metricas(ativo=True, limite_combinacoes=3)
+    for posicao in range(50):
+        metricas.observar('atualizar_conteudo', 0.01, 100, filtros=(f'filtro-bairro=B{posicao}', 'filtro-sexo=F'))
+
+    series = [linha for linha in metricas.exportar().splitlines() if linha.startswith('dashboard_filtro_total')]
+    assert len(series) == 4
+    assert series[-1] == \
+        'dashboard_filtro_total{callback="atualizar_conteudo",filtro_bairro="outros",filtro_sexo="outros"} 47'
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.processamento_dados import (
+    COLUNA_DATA, COLUNAS_ITENS, GerenciadorDados, agregados_iguais, anexar_linhas, atualizar_estado,
+    carregar_dados, construir_cubo_itens, explodir_colunas_itens, explodir_itens, materializar_cache,
+    montar_estado, separar_itens
+)
+
+from conftest import CSV_EXEMPLO
+
+
+def mapeado_do_disco(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base if isinstance(array, np.ndarray) else None
+    return array is not None
+
+
+def test_anexo_com_cache_mapeado(tmp_path, linhas_csv):
+    # Com o cache mapeado, `nome` volta categórica do cache e texto nas linhas anexadas
+    caminho = tmp_path / 'clientes.csv'
+    caminho.write_text(''.join(linhas_csv[:11]), encoding='utf-8')
+    gerenciador = GerenciadorDados(caminho, intervalo_verificacao=0, mapear=True, intervalo_conferencia=0)
+    assert len(gerenciador.obter()['dados']) == 10
+
+    with open(caminho, 'a', encoding='utf-8') as arquivo:
+        arquivo.write(''.join(linhas_csv[11:]))
+    estado = gerenciador.obter()
+
+    assert gerenciador.erro is None
+    esperado = carregar_dados(caminho, usar_cache=False)
+    assert len(estado['dados']) == len(esperado)
+    assert estado['dados']['nome'].astype(object).tolist() == esperado['nome'].tolist()
+
+
+def test_ordem_do_texto_igual_com_cache_mapeado(tmp_path, linhas_csv):
+    caminho = tmp_path / 'clientes.csv'
+    caminho.write_text(''.join(linhas_csv), encoding='utf-8')
+    em_memoria = GerenciadorDados(caminho, intervalo_verificacao=0, mapear=False).obter()['dados']
+    mapeados = GerenciadorDados(caminho, intervalo_verificacao=0, mapear=True).obter()['dados']
+
+    assert isinstance(mapeados['nome'].dtype, pd.CategoricalDtype)
+    assert mapeados.sort_values('nome', kind='stable')['nome'].astype(object).tolist() == \
+        em_memoria.sort_values('nome', kind='stable')['nome'].tolist()
+
+
+def test_derivados_mapeados_iguais_aos_calculados(tmp_path, linhas_csv):
+    caminho = tmp_path / 'clientes.csv'
+    caminho.write_text(''.join(linhas_csv), encoding='utf-8')
+    calculado = GerenciadorDados(caminho, intervalo_verificacao=0, mapear=False).obter()
+    materializar_cache(caminho)
+    mapeado = GerenciadorDados(caminho, intervalo_verificacao=0, mapear=True).obter()
+
+    # Índices, bitmaps e tabelas de itens vêm do disco, não de cópias privadas
+    assert mapeado_do_disco(mapeado['indice'][COLUNA_DATA]['ordem'])
+    assert all(mapeado_do_disco(tabela['linha'].to_numpy()) for tabela in mapeado['itens'].values())
+    assert all(mapeado_do_disco(bitmap)
+               for mapa in mapeado['bitmaps']['colunas'].values() for bitmap in mapa.values())
+
+    for nome in ('itens', 'cubo', 'cubos_itens', 'rollups'):
+        assert agregados_iguais(calculado[nome], mapeado[nome]), nome
+    for coluna, mapa in calculado['indice'].items():
+        if coluna == COLUNA_DATA:
+            assert all(np.array_equal(mapa[chave], mapeado['indice'][coluna][chave]) for chave in mapa)
+        else:
+            assert mapa.keys() == mapeado['indice'][coluna].keys()
+            assert all(np.array_equal(mapa[valor], mapeado['indice'][coluna][valor]) for valor in mapa)
+    assert calculado['bitmaps']['colunas'].keys() == mapeado['bitmaps']['colunas'].keys()
+
+
+@pytest.mark.parametrize('corte', [1, 7, 12, 19])
+def test_atualizar_estado_igual_a_montar_estado(corte):
+    dados = carregar_dados(CSV_EXEMPLO, usar_cache=False)
+    anteriores = dados.iloc[:corte].reset_index(drop=True)
+    juntos = anexar_linhas(anteriores, dados.iloc[corte:].reset_index(drop=True))
+
+    incremental = atualizar_estado(montar_estado(anteriores), juntos)
+    completo = montar_estado(juntos)
+
+    for nome in ('itens', 'cubo', 'cubos_itens', 'rollups'):
+        assert agregados_iguais(incremental[nome], completo[nome]), nome
+    for coluna, mapa in completo['indice'].items():
+        if coluna == COLUNA_DATA:
+            assert all(np.array_equal(mapa[chave], incremental['indice'][coluna][chave]) for chave in mapa)
+        else:
+            assert {valor: posicoes.tolist() for valor, posicoes in incremental['indice'][coluna].items()} == \
+                {valor: posicoes.tolist() for valor, posicoes in mapa.items()}
+    for coluna, mapa in completo['bitmaps']['colunas'].items():
+        assert mapa.keys() == incremental['bitmaps']['colunas'][coluna].keys()
+        assert all(np.array_equal(mapa[valor], incremental['bitmaps']['colunas'][coluna][valor]) for valor in mapa)
+    # Os rollups continuam ordenados por período (receita_por_periodo usa busca binária)
+    assert all(rollup['periodo'].is_monotonic_increasing for rollup in incremental['rollups'].values())
+
+
+def test_correcao_da_conferencia_muda_a_assinatura(tmp_path, linhas_csv):
+    # O cache de respostas e o navegador usam a assinatura: a correção precisa trocá-la
+    caminho = tmp_path / 'clientes.csv'
+    caminho.write_text(''.join(linhas_csv), encoding='utf-8')
+    gerenciador = GerenciadorDados(caminho, intervalo_verificacao=0)
+    estado = gerenciador.obter()
+    divergente = dict(estado, cubo=estado['cubo'].assign(servicos=estado['cubo']['servicos'] + 1))
+    gerenciador._estado = divergente
+
+    gerenciador._conferir(divergente)
+    corrigido = gerenciador.obter()
+
+    assert corrigido['assinatura'] != estado['assinatura']
+    assert corrigido['versao'] == estado['versao'] + 1
+    assert agregados_iguais(corrigido['cubo'], estado['cubo'])
+    # O arquivo não mudou: a nova assinatura não provoca recarga
+    assert gerenciador.obter() is corrigido
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('Sofá 2 lugares (retrátil), Cadeira assento e encosto, Tapete',
+     [('Sofá 2 lugares (retrátil)', 1), ('Cadeira assento e encosto', 1), ('Tapete', 1)]),
+    ('Cadeira - assento x 6', [('Cadeira - assento', 6)]),
+    ('NA', []),
+    ('Tapete, Poltrona G, Tapete x 2', [('Tapete', 3), ('Poltrona G', 1)]),
+])
+def test_separar_itens(texto, esperado):
+    assert separar_itens(texto) == esperado
+
+
+def test_explodir_itens():
+    tabela = explodir_itens(pd.Series(['Tapete, Tapete', 'NA', None, 'Cadeira - assento x 6, Tapete']))
+    assert list(zip(tabela['linha'], tabela['item'].astype(object), tabela['quantidade'])) == [
+        (0, 'Tapete', 2), (3, 'Cadeira - assento', 6), (3, 'Tapete', 1)
+    ]
+
+
+def test_cubo_de_itens_igual_a_explode_simples():
+    dados = carregar_dados(CSV_EXEMPLO, usar_cache=False)
+    # Repetições e quantidades na mesma célula: o serviço conta uma vez por item
+    dados[COLUNAS_ITENS] = dados[COLUNAS_ITENS].astype(object)
+    dados.loc[0, 'itens_higienizados'] = 'Tapete, Cadeira - assento x 6, Tapete'
+    dados.loc[1, 'itens_impermeabilizados'] = 'NA'
+    tabelas = explodir_colunas_itens(dados)
+
+    for coluna in COLUNAS_ITENS:
+        itens = dados[coluna].astype(object).str.split(',').explode().str.strip()
+        itens = itens.str.replace(r'\s+x\s*\d+$', '', regex=True)
+        itens = itens[itens.notna() & (itens != '') & (itens != 'NA')]
+        pares = pd.DataFrame({'linha': itens.index, 'item': itens.to_numpy()}).drop_duplicates()
+        esperado = (
+            pd.DataFrame({
+                'sexo': dados['sexo'].astype(object).to_numpy()[pares['linha']],
+                'bairro': dados['bairro'].astype(object).to_numpy()[pares['linha']],
+                'item': pares['item'].to_numpy()
+            })
+            .groupby(['sexo', 'bairro', 'item']).size().rename('servicos').reset_index()
+        )
+        assert agregados_iguais(construir_cubo_itens(dados, tabelas[coluna]), esperado), coluna
@@ -0,0 +1,56 @@
+import pytest
+
+from src.processamento_dados import GerenciadorSQLite, carregar_dados
+from src.tabela import filtrar, paginar, preparar_consulta
+
+from conftest import CSV_EXEMPLO
+
+# Mesma semântica de filtrar() em cada operador e tipo de coluna (texto, número e data)
+CONSULTAS = [
+    '{bairro} contains Vila',
+    '{bairro} contains vila',
+    '{nome} eq "Fernando Felix"',
+    '{nome} ne "Fernando Felix"',
+    '{sexo} eq F',
+    '{nome} ge Jorge',
+    '{valor_servico} ge 500',
+    '{valor_servico} lt 300 && {sexo} eq M',
+    '{valor_servico} contains 54',
+    '{data_servico} eq 03/01/2025',
+    '{data_servico} gt 10/01/2025',
+    '{data_servico} datestartswith 03/01',
+    '{data_servico} contains /01/',
+    '{itens_higienizados} contains Sofá',
+    '{coluna_inexistente} eq 1',
+]
+
+
+@pytest.fixture(scope='module')
+def banco(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('sqlite')
+    return GerenciadorSQLite(CSV_EXEMPLO, pasta / 'clientes.sqlite', intervalo_verificacao=0).obter()['banco']
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return carregar_dados(CSV_EXEMPLO, usar_cache=False)
+
+
+@pytest.mark.parametrize('filter_query', CONSULTAS)
+def test_filtro_sql_igual_a_filtrar(banco, dados, filter_query):
+    onde, parametros = banco.filtro(filter_query=filter_query)
+    linhas = banco.consultar(f'SELECT linha FROM clientes {onde} ORDER BY linha', parametros)['linha'].tolist()
+    assert linhas == dados.index[dados.index.isin(filtrar(dados, filter_query).index)].tolist()
+
+
+@pytest.mark.parametrize('sort_by', [
+    [{'column_id': 'valor_servico', 'direction': 'desc'}],
+    [{'column_id': 'bairro', 'direction': 'asc'}, {'column_id': 'data_servico', 'direction': 'desc'}],
+])
+def test_pagina_sql_igual_a_paginar(banco, dados, sort_by):
+    filter_query = '{valor_servico} ge 200'
+    esperado, total_esperado, _ = paginar(*preparar_consulta(dados, sort_by, filter_query), 1, 5)
+    pagina, total, numero = banco.pagina((), None, sort_by, filter_query, 1, 5)
+
+    assert (total, numero) == (total_esperado, 1)
+    assert pagina['id_cliente'].tolist() == [registro['id_cliente'] for registro in esperado]